@@ -1,25 +1,13 @@
 from langchain_core.tools import tool
+from server.data_access.DB.station_registry import HUB_STATIONS
 from server.data_access.DB.timetable_service import TimetableService
+from server.service.filter_stations import find_station_by_name
 from server.service.linker_service import LinkerService
 from datetime import datetime
 
 timetable_service = TimetableService()
 linker_service = LinkerService()
 
-STATION_EVA_MAP = {
-    "München Hbf": "8000261",
-    "Berlin Hbf": "8011160",
-    "Hamburg Hbf": "8002549",
-    "Frankfurt (Main) Hbf": "8000105",
-    "Lindau-Reutin": "8003693",
-    "Köln Hbf": "8000207",
-    "Stuttgart Hbf": "8000096",
-    "Leipzig Hbf": "8010205",
-    "Dresden Hbf": "8010085",
-    "Hannover Hbf": "8000152",
-    "Nürnberg Hbf": "8000284",
-}
-
 
 @tool
 def get_live_departures(station_name: str) -> str:
@@ -32,15 +20,21 @@ def get_live_departures(station_name: str) -> str:
         A formatted string with the next 10 departures including time, train number, 
         destination, platform, and any delays or platform changes.
     """
-    eva = STATION_EVA_MAP.get(station_name)
+    eva = HUB_STATIONS.get(station_name)
     if not eva:
-        for name, e in STATION_EVA_MAP.items():
+        for name, e in HUB_STATIONS.items():
             if station_name.lower() in name.lower():
                 eva = e
                 break
 
     if not eva:
-        return f"Station '{station_name}' not found. Available: {', '.join(STATION_EVA_MAP.keys())}"
+        # Fall back to any long-distance station of the registry
+        station = find_station_by_name(station_name)
+        if station:
+            eva = station.eva
+
+    if not eva:
+        return f"Station '{station_name}' not found. Available: {', '.join(HUB_STATIONS.keys())}"
 
     board = timetable_service.get_station_board(eva, datetime.now())
     if not board:
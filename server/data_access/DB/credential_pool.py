@@ -0,0 +1,213 @@
+"""
+Health tracking and adaptive selection of DB API credentials.
+
+Every credential keeps an estimate of its remaining per-minute quota, its
+recent errors and a circuit breaker. Requests go to a healthy credential
+chosen at random, weighted by remaining quota and recent error rate, so load
+spreads across keys and an exhausted or failing key is skipped instead of
+costing a wasted round-trip on every request.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# The DB Timetables API allows 60 calls per minute per client
+QUOTA_PER_MINUTE = 60
+
+# Consecutive failures that open the circuit, and how long it stays open
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN_SECONDS = 15.0
+MAX_COOLDOWN_SECONDS = 300.0
+
+# Backoff after a 429 when the response carries no Retry-After
+THROTTLE_SECONDS = 60.0
+
+# Window over which errors count against a credential's weight
+ERROR_WINDOW_SECONDS = 300.0
+
+
+class Credential:
+    __slots__ = (
+        "name",
+        "client_id",
+        "api_key",
+        "_calls",
+        "_errors",
+        "throttled_until",
+        "open_until",
+        "cooldown",
+        "consecutive_failures",
+        "probing",
+        "total_requests",
+        "total_failures",
+        "total_throttled",
+    )
+
+    def __init__(self, name: str, client_id: str, api_key: str):
+        self.name = name
+        self.client_id = client_id
+        self.api_key = api_key
+        self._calls: deque = deque()
+        self._errors: deque = deque()
+        self.throttled_until = 0.0
+        self.open_until = 0.0
+        self.cooldown = BASE_COOLDOWN_SECONDS
+        self.consecutive_failures = 0
+        self.probing = False
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_throttled = 0
+
+    def remaining_quota(self, now: float) -> int:
+        while self._calls and self._calls[0] <= now - 60.0:
+            self._calls.popleft()
+        return max(0, QUOTA_PER_MINUTE - len(self._calls))
+
+    def recent_errors(self, now: float) -> int:
+        while self._errors and self._errors[0] <= now - ERROR_WINDOW_SECONDS:
+            self._errors.popleft()
+        return len(self._errors)
+
+    def state(self, now: float) -> str:
+        if now < self.open_until:
+            return "open"
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            return "half-open"
+        return "closed"
+
+
+class CredentialPool:
+    def __init__(self, credentials: Iterable[Credential]):
+        self.credentials: List[Credential] = list(credentials)
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Iterable[Credential] = ()) -> Optional[Credential]:
+        """
+        Pick the credential for the next request.
+
+        Returns:
+            A credential, or None if every credential is excluded, throttled,
+            out of quota or has an open circuit
+        """
+        now = time.monotonic()
+        excluded = set(id(c) for c in exclude)
+
+        with self._lock:
+            candidates = []
+            weights = []
+            for cred in self.credentials:
+                if id(cred) in excluded or now < cred.throttled_until:
+                    continue
+
+                state = cred.state(now)
+                if state == "open" or (state == "half-open" and cred.probing):
+                    continue
+
+                remaining = cred.remaining_quota(now)
+                if remaining <= 0:
+                    continue
+
+                candidates.append(cred)
+                weights.append(remaining / (1.0 + cred.recent_errors(now)))
+
+            if not candidates:
+                return None
+
+            chosen = random.choices(candidates, weights=weights)[0]
+            if chosen.state(now) == "half-open":
+                # Only one trial request while the circuit is half-open
+                chosen.probing = True
+            chosen._calls.append(now)
+            chosen.total_requests += 1
+            return chosen
+
+    def record_success(self, cred: Credential, remaining_quota: Optional[int] = None):
+        now = time.monotonic()
+        with self._lock:
+            cred.consecutive_failures = 0
+            cred.cooldown = BASE_COOLDOWN_SECONDS
+            cred.probing = False
+            if remaining_quota is not None:
+                self._align_quota(cred, remaining_quota, now)
+
+    def record_failure(
+        self,
+        cred: Credential,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        Record a failed request. A 429 throttles the credential for the
+        Retry-After period, other failures count towards opening its circuit.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cred._errors.append(now)
+            cred.total_failures += 1
+
+            if status == 429:
+                cred.total_throttled += 1
+                cred.throttled_until = now + (retry_after or THROTTLE_SECONDS)
+                cred.probing = False
+                return
+
+            was_probing = cred.probing
+            cred.probing = False
+            cred.consecutive_failures += 1
+            if was_probing:
+                cred.cooldown = min(cred.cooldown * 2, MAX_COOLDOWN_SECONDS)
+            if cred.consecutive_failures >= FAILURE_THRESHOLD:
+                cred.open_until = now + cred.cooldown
+                print(
+                    f"⚠️ Circuit open for DB API credential '{cred.name}' "
+                    f"for {cred.cooldown:.0f}s after {cred.consecutive_failures} failures."
+                )
+
+    def _align_quota(self, cred: Credential, remaining: int, now: float):
+        """Trust the upstream's remaining-quota header over the local estimate."""
+        used = QUOTA_PER_MINUTE - max(0, min(remaining, QUOTA_PER_MINUTE))
+        while len(cred._calls) < used:
+            cred._calls.append(now)
+        while len(cred._calls) > used:
+            cred._calls.popleft()
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": cred.name,
+                    "state": cred.state(now),
+                    "throttled": now < cred.throttled_until,
+                    "remaining_quota": cred.remaining_quota(now),
+                    "recent_errors": cred.recent_errors(now),
+                    "requests": cred.total_requests,
+                    "failures": cred.total_failures,
+                    "throttled_total": cred.total_throttled,
+                }
+                for cred in self.credentials
+            ]
+
+
+_pools: Dict[Tuple, CredentialPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_credential_pool(
+    credentials: Iterable[Tuple[str, Optional[str], Optional[str]]]
+) -> CredentialPool:
+    """
+    Get the process-wide pool for a set of (name, client_id, api_key) tuples,
+    so that every service using the same keys shares their health state.
+    Entries with a missing client id or key are skipped.
+    """
+    usable = tuple((n, c, k) for n, c, k in credentials if c and k)
+    with _pools_lock:
+        pool = _pools.get(usable)
+        if pool is None:
+            pool = CredentialPool(Credential(n, c, k) for n, c, k in usable)
+            _pools[usable] = pool
+        return pool
@@ -0,0 +1,164 @@
+"""
+Binary file format of the station graph cache (data/graph_cache.bin).
+
+The format is decoded here, below the service layer, so readers that only
+need node attributes (the station registry's coordinates) do not import
+server.service; GraphService's StationGraph (service/station_graph.py) is
+saved and loaded through write_graph_cache and read_graph_cache.
+
+Binary layout (little-endian):
+
+    header   magic, format version, node count n, edge count m, duration
+             entry count k, size of the string table, CRC32 of the payload,
+             data version, travel.db checksum (32 bytes)
+    payload  offsets uint32[n + 1], targets uint32[m], weights uint32[m],
+             duration_offsets uint32[m + 1], durations uint32[k],
+             duration_counts uint32[k],
+             lon float64[n], lat float64[n], score int64[n],
+             string table: id and name of every node, NUL separated UTF-8
+
+The whole file is read at once and the arrays decoded straight from the
+buffer, so loading does no per-node parsing beyond the string table.
+
+little_endian_bytes and read_array are shared with the other binary files
+next to it (the via table, the graph fingerprint).
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+
+MAGIC = b"SGRF"
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct("<4sHHIIIIIQ32s")
+
+
+@dataclass
+class GraphCacheData:
+    """Node attributes and CSR arrays of a graph cache file."""
+
+    ids: List[str]
+    names: List[str]
+    offsets: array
+    targets: array
+    weights: array
+    duration_offsets: array
+    durations: array
+    duration_counts: array
+    lons: array
+    lats: array
+    scores: array
+    data_version: int
+    checksum: bytes
+
+
+def little_endian_bytes(values: array) -> bytes:
+    """The values as little-endian bytes, whatever the machine's byte order."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_array(typecode: str, buffer: memoryview, start: int, count: int) -> Tuple[array, int]:
+    """count little-endian values of typecode at start, and the offset after them."""
+    values = array(typecode)
+    end = start + count * values.itemsize
+    values.frombytes(buffer[start:end])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values, end
+
+
+def write_graph_cache(data: GraphCacheData, path: Path):
+    strings = "\0".join(part for node in zip(data.ids, data.names) for part in node)
+    string_table = strings.encode("utf-8")
+
+    payload = b"".join(
+        [
+            little_endian_bytes(data.offsets),
+            little_endian_bytes(data.targets),
+            little_endian_bytes(data.weights),
+            little_endian_bytes(data.duration_offsets),
+            little_endian_bytes(data.durations),
+            little_endian_bytes(data.duration_counts),
+            little_endian_bytes(data.lons),
+            little_endian_bytes(data.lats),
+            little_endian_bytes(data.scores),
+            string_table,
+        ]
+    )
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        len(data.ids),
+        len(data.targets),
+        len(data.durations),
+        len(string_table),
+        zlib.crc32(payload),
+        data.data_version,
+        data.checksum,
+    )
+
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    tmp_path.replace(path)
+
+
+def read_graph_cache(path: Path) -> GraphCacheData:
+    """
+    Decode a file written by write_graph_cache. Raises ValueError for files
+    of another format or version and for corrupted payloads.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated graph cache")
+    magic, version, _, n, m, k, strings_size, crc, data_version, checksum = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a station graph cache")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported graph cache version {version}")
+
+    buffer = memoryview(data)[_HEADER.size :]
+    if zlib.crc32(buffer) != crc:
+        raise ValueError("graph cache checksum mismatch")
+
+    offsets, pos = read_array("I", buffer, 0, n + 1)
+    targets, pos = read_array("I", buffer, pos, m)
+    weights, pos = read_array("I", buffer, pos, m)
+    duration_offsets, pos = read_array("I", buffer, pos, m + 1)
+    durations, pos = read_array("I", buffer, pos, k)
+    duration_counts, pos = read_array("I", buffer, pos, k)
+    lons, pos = read_array("d", buffer, pos, n)
+    lats, pos = read_array("d", buffer, pos, n)
+    scores, pos = read_array("q", buffer, pos, n)
+    if pos + strings_size != len(buffer):
+        raise ValueError("graph cache size mismatch")
+
+    strings = str(buffer[pos:], "utf-8").split("\0") if n else []
+    return GraphCacheData(
+        strings[0::2],
+        strings[1::2],
+        offsets,
+        targets,
+        weights,
+        duration_offsets,
+        durations,
+        duration_counts,
+        lons,
+        lats,
+        scores,
+        data_version,
+        checksum,
+    )
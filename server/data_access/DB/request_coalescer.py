@@ -0,0 +1,72 @@
+"""
+Single-flight coalescing for upstream Timetables API calls.
+
+Concurrent callers asking for the same key share one in-flight call and its
+result instead of each issuing an identical request.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _InFlightCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn for key, or wait for the identical call that is already running.
+
+        Args:
+            key: Identity of the call (e.g. the request URL)
+            fn: Zero-argument callable performing the actual work
+
+        Returns:
+            The result of fn. Every caller sharing a call receives the same
+            object, so results must be treated as read-only.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            # Also cancellation and interrupts: followers must not wake up to
+            # a missing result
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,187 @@
+"""
+Spatial index over station coordinates and the walking transfers derived from it.
+
+Stations are bucketed into a lat/lon grid once at startup. Radius queries only
+look at the cells overlapping the circle's bounding box; nearest-N queries
+search rings of cells outwards until no unvisited cell can hold a closer
+station. The footpath table links every station to the stations within
+MAX_FOOTPATH_METERS (e.g. Hamburg Hbf and Hamburg Dammtor) with an estimated
+walking time, so routing can use walking transfers without distance scans.
+"""
+
+import math
+import threading
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from server.data_access.DB.station_registry import StationRecord, get_station_registry
+
+EARTH_RADIUS_METERS = 6371000.0
+METERS_PER_DEGREE_LAT = 111195.0
+
+# Grid cell size in degrees (about 5.5 km north-south)
+CELL_DEGREES = 0.05
+
+# Walking transfers: maximum straight-line distance, walking speed and the
+# factor from straight-line to street distance
+MAX_FOOTPATH_METERS = 2000.0
+WALKING_METERS_PER_MINUTE = 80.0
+DETOUR_FACTOR = 1.25
+
+
+def haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def walking_minutes(meters: float) -> int:
+    return max(1, math.ceil(meters * DETOUR_FACTOR / WALKING_METERS_PER_MINUTE))
+
+
+class GeoIndex:
+    def __init__(self, points: Iterable[Tuple[Hashable, float, float]], cell_degrees: float = CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.keys: List[Hashable] = []
+        self.lats: List[float] = []
+        self.lons: List[float] = []
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+
+        for key, lat, lon in points:
+            i = len(self.keys)
+            self.keys.append(key)
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self._grid.setdefault(self._cell(lat, lon), []).append(i)
+
+        cells = list(self._grid) or [(0, 0)]
+        self._bounds = (
+            min(c[0] for c in cells),
+            max(c[0] for c in cells),
+            min(c[1] for c in cells),
+            max(c[1] for c in cells),
+        )
+
+        # Lower bound of the distance covered by one ring of cells, taken at
+        # the most northern station where cells are narrowest
+        max_lat = max((abs(lat) for lat in self.lats), default=0.0)
+        self._ring_meters = (
+            cell_degrees * METERS_PER_DEGREE_LAT * min(1.0, math.cos(math.radians(max_lat)))
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def within(self, lat: float, lon: float, radius_meters: float) -> List[Tuple[float, Hashable]]:
+        """(distance in meters, key) of all points within the radius, nearest first."""
+        dlat = radius_meters / METERS_PER_DEGREE_LAT
+        dlon = radius_meters / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+
+        found = []
+        for ci in range(lat_lo, lat_hi + 1):
+            for cj in range(lon_lo, lon_hi + 1):
+                for i in self._grid.get((ci, cj), ()):
+                    d = haversine_meters(lat, lon, self.lats[i], self.lons[i])
+                    if d <= radius_meters:
+                        found.append((d, self.keys[i]))
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def nearest(
+        self, lat: float, lon: float, n: int = 1, max_meters: Optional[float] = None
+    ) -> List[Tuple[float, Hashable]]:
+        """(distance in meters, key) of the n nearest points, nearest first."""
+        if not self.keys or n <= 0:
+            return []
+
+        ci, cj = self._cell(lat, lon)
+        best: List[Tuple[float, Hashable]] = []
+        ring = 0
+        max_ring = self._max_ring(ci, cj)
+        while ring <= max_ring:
+            for cell in self._ring_cells(ci, cj, ring):
+                for i in self._grid.get(cell, ()):
+                    best.append((haversine_meters(lat, lon, self.lats[i], self.lons[i]), self.keys[i]))
+            best.sort(key=lambda x: x[0])
+            del best[n:]
+
+            # Cells beyond this ring are at least `ring` cell widths away
+            bound = ring * self._ring_meters
+            if max_meters is not None and bound > max_meters:
+                break
+            if len(best) == n and best[-1][0] <= bound:
+                break
+            ring += 1
+
+        if max_meters is not None:
+            best = [b for b in best if b[0] <= max_meters]
+        return best
+
+    def _max_ring(self, ci: int, cj: int) -> int:
+        """Rings needed from (ci, cj) to cover every occupied cell."""
+        lo_i, hi_i, lo_j, hi_j = self._bounds
+        return max(ci - lo_i, hi_i - ci, cj - lo_j, hi_j - cj, 0)
+
+    @staticmethod
+    def _ring_cells(ci: int, cj: int, ring: int):
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for d in range(-ring, ring + 1):
+            yield (ci - ring, cj + d)
+            yield (ci + ring, cj + d)
+        for d in range(-ring + 1, ring):
+            yield (ci + d, cj - ring)
+            yield (ci + d, cj + ring)
+
+
+class StationGeoIndex:
+    """Geo index over the registry stations with coordinates, plus their footpaths."""
+
+    def __init__(self, records: Iterable[StationRecord], max_footpath_meters: float = MAX_FOOTPATH_METERS):
+        self._records: Dict[int, StationRecord] = {
+            r.eva: r for r in records if r.lat is not None and r.lon is not None
+        }
+        self.index = GeoIndex((r.eva, r.lat, r.lon) for r in self._records.values())
+
+        # eva -> [(eva, walking minutes)], nearest first
+        self.footpaths: Dict[int, List[Tuple[int, int]]] = {}
+        for record in self._records.values():
+            paths = [
+                (eva, walking_minutes(d))
+                for d, eva in self.index.within(record.lat, record.lon, max_footpath_meters)
+                if eva != record.eva
+            ]
+            if paths:
+                self.footpaths[record.eva] = paths
+
+    def nearest_stations(
+        self, lat: float, lon: float, n: int = 5, max_meters: Optional[float] = None
+    ) -> List[Tuple[StationRecord, float]]:
+        return [(self._records[eva], d) for d, eva in self.index.nearest(lat, lon, n, max_meters)]
+
+    def stations_within(self, lat: float, lon: float, radius_meters: float) -> List[Tuple[StationRecord, float]]:
+        return [(self._records[eva], d) for d, eva in self.index.within(lat, lon, radius_meters)]
+
+    def walking_transfers(self, eva: int) -> List[Tuple[int, int]]:
+        """(EVA, walking minutes) of the stations within walking distance of eva."""
+        return self.footpaths.get(eva, [])
+
+
+_geo_index: Optional[StationGeoIndex] = None
+_geo_index_lock = threading.Lock()
+
+
+def get_station_geo_index() -> StationGeoIndex:
+    global _geo_index
+    if _geo_index is None:
+        with _geo_index_lock:
+            if _geo_index is None:
+                _geo_index = StationGeoIndex(get_station_registry())
+    return _geo_index
@@ -0,0 +1,196 @@
+"""
+Canonical integer keys and interned Station objects for station names.
+
+Timetables API paths (ppth) only carry station names. The resolver maps each
+name once to its EVA number using the station registry and a small alias table;
+names that are not long-distance stations get a stable negative key derived
+from the normalised name. Comparing stations then is integer equality, and
+every name resolves to one shared Station instance. The shared instances end
+up in the response models of every request, so they are frozen.
+
+Only registry stations and aliases are kept for the life of the process. Raw
+spellings and the Station instances of unknown names are kept in LRUs of
+STATION_KEY_CACHE_SIZE entries, as ppth names come from upstream responses.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from pydantic import ConfigDict
+
+from server.models.station import Station
+
+# Raw spellings and unknown-name Stations kept in memory (each)
+STATION_KEY_CACHE_SIZE = int(os.getenv("STATION_KEY_CACHE_SIZE", "8192"))
+
+# Spellings used by the GTFS feed, the frontend or users that differ from the
+# DB station names after normalisation
+ALIASES: Dict[str, int] = {
+    "Frankfurt (Main) Hauptbahnhof": 8000105,
+    "Frankfurt Hbf": 8000105,
+    "Frankfurt": 8000105,
+    "Frankfurt Flughafen": 8070003,
+    "Frankfurt (Main) Flughafen Fernbahnhof": 8070003,
+    "München": 8000261,
+    "Munich": 8000261,
+    "Berlin": 8011160,
+    "S+U Berlin Hauptbahnhof": 8011160,
+    "Hamburg": 8002549,
+    "Köln": 8000207,
+    "Cologne": 8000207,
+    "Mannheim, Hauptbahnhof": 8000244,
+    "Nuremberg": 8000284,
+    "Hannover": 8000152,
+    "Hanover": 8000152,
+    "Stuttgart": 8000096,
+    "Leipzig": 8010205,
+    "Dresden": 8010085,
+    "Düsseldorf": 8000085,
+}
+
+class InternedStation(Station):
+    """A Station shared across requests; read-only."""
+
+    model_config = ConfigDict(frozen=True)
+
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def station_name_tokens(name: str) -> List[str]:
+    """Words of a station name, lowercased with umlauts transliterated and Hauptbahnhof as hbf."""
+    name = name.lower().translate(_UMLAUTS)
+    name = name.replace("hauptbahnhof", "hbf")
+    return [token for token in _NON_ALNUM.split(name) if token]
+
+
+def normalize_station_name(name: str) -> str:
+    """Lowercase, transliterate umlauts, unify Hauptbahnhof/Hbf and drop punctuation."""
+    return "".join(station_name_tokens(name))
+
+
+def synthetic_station_key(normalized: str) -> int:
+    """Negative key of a name that is no registry station, the same in every process."""
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=7).digest()
+    return -1 - int.from_bytes(digest, "big")
+
+
+class StationKeyResolver:
+    def __init__(self, registry=None, cache_size: int = STATION_KEY_CACHE_SIZE):
+        if registry is None:
+            # Imported here: the registry itself normalises names with this module
+            from server.data_access.DB.station_registry import get_station_registry
+
+            registry = get_station_registry()
+
+        self._registry = registry
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._key_by_name: Dict[str, int] = {}
+        # Raw spelling -> key (LRU), so repeated names skip normalisation
+        self._key_by_raw: "OrderedDict[str, int]" = OrderedDict()
+        self._stations: Dict[int, Station] = {}
+        # Key -> Station of names that are no registry station (LRU)
+        self._synthetic: "OrderedDict[int, Station]" = OrderedDict()
+
+        for record in registry:
+            self._key_by_name[normalize_station_name(record.name)] = record.eva
+            self._stations[record.eva] = InternedStation(name=record.name, eva=str(record.eva))
+
+        for alias, eva in ALIASES.items():
+            self._key_by_name.setdefault(normalize_station_name(alias), eva)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """EVA number of a known station name or alias, without assigning a new key."""
+        return self._key_by_name.get(normalize_station_name(name))
+
+    def lookup_ifopt(self, stop_id: str) -> Optional[int]:
+        """EVA number of a GTFS/IFOPT stop id (e.g. de:06412:10:1:2 or de:14713:8010205_G)."""
+        record = self._registry.by_ifopt(stop_id)
+        return record.eva if record is not None else None
+
+    def key_for_name(self, name: str) -> int:
+        """Canonical key of a station name: its EVA number, or a stable negative id."""
+        # Hits skip the lock: single OrderedDict calls are atomic, and an entry
+        # evicted meanwhile only loses its recency update
+        key = self._key_by_raw.get(name)
+        if key is not None:
+            try:
+                self._key_by_raw.move_to_end(name)
+            except KeyError:
+                pass
+            return key
+
+        normalized = normalize_station_name(name)
+        key = self._key_by_name.get(normalized)
+        if key is None:
+            key = synthetic_station_key(normalized)
+        self._remember(self._key_by_raw, name, key)
+        return key
+
+    def key_for(self, station: Station) -> int:
+        """Canonical key of a Station, preferring its EVA number or IFOPT id."""
+        eva = station.eva
+        if eva and eva != "0":
+            if eva.isdigit():
+                return int(eva)
+            if eva.startswith("de:"):
+                key = self.lookup_ifopt(eva)
+                if key is not None:
+                    return key
+        return self.key_for_name(station.name)
+
+    def station(self, name: str) -> Station:
+        """The shared Station instance for a name."""
+        key = self.key_for_name(name)
+        station = self._stations.get(key)
+        if station is not None:
+            return station
+
+        with self._lock:
+            station = self._synthetic.get(key)
+            if station is not None:
+                self._synthetic.move_to_end(key)
+                return station
+        station = InternedStation(name=name.strip(), eva="0")
+        return self._remember(self._synthetic, key, station)
+
+    def _remember(self, lru: OrderedDict, key, value):
+        """Put value into lru unless a concurrent caller did; returns the kept value."""
+        if self._cache_size <= 0:
+            return value
+        with self._lock:
+            value = lru.setdefault(key, value)
+            lru.move_to_end(key)
+            while len(lru) > self._cache_size:
+                lru.popitem(last=False)
+            return value
+
+    def station_by_eva(self, eva: int) -> Optional[Station]:
+        return self._stations.get(eva)
+
+
+_resolver: Optional[StationKeyResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_station_key_resolver() -> StationKeyResolver:
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = StationKeyResolver()
+    return _resolver
+
+
+def station_key(station: Station) -> int:
+    return get_station_key_resolver().key_for(station)
+
+
+def intern_station(name: str) -> Station:
+    return get_station_key_resolver().station(name)
@@ -0,0 +1,136 @@
+"""
+Startup-built index for resolving free-text station names.
+
+Resolution order, each step cheaper than a scan over all names:
+1. exact match of the normalised name (or of name + "hbf")
+2. prefix trie over the normalised name and every word-start suffix of it,
+   so "Main" finds "Frankfurt(Main)Hbf"; every trie node stores its best
+   entry, so this is one walk of the query's length
+3. trigram fuzzy match for typos and missing umlauts ("Munchen")
+
+Ties are broken by precomputed ranks: main stations (Hbf) first, then
+matches at the start of the name, then the rank given by the caller.
+"""
+
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from server.data_access.DB.station_keys import station_name_tokens
+
+# Minimum Dice coefficient of trigram sets for a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+_FOLDS = (("ae", "a"), ("oe", "o"), ("ue", "u"), ("ss", "s"))
+
+
+def _fold(normalized: str) -> str:
+    """Fold transliterated umlauts so "munchen" and "muenchen" compare equal."""
+    for src, dst in _FOLDS:
+        normalized = normalized.replace(src, dst)
+    return normalized
+
+
+def _trigrams(text: str) -> set:
+    padded = f"${text}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class StationNameIndex:
+    def __init__(self, entries: Iterable[Tuple[Hashable, str, Tuple]] = ()):
+        """
+        Args:
+            entries: (key, name, rank) per station, lower rank preferred among
+                otherwise equal matches
+        """
+        self._exact: Dict[str, Tuple[Tuple, Hashable]] = {}
+        # Trie as parallel arrays: children per node and best (rank, key) below it
+        self._children: List[Dict[str, int]] = [{}]
+        self._best: List[Optional[Tuple[Tuple, Hashable]]] = [None]
+        self._fuzzy: List[Tuple[int, Tuple, Hashable]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+        for key, name, rank in entries:
+            self.add(key, name, rank)
+
+    def add(self, key: Hashable, name: str, rank: Tuple = ()):
+        tokens = station_name_tokens(name)
+        if not tokens:
+            return
+
+        normalized = "".join(tokens)
+        not_main = "hbf" not in tokens
+        exact_rank = (not_main,) + tuple(rank)
+        current = self._exact.get(normalized)
+        if current is None or exact_rank < current[0]:
+            self._exact[normalized] = (exact_rank, key)
+
+        for i in range(len(tokens)):
+            self._insert("".join(tokens[i:]), (not_main, i > 0) + tuple(rank), key)
+
+        grams = _trigrams(_fold(normalized))
+        entry = len(self._fuzzy)
+        self._fuzzy.append((len(grams), exact_rank, key))
+        for gram in grams:
+            self._postings[gram].append(entry)
+
+    def _insert(self, text: str, rank: Tuple, key: Hashable):
+        node = 0
+        self._update_best(node, rank, key)
+        for ch in text:
+            child = self._children[node].get(ch)
+            if child is None:
+                child = len(self._children)
+                self._children[node][ch] = child
+                self._children.append({})
+                self._best.append(None)
+            node = child
+            self._update_best(node, rank, key)
+
+    def _update_best(self, node: int, rank: Tuple, key: Hashable):
+        best = self._best[node]
+        if best is None or rank < best[0]:
+            self._best[node] = (rank, key)
+
+    def resolve(self, query: str) -> Optional[Hashable]:
+        """Key of the best matching station, or None."""
+        normalized = "".join(station_name_tokens(query))
+        if not normalized:
+            return None
+
+        for candidate in (normalized, normalized + "hbf"):
+            hit = self._exact.get(candidate)
+            if hit is not None:
+                return hit[1]
+
+        hit = self._prefix(normalized)
+        if hit is not None:
+            return hit
+
+        return self._fuzzy_match(normalized)
+
+    def _prefix(self, normalized: str) -> Optional[Hashable]:
+        node = 0
+        for ch in normalized:
+            node = self._children[node].get(ch)
+            if node is None:
+                return None
+        best = self._best[node]
+        return best[1] if best else None
+
+    def _fuzzy_match(self, normalized: str) -> Optional[Hashable]:
+        grams = _trigrams(_fold(normalized))
+        common: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for entry in self._postings.get(gram, ()):
+                common[entry] += 1
+
+        best = None
+        for entry, shared in common.items():
+            size, rank, key = self._fuzzy[entry]
+            score = 2.0 * shared / (len(grams) + size)
+            if score < FUZZY_THRESHOLD:
+                continue
+            candidate = (-score, rank)
+            if best is None or candidate < best[0]:
+                best = (candidate, key)
+        return best[1] if best else None
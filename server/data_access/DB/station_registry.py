@@ -0,0 +1,207 @@
+"""
+Process-wide registry of the long-distance stations.
+
+One compact record per station of db_fv_stations.csv (EVA, IFOPT, DS100,
+name), enriched with the connectivity score from top_stations.json and, when
+available, coordinates and platforms from travel.db (coordinates fall back to
+the graph cache file). Everything is parsed once per process; services look
+stations up here by EVA, IFOPT/GTFS stop id, DS100 code or name instead of
+loading their own copies.
+"""
+
+import csv
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+from server.data_access.DB.graph_cache import read_graph_cache
+from server.data_access.DB.station_keys import normalize_station_name
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+STATIONS_CSV_PATH = DATA_DIR / "db_fv_stations.csv"
+TOP_STATIONS_PATH = DATA_DIR / "top_stations.json"
+GRAPH_CACHE_PATH = DATA_DIR / "graph_cache.bin"
+LEGACY_GRAPH_CACHE_PATH = DATA_DIR / "graph_cache.json"
+DB_PATH = DATA_DIR / "travel.db"
+
+# Stations offered by the live board and the agent's departure tool, by
+# display name
+HUB_STATIONS: Dict[str, str] = {
+    "München Hbf": "8000261",
+    "Berlin Hbf": "8011160",
+    "Hamburg Hbf": "8002549",
+    "Frankfurt (Main) Hbf": "8000105",
+    "Lindau-Reutin": "8003693",
+    "Köln Hbf": "8000207",
+    "Stuttgart Hbf": "8000096",
+    "Leipzig Hbf": "8010205",
+    "Dresden Hbf": "8010085",
+    "Hannover Hbf": "8000152",
+    "Nürnberg Hbf": "8000284",
+}
+
+
+def ifopt_prefix(stop_id: str) -> str:
+    """Station part of a GTFS/IFOPT stop id: de:14713:8010205_G -> de:14713:8010205."""
+    return ":".join(stop_id.split("_")[0].split(":")[:3])
+
+
+class StationRecord:
+    __slots__ = ("eva", "ifopt", "ds100", "name", "lat", "lon", "score", "platforms")
+
+    def __init__(self, eva: int, ifopt: str, ds100: str, name: str):
+        self.eva = eva
+        self.ifopt = ifopt
+        self.ds100 = ds100
+        self.name = name
+        self.lat: Optional[float] = None
+        self.lon: Optional[float] = None
+        self.score = 0
+        self.platforms: Tuple[str, ...] = ()
+
+    def __repr__(self) -> str:
+        return f"StationRecord({self.eva}, {self.name!r})"
+
+
+class StationRegistry:
+    def __init__(
+        self,
+        csv_path: Path = STATIONS_CSV_PATH,
+        top_stations_path: Path = TOP_STATIONS_PATH,
+        graph_cache_path: Path = GRAPH_CACHE_PATH,
+        db_path: Path = DB_PATH,
+    ):
+        self._by_eva: Dict[int, StationRecord] = {}
+        self._by_ifopt: Dict[str, StationRecord] = {}
+        self._by_ds100: Dict[str, StationRecord] = {}
+        self._by_name: Dict[str, StationRecord] = {}
+
+        self._load_csv(csv_path)
+        self._load_scores(top_stations_path)
+        if db_path.exists() and db_path.stat().st_size > 0:
+            self._load_db(db_path)
+        self._load_graph_coordinates(graph_cache_path)
+
+    def _load_csv(self, path: Path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    record = StationRecord(
+                        int(row["EVA_NR"]), row["IFOPT"], row["DS100"], row["NAME"]
+                    )
+                    self._by_eva[record.eva] = record
+                    # Platform-section entries share the main station's IFOPT
+                    if record.ifopt:
+                        self._by_ifopt.setdefault(record.ifopt, record)
+                    if record.ds100:
+                        self._by_ds100.setdefault(record.ds100, record)
+                    self._by_name.setdefault(normalize_station_name(record.name), record)
+        except Exception as e:
+            print(f"Error loading stations CSV: {e}")
+
+    def _load_scores(self, path: Path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                top_stations = json.load(f)
+        except Exception as e:
+            print(f"Error loading top stations: {e}")
+            return
+
+        for station in top_stations:
+            record = self.by_ifopt(station["id"])
+            if record is not None:
+                record.score = max(record.score, station["score"])
+
+    def _load_db(self, path: Path):
+        try:
+            conn = sqlite3.connect(path)
+            for stop_id, lat, lon in conn.execute(
+                "SELECT stop_id, stop_lat, stop_lon FROM stations WHERE parent_station IS NULL OR parent_station = ''"
+            ):
+                record = self._by_ifopt.get(stop_id)
+                if record is not None and lat is not None:
+                    record.lat, record.lon = float(lat), float(lon)
+
+            platforms: Dict[int, list] = {}
+            for name, parent in conn.execute(
+                "SELECT name, parent_station_id FROM platforms WHERE parent_station_id IS NOT NULL"
+            ):
+                record = self.by_ifopt(parent)
+                if record is not None and name:
+                    platforms.setdefault(record.eva, []).append(name)
+            for eva, names in platforms.items():
+                self._by_eva[eva].platforms = tuple(sorted(set(names)))
+            conn.close()
+        except Exception as e:
+            print(f"Error loading stations from travel.db: {e}")
+
+    def _load_graph_coordinates(self, path: Path):
+        """Coordinates of stations still without any, from the graph cache nodes."""
+        if all(r.lat is not None for r in self._by_eva.values()):
+            return
+        try:
+            if path.exists():
+                graph = read_graph_cache(path)
+                nodes = zip(graph.ids, graph.lons, graph.lats)
+            else:
+                with open(LEGACY_GRAPH_CACHE_PATH, "r") as f:
+                    nodes = [
+                        (node["id"], *node["pos"])
+                        for node in json.load(f).get("nodes", [])
+                        if node.get("pos")
+                    ]
+        except Exception as e:
+            print(f"Error loading graph cache coordinates: {e}")
+            return
+
+        for stop_id, lon, lat in nodes:
+            record = self.by_ifopt(stop_id)
+            if record is None or record.lat is not None or lon != lon:
+                continue
+            record.lat, record.lon = float(lat), float(lon)
+
+    def __iter__(self) -> Iterator[StationRecord]:
+        return iter(self._by_eva.values())
+
+    def __len__(self) -> int:
+        return len(self._by_eva)
+
+    def get(self, eva: Union[int, str]) -> Optional[StationRecord]:
+        try:
+            return self._by_eva.get(int(eva))
+        except (TypeError, ValueError):
+            return None
+
+    def by_ifopt(self, stop_id: str) -> Optional[StationRecord]:
+        """Record of a GTFS/IFOPT stop id, including platform and suffixed ids."""
+        return self._by_ifopt.get(ifopt_prefix(stop_id))
+
+    def by_ds100(self, code: str) -> Optional[StationRecord]:
+        return self._by_ds100.get(code.strip().upper())
+
+    def by_name(self, name: str) -> Optional[StationRecord]:
+        """Record whose normalised name equals the normalised query."""
+        return self._by_name.get(normalize_station_name(name))
+
+    def importance(self) -> Dict[int, float]:
+        """Connectivity score of every scored station, normalised to [0, 1]."""
+        scores = {r.eva: r.score for r in self._by_eva.values() if r.score > 0}
+        if not scores:
+            return {}
+        max_score = max(scores.values())
+        return {eva: score / max_score for eva, score in scores.items()}
+
+
+_registry: Optional[StationRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_station_registry() -> StationRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = StationRegistry()
+    return _registry
@@ -0,0 +1,92 @@
+"""
+In-process caches for parsed Timetables API responses.
+
+TimetableCache holds parsed stop lists per request URL with a per-entry TTL,
+StationDemand keeps an exponentially decaying count of user-facing lookups
+per station so that background warming can prioritise what is actually asked
+for.
+"""
+
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class TimetableCache:
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # url -> (stored_at, expires_at, stops)
+        self._entries: Dict[str, Tuple[float, float, List[Dict]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[List[Dict]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def put(self, url: str, stops: List[Dict], ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries and url not in self._entries:
+                self._evict(now)
+            self._entries[url] = (now, now + ttl, stops)
+
+    def age(self, url: str) -> float:
+        """Seconds since url was stored, or infinity if it is absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[1] <= now:
+                return math.inf
+            return now - entry[0]
+
+    def _evict(self, now: float):
+        expired = [url for url, entry in self._entries.items() if entry[1] <= now]
+        for url in expired:
+            del self._entries[url]
+
+        if len(self._entries) >= self.max_entries:
+            # Drop the entry closest to expiry
+            oldest = min(self._entries, key=lambda url: self._entries[url][1])
+            del self._entries[oldest]
+
+
+class StationDemand:
+    def __init__(self, half_life_seconds: float = 900.0):
+        self.half_life = half_life_seconds
+        self._lock = threading.Lock()
+        # eva -> (score, last_update)
+        self._scores: Dict[str, Tuple[float, float]] = {}
+
+    def record(self, eva_no: str, weight: float = 1.0):
+        now = time.monotonic()
+        with self._lock:
+            score, updated = self._scores.get(eva_no, (0.0, now))
+            self._scores[eva_no] = (self._decay(score, now - updated) + weight, now)
+
+    def score(self, eva_no: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            score, updated = self._scores.get(eva_no, (0.0, now))
+        return self._decay(score, now - updated)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current decayed score for every station that has been requested."""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._scores.items())
+        return {
+            eva_no: self._decay(score, now - updated)
+            for eva_no, (score, updated) in items
+        }
+
+    def _decay(self, score: float, elapsed: float) -> float:
+        return score * 0.5 ** (elapsed / self.half_life)
@@ -2,17 +2,54 @@ import os
 import urllib.request
 import urllib.error
 import xml.etree.ElementTree as ET
-from datetime import datetime
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
 
 from server.models.train import Train
 from server.models.station import Station
+from server.models.stop import Stop
+from server.data_access.DB.request_coalescer import RequestCoalescer
+from server.data_access.DB.timetable_cache import TimetableCache, StationDemand
+from server.data_access.DB.credential_pool import get_credential_pool
+from server.data_access.DB.station_keys import intern_station
+
+# Planned data never changes once published, full changes are refreshed
+# upstream every 30 seconds.
+PLAN_CACHE_TTL = 6 * 3600
+FCHG_CACHE_TTL = 120
+# Failed or unpublished (404) responses are cached empty for this long, so
+# neither users nor the prefetch scheduler re-request them on every call
+NEGATIVE_CACHE_TTL = 60
+
+REQUEST_TIMEOUT = 10
+
+# Failures that say something about the credential or the upstream rather than
+# the request, and are therefore worth retrying with another key
+RETRYABLE_STATUS = {401, 403, 429, 500, 502, 503, 504}
+
+# Horizon of boards and train lists when the caller gives no end time
+DEFAULT_WINDOW_MINUTES = 60
+
+# Shared by every TimetableService instance (routes, agent tools, linker) so
+# that identical concurrent calls collapse onto a single upstream request and
+# the prefetch scheduler warms the same cache user requests read from.
+_coalescer = RequestCoalescer()
+_cache = TimetableCache()
+_demand = StationDemand()
+_fetch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="timetable-fetch")
 
 
 class TimetableService:
-    BASE_URL = "https://apis.deutschebahn.com/db-api-marketplace/apis/timetables/v1"
-
-    def __init__(self):
+    # Overridable to point at a stand-in such as scripts/fake_timetables_api.py
+    BASE_URL = os.environ.get(
+        "TIMETABLES_BASE_URL",
+        "https://apis.deutschebahn.com/db-api-marketplace/apis/timetables/v1",
+    )
+
+    def __init__(self, base_url: Optional[str] = None):
+        if base_url:
+            self.BASE_URL = base_url.rstrip("/")
         self.troy_client_id = os.environ.get("TROY_CLIENT_ID")
         self.troy_api_key = os.environ.get("TROY_API_KEY")
         self.lars_client_id = os.environ.get("LARS_CLIENT_ID")
@@ -23,27 +60,59 @@ class TimetableService:
                 "Warning: TROY_CLIENT_ID or TROY_API_KEY not set. TimetableService will not work."
             )
 
-    def _make_request(self, endpoint: str) -> Optional[str]:
-        result = self._execute_request(endpoint, self.troy_client_id, self.troy_api_key)
-        if result:
-            return result
+        # Health state is shared with every other instance using the same keys
+        self.credentials = get_credential_pool(
+            [
+                ("troy", self.troy_client_id, self.troy_api_key),
+                ("lars", self.lars_client_id, self.lars_api_key),
+            ]
+        )
 
-        if self.lars_client_id and self.lars_api_key:
-            print(
-                f"⚠️ Primary API key failed for {endpoint}. Switching to fallback (Lars)..."
+    def _make_request(self, endpoint: str) -> Optional[str]:
+        """
+        Request an endpoint with the healthiest available credential, moving
+        on to the next one only if the chosen credential fails.
+        """
+        tried = []
+        while True:
+            cred = self.credentials.acquire(exclude=tried)
+            if cred is None:
+                break
+            tried.append(cred)
+
+            body, status, headers = self._execute_request(
+                endpoint, cred.client_id, cred.api_key
             )
-            return self._execute_request(
-                endpoint, self.lars_client_id, self.lars_api_key
+            if body is not None:
+                self.credentials.record_success(
+                    cred, self._header_int(headers, "X-RateLimit-Remaining")
+                )
+                return body
+
+            if status is not None and status not in RETRYABLE_STATUS:
+                # The request itself is bad (e.g. 404 for an unpublished
+                # plan hour): the key works, but another one would get the
+                # same answer
+                self.credentials.record_success(cred)
+                return None
+
+            self.credentials.record_failure(
+                cred, status, self._header_int(headers, "Retry-After")
             )
+            print(f"⚠️ DB API credential '{cred.name}' failed for {endpoint}.")
 
+        if not tried:
+            print(f"No healthy DB API credential available for {endpoint}.")
         return None
 
     def _execute_request(
         self, endpoint: str, client_id: str, api_key: str
-    ) -> Optional[str]:
-        if not client_id or not api_key:
-            return None
-
+    ) -> Tuple[Optional[str], Optional[int], Dict[str, str]]:
+        """
+        Returns:
+            (body, HTTP status, response headers). body is None on failure,
+            status is None if no HTTP response was received.
+        """
         url = f"{self.BASE_URL}{endpoint}"
         headers = {
             "DB-Client-ID": client_id,
@@ -53,42 +122,175 @@ class TimetableService:
 
         req = urllib.request.Request(url, headers=headers)
         try:
-            with urllib.request.urlopen(req) as response:
-                return response.read().decode("utf-8")
+            with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+                return (
+                    response.read().decode("utf-8"),
+                    response.status,
+                    dict(response.headers),
+                )
         except urllib.error.HTTPError as e:
             print(f"HTTP Error fetching {url}: {e.code} {e.reason}")
-            return None
+            return None, e.code, dict(e.headers or {})
         except Exception as e:
             print(f"Error fetching {url}: {e}")
+            return None, None, {}
+
+    def _header_int(self, headers: Dict[str, str], name: str) -> Optional[int]:
+        for key, value in headers.items():
+            if key.lower() == name.lower():
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    def credential_health(self) -> List[Dict]:
+        """Per-credential state (circuit, throttling, quota estimate, errors)."""
+        return self.credentials.snapshot()
+
+    def _fetch_stops(self, endpoint: str, ttl: float) -> List[Dict]:
+        """
+        Fetch and parse an endpoint, serving it from the shared cache when
+        possible and otherwise sharing the in-flight request and its parsed
+        result with any concurrent caller asking for the same URL.
+        The stop dicts are shared between callers and must not be mutated.
+        """
+        url = f"{self.BASE_URL}{endpoint}"
+        stops = _cache.get(url)
+        if stops is None:
+            stops = self._refresh(endpoint, ttl) or []
+        return list(stops)
+
+    def _refresh(self, endpoint: str, ttl: float) -> Optional[List[Dict]]:
+        """Request and cache an endpoint. Returns None if the request failed."""
+        url = f"{self.BASE_URL}{endpoint}"
+        stops = _coalescer.do(url, lambda: self._request_and_parse(endpoint))
+        if stops is None:
+            _cache.put(url, [], min(ttl, NEGATIVE_CACHE_TTL))
             return None
 
-    def get_timetable(self, eva_no: str, date: datetime) -> List[Dict]:
-        date_str = date.strftime("%y%m%d")
-        hour_str = date.strftime("%H")
-        endpoint = f"/plan/{eva_no}/{date_str}/{hour_str}"
+        _cache.put(url, stops, ttl)
+        return stops
 
+    def _request_and_parse(self, endpoint: str) -> Optional[List[Dict]]:
         xml_data = self._make_request(endpoint)
         if not xml_data:
-            return []
+            return None
 
         return self._parse_timetable_xml(xml_data)
 
+    def _plan_endpoint(self, eva_no: str, date: datetime) -> str:
+        date_str = date.strftime("%y%m%d")
+        hour_str = date.strftime("%H")
+        return f"/plan/{eva_no}/{date_str}/{hour_str}"
+
+    def get_timetable(self, eva_no: str, date: datetime) -> List[Dict]:
+        _demand.record(eva_no)
+        return self._get_plan_slice(eva_no, date)
+
+    def _get_plan_slice(self, eva_no: str, date: datetime) -> List[Dict]:
+        return self._fetch_stops(self._plan_endpoint(eva_no, date), PLAN_CACHE_TTL)
+
+    def get_timetable_window(
+        self, eva_no: str, start: datetime, end: datetime
+    ) -> List[Dict]:
+        """
+        Get the planned stops of every hour slice overlapping [start, end).
+
+        The slices are fetched concurrently and merged, with stops deduplicated
+        by id. Stops are not trimmed to the window, since a delayed stop may
+        still fall into it; callers filter on the effective time.
+        """
+        plan_stops, _ = self._fetch_window(eva_no, start, end, with_changes=False)
+        return plan_stops
+
+    def _fetch_window(
+        self, eva_no: str, start: datetime, end: datetime, with_changes: bool = True
+    ) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Fetch all plan slices of the window and the full changes in parallel."""
+        _demand.record(eva_no)
+
+        slice_futures = [
+            _fetch_executor.submit(self._get_plan_slice, eva_no, hour)
+            for hour in self._hour_slices(start, end)
+        ]
+        changes_future = (
+            _fetch_executor.submit(self.get_realtime_changes, eva_no)
+            if with_changes
+            else None
+        )
+
+        plan_stops = []
+        seen_ids = set()
+        for future in slice_futures:
+            for stop in future.result():
+                if stop["id"] not in seen_ids:
+                    seen_ids.add(stop["id"])
+                    plan_stops.append(stop)
+
+        changes_map = {}
+        if changes_future:
+            changes_map = {s["id"]: s for s in changes_future.result()}
+
+        return plan_stops, changes_map
+
+    def _hour_slices(self, start: datetime, end: datetime) -> List[datetime]:
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        slices = [hour]
+        hour += timedelta(hours=1)
+        while hour < end:
+            slices.append(hour)
+            hour += timedelta(hours=1)
+        return slices
+
     def get_realtime_changes(self, eva_no: str) -> List[Dict]:
+        return self._fetch_stops(f"/fchg/{eva_no}", FCHG_CACHE_TTL)
+
+    def warm_timetable(self, eva_no: str, date: datetime) -> bool:
+        """
+        Make sure the plan slice for the hour of date is cached.
+
+        Returns:
+            True if the slice was fetched, False if it was already cached
+            (also as a recent failure) or the request failed
+        """
+        endpoint = self._plan_endpoint(eva_no, date)
+        if _cache.get(f"{self.BASE_URL}{endpoint}") is not None:
+            return False
+
+        return self._refresh(endpoint, PLAN_CACHE_TTL) is not None
+
+    def warm_realtime_changes(self, eva_no: str, max_age: float) -> bool:
+        """
+        Refresh the cached full changes of a station if older than max_age seconds.
+
+        Returns:
+            True if the changes were fetched, False if the cache was fresh
+            (also as a recent failure) or the request failed
+        """
         endpoint = f"/fchg/{eva_no}"
+        if _cache.age(f"{self.BASE_URL}{endpoint}") < max_age:
+            return False
 
-        xml_data = self._make_request(endpoint)
-        if not xml_data:
-            return []
+        return self._refresh(endpoint, FCHG_CACHE_TTL) is not None
 
-        return self._parse_timetable_xml(xml_data)
+    def station_demand(self) -> Dict[str, float]:
+        """Recent request frequency per EVA number (exponentially decayed)."""
+        return _demand.snapshot()
 
-    def get_station_board(self, eva_no: str, date: datetime) -> List[Dict]:
-        # Fetch plan and changes
-        plan_stops = self.get_timetable(eva_no, date)
-        changes_stops = self.get_realtime_changes(eva_no)
+    def get_station_board(
+        self, eva_no: str, date: datetime, until: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Get the departures of a station between date and until (default: one
+        hour after date), merged with real-time changes.
+        """
+        until = until or date + timedelta(minutes=DEFAULT_WINDOW_MINUTES)
+        window_start = date.strftime("%y%m%d%H%M")
+        window_end = until.strftime("%y%m%d%H%M")
 
-        # Merge changes by ID
-        changes_map = {s["id"]: s for s in changes_stops}
+        # Fetch plan slices and changes concurrently, changes are keyed by stop ID
+        plan_stops, changes_map = self._fetch_window(eva_no, date, until)
 
         merged_board = []
         for stop in plan_stops:
@@ -124,6 +326,11 @@ class TimetableService:
                 if ch_dp.get("delay_msg"):
                     real_time_info["messages"] = ch_dp.get("delay_msg")
 
+            # Timestamps are YYMMddHHmm, so string comparison orders them
+            effective_time = real_time_info.get("time", departure["time"])
+            if not effective_time or not (window_start <= effective_time < window_end):
+                continue
+
             board_entry = {
                 "id": stop_id,
                 "train": stop["trip_label"] or f"{departure['line']}",
@@ -211,25 +418,26 @@ class TimetableService:
         date: datetime,
         include_arrivals: bool = True,
         include_departures: bool = True,
+        until: Optional[datetime] = None,
     ) -> List[Train]:
         """
         Get all trains at a station as Train model objects.
 
         Args:
             station: The station to query
-            date: The date/time to query for
+            date: Start of the time window
             include_arrivals: Include arriving trains
             include_departures: Include departing trains
+            until: End of the time window (defaults to one hour after date)
 
         Returns:
-            List of Train objects with timing and route information
+            List of Train objects with timing and route information whose
+            (real-time or planned) time falls within the window
         """
-        # Get raw timetable data
-        plan_stops = self.get_timetable(str(station.eva), date)
-        changes_stops = self.get_realtime_changes(str(station.eva))
+        until = until or date + timedelta(minutes=DEFAULT_WINDOW_MINUTES)
 
-        # Create a map of changes for quick lookup
-        changes_map = {s["id"]: s for s in changes_stops}
+        # Get raw timetable data for all hour slices plus changes, in parallel
+        plan_stops, changes_map = self._fetch_window(str(station.eva), date, until)
 
         trains = []
 
@@ -255,6 +463,7 @@ class TimetableService:
                     departure=dep,
                     station=station,
                     change=change,
+                    arrival=stop.get("arrival"),
                 )
                 if train:
                     trains.append(train)
@@ -274,11 +483,22 @@ class TimetableService:
                 if train:
                     trains.append(train)
 
+        trains = [t for t in trains if date <= self._effective_time(t) < until]
+
         # Sort by departure time
         trains.sort(key=lambda t: t.departureTime or t.arrivalTime or datetime.max)
 
         return trains
 
+    def _effective_time(self, train: Train) -> datetime:
+        """Real-time departure (or arrival, for terminating trains), else planned."""
+        return (
+            train.actualDepartureTime
+            or train.departureTime
+            or train.actualArrivalTime
+            or train.arrivalTime
+        )
+
     def _create_train_from_departure(
         self,
         stop_id: str,
@@ -287,8 +507,12 @@ class TimetableService:
         departure: Dict,
         station: Station,
         change: Optional[Dict],
+        arrival: Optional[Dict] = None,
     ) -> Optional[Train]:
-        """Create a Train object from departure data."""
+        """
+        Create a Train object from departure data. The planned arrival at this
+        stop, if the train arrives here too, is kept on the board stop.
+        """
         try:
             # Parse departure time
             dep_time_str = departure.get("time")
@@ -317,11 +541,21 @@ class TimetableService:
             path_str = departure.get("path", "")
             if path_str:
                 for station_name in path_str.split("|"):
-                    # We don't have EVA numbers for path stations, use 0 as placeholder
-                    path_stations.append(Station(name=station_name.strip(), eva=0))
+                    # Resolved once per name to a shared Station with its EVA
+                    # number ("0" for stations outside the long-distance list)
+                    path_stations.append(Stop(station=intern_station(station_name)))
 
             # Determine end location (last station in path)
-            end_location = path_stations[-1] if path_stations else station
+            end_location = path_stations[-1].station if path_stations else station
+
+            arr_time_str = None
+            if arrival and arrival.get("time"):
+                try:
+                    arr_time_str = datetime.strptime(
+                        arrival["time"], "%y%m%d%H%M"
+                    ).strftime("%H:%M:%S")
+                except ValueError:
+                    pass
 
             # Parse platform
             platform = None
@@ -343,7 +577,15 @@ class TimetableService:
                 arrivalTime=None,  # We don't know arrival time at destination from this data
                 actualDepartureTime=actual_dep_time,
                 actualArrivalTime=None,
-                path=[station] + path_stations,
+                path=[
+                    Stop(
+                        station=station,
+                        arrivalTime=arr_time_str,
+                        departureTime=dep_time.strftime("%H:%M:%S"),
+                        platform=platform_str,
+                    )
+                ]
+                + path_stations,
                 platform=platform,
                 wagons=[],
                 delayMinutes=delay_minutes,
@@ -390,10 +632,10 @@ class TimetableService:
             path_str = arrival.get("path", "")
             if path_str:
                 for station_name in path_str.split("|"):
-                    path_stations.append(Station(name=station_name.strip(), eva=0))
+                    path_stations.append(Stop(station=intern_station(station_name)))
 
             # Start location is first station in the arrival path
-            start_location = path_stations[0] if path_stations else station
+            start_location = path_stations[0].station if path_stations else station
 
             # Parse platform
             platform = None
@@ -414,7 +656,14 @@ class TimetableService:
                 arrivalTime=arr_time,
                 actualDepartureTime=None,
                 actualArrivalTime=actual_arr_time,
-                path=path_stations + [station],
+                path=path_stations
+                + [
+                    Stop(
+                        station=station,
+                        arrivalTime=arr_time.strftime("%H:%M:%S"),
+                        platform=platform_str,
+                    )
+                ],
                 platform=platform,
                 wagons=[],
                 delayMinutes=delay_minutes,
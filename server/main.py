@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -11,8 +12,25 @@ load_dotenv(env_path)
 
 
 from server.routes import chat, travel, example, connections
+from server.service import container
 
-app = FastAPI(title="Smart Travel Assistant API")
+# Load the graph, registries and shared services once, before a pre-forking
+# server starts its workers
+container.preload()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep hub station timetables warm so live requests rarely wait on the API
+    travel.prefetch_scheduler.start()
+    # Apply logged timetable changes to the station graph off the request path
+    container.get_graph_service().start_refresh()
+    yield
+    container.get_graph_service().stop_refresh()
+    travel.prefetch_scheduler.stop()
+
+
+app = FastAPI(title="Smart Travel Assistant API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -1,28 +1,20 @@
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
+from server.data_access.DB.station_registry import HUB_STATIONS
 from server.data_access.DB.timetable_service import TimetableService
-from server.service.simulation import SimulationService
-from server.service.travel_service import TravelService
+from server.service.container import get_simulation_service, get_travel_service
+from server.service.filter_stations import find_station_by_name
+from server.service.prefetch_service import PrefetchScheduler
 
 router = APIRouter(prefix="/api/v1", tags=["travel"])
 
 timetable_service = TimetableService()
-simulation_service = SimulationService()
-travel_service = TravelService()
-
-STATION_EVA_MAP = {
-    "München Hbf": "8000261",
-    "Berlin Hbf": "8011160",
-    "Hamburg Hbf": "8002549",
-    "Frankfurt (Main) Hbf": "8000105",
-    "Lindau-Reutin": "8003693",
-    "Köln Hbf": "8000207",
-    "Stuttgart Hbf": "8000096",
-    "Leipzig Hbf": "8010205",
-    "Dresden Hbf": "8010085",
-    "Hannover Hbf": "8000152",
-    "Nürnberg Hbf": "8000284",
-}
+simulation_service = get_simulation_service()
+travel_service = get_travel_service()
+
+prefetch_scheduler = PrefetchScheduler(
+    timetable_service, hub_evas=HUB_STATIONS.values()
+)
 
 
 @router.get("/status")
@@ -38,25 +30,26 @@ async def get_ticker():
 
 @router.get("/live/{station_name}")
 async def get_live_station_data(station_name: str):
-    eva_no = STATION_EVA_MAP.get(station_name)
+    eva_no = HUB_STATIONS.get(station_name)
 
     if not eva_no:
-        for name, eva in STATION_EVA_MAP.items():
+        for name, eva in HUB_STATIONS.items():
             if station_name.lower() in name.lower():
                 eva_no = eva
                 station_name = name
                 break
 
     if not eva_no:
-        # Try to find via DB if not in hardcoded map
-        # This is a fallback for the live board if user enters a station not in the map
-        # For now, we keep the map logic but could extend it later.
-        pass
+        # Fall back to any long-distance station of the registry
+        station = find_station_by_name(station_name)
+        if station:
+            eva_no = station.eva
+            station_name = station.name
 
     if not eva_no:
         raise HTTPException(
             status_code=404,
-            detail=f"Station '{station_name}' not found. Available: {', '.join(STATION_EVA_MAP.keys())}",
+            detail=f"Station '{station_name}' not found. Available: {', '.join(HUB_STATIONS.keys())}",
         )
 
     now = datetime.now()
@@ -70,4 +63,4 @@ async def list_stations(q: str = None):
     if q:
         results = travel_service.search_stations(q)
         return {"stations": results}
-    return {"stations": list(STATION_EVA_MAP.keys())}
+    return {"stations": list(HUB_STATIONS.keys())}
@@ -0,0 +1,114 @@
+"""
+Compare StationGraph's array-backed shortest paths with networkx.
+
+Runs every ordered pair of top stations (or a random sample) through
+networkx's Dijkstra and StationGraph's Dijkstra and A*, checks that all three
+agree on the path weight and reports the time per query. With --simple-paths K
+it also compares the first K loopless paths (Yen, with Dijkstra and with A*
+spur searches) of both implementations on a sample of pairs, as used by
+GraphService.find_intermediate_stations.
+
+Run from the repository root:
+    uv run python -m server.scripts.benchmark_graph_paths --sample 5000 --simple-paths 7
+"""
+
+import argparse
+import itertools
+import random
+import time
+
+import networkx as nx
+
+from server.service.graph_service import GraphService
+
+
+def ms_per_query(seconds: float, queries: int) -> float:
+    return seconds * 1000.0 / max(queries, 1)
+
+
+def nx_shortest(G: nx.DiGraph, source: str, target: str):
+    try:
+        path = nx.shortest_path(G, source, target, weight="weight")
+    except nx.NetworkXNoPath:
+        return None
+    return nx.path_weight(G, path, weight="weight")
+
+
+def nx_simple_path_weights(G: nx.DiGraph, source: str, target: str, k: int):
+    try:
+        paths = nx.shortest_simple_paths(G, source, target, weight="weight")
+        return [nx.path_weight(G, p, weight="weight") for p in itertools.islice(paths, k)]
+    except nx.NetworkXNoPath:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark StationGraph shortest paths against networkx")
+    parser.add_argument("--sample", type=int, default=0, help="Random ordered pairs to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--simple-paths", type=int, default=0, help="Also compare the first K loopless paths")
+    parser.add_argument("--simple-pairs", type=int, default=100, help="Pairs for the loopless path comparison")
+    args = parser.parse_args()
+
+    graph = GraphService().station_graph
+    G = graph.to_networkx()
+    pairs = list(itertools.permutations(range(len(graph)), 2))
+    rng = random.Random(args.seed)
+    if args.sample and args.sample < len(pairs):
+        pairs = rng.sample(pairs, args.sample)
+    print(f"{len(graph)} stations, {graph.edge_count} edges, {len(pairs)} pairs")
+
+    start = time.perf_counter()
+    expected = [nx_shortest(G, graph.ids[s], graph.ids[t]) for s, t in pairs]
+    nx_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dijkstra = [graph.shortest_path(s, t) for s, t in pairs]
+    dijkstra_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    astar = [graph.shortest_path(s, t, heuristic=graph.heuristic(t)) for s, t in pairs]
+    astar_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for weight, a, b in zip(expected, dijkstra, astar):
+        if weight != (a[0] if a else None) or weight != (b[0] if b else None):
+            mismatches += 1
+
+    print(f"networkx dijkstra:     {ms_per_query(nx_seconds, len(pairs)):.3f} ms/query")
+    print(f"StationGraph dijkstra: {ms_per_query(dijkstra_seconds, len(pairs)):.3f} ms/query")
+    print(f"StationGraph A*:       {ms_per_query(astar_seconds, len(pairs)):.3f} ms/query")
+    print(f"weight mismatches: {mismatches}")
+
+    if args.simple_paths > 0:
+        k = args.simple_paths
+        sample = rng.sample(pairs, min(args.simple_pairs, len(pairs)))
+
+        start = time.perf_counter()
+        expected = [nx_simple_path_weights(G, graph.ids[s], graph.ids[t], k) for s, t in sample]
+        nx_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = [
+            [weight for weight, _ in itertools.islice(graph.shortest_simple_paths(s, t), k)]
+            for s, t in sample
+        ]
+        yen_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got_astar = [
+            [weight for weight, _ in itertools.islice(graph.shortest_simple_paths(s, t, use_heuristic=True), k)]
+            for s, t in sample
+        ]
+        yen_astar_seconds = time.perf_counter() - start
+
+        mismatches = sum(1 for a, b, c in zip(expected, got, got_astar) if a != b or a != c)
+        print(f"\nfirst {k} loopless paths on {len(sample)} pairs")
+        print(f"networkx:        {ms_per_query(nx_seconds, len(sample)):.2f} ms/query")
+        print(f"StationGraph:    {ms_per_query(yen_seconds, len(sample)):.2f} ms/query")
+        print(f"StationGraph A*: {ms_per_query(yen_astar_seconds, len(sample)):.2f} ms/query")
+        print(f"weight sequence mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
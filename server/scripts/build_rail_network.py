@@ -0,0 +1,202 @@
+"""
+Build data/rail_network.json, the EVA-keyed station adjacency graph used by
+filter_stations to pick the stations between origin and destination.
+
+Sources (any combination, merged):
+    --db          travel.db: consecutive stops of every GTFS trip
+    --ppth DIR    recorded Timetables API plan XML files: each stop's
+                  arrival ppth + station + departure ppth
+    --graph-cache GraphService's graph_cache.bin (already derived from travel.db)
+    --seed        hand-maintained long-distance connections
+                  (data/rail_network_seed.json, merged unless --no-seed)
+
+Stops that are not long-distance stations (no EVA in db_fv_stations.csv) are
+skipped, so their neighbours on the trip are connected directly. The graph
+cache has no trips, so there only a single such stop between two EVA
+stations is contracted.
+
+Run from the repository root:
+    uv run python -m server.scripts.build_rail_network --db --ppth server/api_data
+"""
+
+import argparse
+import json
+import sqlite3
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Set
+
+from server.data_access.DB.graph_cache import read_graph_cache
+from server.data_access.DB.station_keys import get_station_key_resolver
+from server.service.rail_network import (
+    CORRIDOR_MAX_STATIONS,
+    RAIL_NETWORK_PATH,
+    add_path,
+    load_rail_network,
+    save_rail_network,
+)
+
+SERVER_DIR = Path(__file__).parent.parent
+DB_PATH = SERVER_DIR / "data" / "travel.db"
+GRAPH_CACHE_PATH = SERVER_DIR / "data" / "graph_cache.bin"
+SEED_PATH = SERVER_DIR / "data" / "rail_network_seed.json"
+
+
+def add_from_db(adjacency: Dict[int, Set[int]], db_path: Path):
+    resolver = get_station_key_resolver()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT stop_id, parent_station FROM stations")
+    eva_by_stop = {}
+    for stop_id, parent in cursor.fetchall():
+        eva_by_stop[stop_id] = resolver.lookup_ifopt(parent or stop_id)
+
+    cursor.execute("SELECT trip_id, stop_id FROM stop_times ORDER BY trip_id, stop_sequence")
+    current_trip = None
+    trip_evas = []
+    trips = 0
+    while True:
+        rows = cursor.fetchmany(500000)
+        if not rows:
+            break
+        for trip_id, stop_id in rows:
+            if trip_id != current_trip:
+                add_path(adjacency, trip_evas)
+                current_trip = trip_id
+                trip_evas = []
+                trips += 1
+            trip_evas.append(eva_by_stop.get(stop_id))
+    add_path(adjacency, trip_evas)
+
+    conn.close()
+    print(f"travel.db: {trips} trips")
+
+
+def add_from_ppth(adjacency: Dict[int, Set[int]], directory: Path):
+    resolver = get_station_key_resolver()
+    files = 0
+    for path in sorted(directory.glob("plan_*.xml")):
+        try:
+            root = ET.parse(path).getroot()
+        except ET.ParseError as e:
+            print(f"Skipping {path.name}: {e}")
+            continue
+
+        files += 1
+        station = root.get("station", "")
+        for stop in root.findall("s"):
+            arrival = stop.find("ar")
+            departure = stop.find("dp")
+            names = []
+            if arrival is not None and arrival.get("ppth"):
+                names.extend(arrival.get("ppth").split("|"))
+            names.append(station)
+            if departure is not None and departure.get("ppth"):
+                names.extend(departure.get("ppth").split("|"))
+            add_path(adjacency, [resolver.lookup(name) for name in names])
+
+    print(f"ppth: {files} plan files from {directory}")
+
+
+def add_from_graph_cache(adjacency: Dict[int, Set[int]], cache_path: Path):
+    """
+    Contract the top-station graph to EVA stations: every EVA station is
+    linked to its EVA neighbours and to the EVA stations behind one non-EVA
+    neighbour. Longer non-EVA chains are not followed, as the graph does not
+    tell which of their edges belong to the same trip.
+    """
+    resolver = get_station_key_resolver()
+    data = read_graph_cache(cache_path)
+
+    eva_by_node = [resolver.lookup_ifopt(stop_id) for stop_id in data.ids]
+    neighbors = defaultdict(set)
+    for source in range(len(data.ids)):
+        for target in data.targets[data.offsets[source] : data.offsets[source + 1]]:
+            neighbors[source].add(target)
+            neighbors[target].add(source)
+
+    for node, eva in enumerate(eva_by_node):
+        if eva is None:
+            continue
+        for nxt in neighbors[node]:
+            if eva_by_node[nxt] is not None:
+                add_path(adjacency, [eva, eva_by_node[nxt]])
+                continue
+            for behind in neighbors[nxt]:
+                if behind != node:
+                    add_path(adjacency, [eva, eva_by_node[behind]])
+
+    print(f"graph cache: {len(data.ids)} nodes, {len(data.targets)} links")
+
+
+def add_from_seed(adjacency: Dict[int, Set[int]], seed_path: Path):
+    """Add the hand-maintained connections, keyed by EVA number."""
+    with open(seed_path, "r") as f:
+        seed = json.load(f)
+
+    for eva, station in seed.items():
+        for neighbor in station["neighbors"]:
+            add_path(adjacency, [int(eva), neighbor])
+
+    print(f"seed: {len(seed)} stations from {seed_path}")
+
+
+def check_corridors(path: Path, slack: int = 3):
+    """Report corridor sizes over all station pairs of the saved network."""
+    network = load_rail_network(path)
+    sizes = [
+        len(network.corridor(start, end, slack))
+        for start in network.nodes
+        for end in network.nodes
+        if start != end
+    ]
+    if not sizes:
+        return
+    print(f"Corridors: max {max(sizes)}, mean {sum(sizes) / len(sizes):.1f} stations over {len(sizes)} pairs")
+    # Only the stations on shortest paths can exceed the cap
+    over = sum(1 for size in sizes if size > CORRIDOR_MAX_STATIONS)
+    if over:
+        print(f"{over} pairs exceed {CORRIDOR_MAX_STATIONS} stations on their shortest paths alone")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the EVA station adjacency graph")
+    parser.add_argument("--db", nargs="?", const=str(DB_PATH), help="travel.db path")
+    parser.add_argument("--ppth", action="append", default=[], help="Directory of plan_*.xml files")
+    parser.add_argument("--graph-cache", nargs="?", const=str(GRAPH_CACHE_PATH), help="graph_cache.bin path")
+    parser.add_argument("--seed", default=str(SEED_PATH), help="Hand-maintained connections (JSON)")
+    parser.add_argument("--no-seed", action="store_true", help="Do not merge the hand-maintained connections")
+    parser.add_argument("--output", default=str(RAIL_NETWORK_PATH))
+    args = parser.parse_args()
+
+    if not (args.db or args.ppth or args.graph_cache):
+        parser.error("give at least one of --db, --ppth, --graph-cache")
+
+    adjacency: Dict[int, Set[int]] = {}
+    sources = []
+    if args.db:
+        add_from_db(adjacency, Path(args.db))
+        sources.append("travel.db")
+    for directory in args.ppth:
+        add_from_ppth(adjacency, Path(directory))
+        sources.append("ppth")
+    if args.graph_cache:
+        add_from_graph_cache(adjacency, Path(args.graph_cache))
+        sources.append("graph_cache")
+    if not args.no_seed:
+        add_from_seed(adjacency, Path(args.seed))
+        sources.append("seed")
+
+    # Stations that never got a neighbour are of no use for corridors
+    adjacency = {eva: n for eva, n in adjacency.items() if n}
+    edges = sum(len(n) for n in adjacency.values()) // 2
+
+    save_rail_network(adjacency, Path(args.output), source="+".join(sources))
+    print(f"Saved {len(adjacency)} stations, {edges} connections to {args.output}")
+    check_corridors(Path(args.output))
+
+
+if __name__ == "__main__":
+    main()
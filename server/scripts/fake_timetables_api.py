@@ -0,0 +1,389 @@
+"""
+Local stand-in for the DB Timetables API, for load testing.
+
+Implements /plan, /fchg, /rchg and /station. Responses come from the recorded
+XML files in server/api_data when one matches the request, otherwise they are
+synthesised from a deterministic network of lines over db_fv_stations.csv, so
+that the same trip shows up consistently on every station board it serves.
+Latency, error rates, random quota-exceeded responses and a per-client
+minute quota are configurable.
+
+Usage:
+    uv run python scripts/fake_timetables_api.py --port 8081 --latency-ms 150 \
+        --jitter-ms 100 --error-rate 0.02 --quota-rate 0.01 --quota-per-minute 60
+
+Point the server at it with:
+    TIMETABLES_BASE_URL=http://localhost:8081 uv run python main.py
+
+Request counters are available at /_stats and can be reset with /_stats/reset.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import uvicorn
+from fastapi import FastAPI, Header, Response
+
+SERVER_DIR = Path(__file__).parent.parent
+RECORDED_DIR = SERVER_DIR / "api_data"
+STATIONS_CSV_PATH = SERVER_DIR / "data" / "db_fv_stations.csv"
+
+# Major hubs every synthetic line is anchored at, so any two stations are
+# connected with a small number of changes.
+HUB_EVAS = [
+    "8000105",  # Frankfurt(Main)Hbf
+    "8000261",  # München Hbf
+    "8011160",  # Berlin Hbf
+    "8002549",  # Hamburg Hbf
+    "8000207",  # Köln Hbf
+    "8000096",  # Stuttgart Hbf
+    "8010205",  # Leipzig Hbf
+    "8000152",  # Hannover Hbf
+    "8000284",  # Nürnberg Hbf
+    "8000244",  # Mannheim Hbf
+]
+
+STATIONS_PER_LINE = 7
+MINUTES_BETWEEN_STOPS = 12
+DWELL_MINUTES = 2
+SERVICE_START_HOUR = 5
+SERVICE_END_HOUR = 23
+CATEGORIES = ["ICE", "IC", "RE", "RB"]
+
+
+class FakeConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    quota_rate: float = 0.0
+    quota_per_minute: int = 0
+    recorded: bool = True
+
+
+config = FakeConfig()
+stats: Dict[str, int] = defaultdict(int)
+_client_windows: Dict[str, Tuple[int, int]] = {}
+
+
+def load_stations() -> Dict[str, Dict[str, str]]:
+    with open(STATIONS_CSV_PATH, "r", encoding="utf-8") as f:
+        return {row["EVA_NR"]: row for row in csv.DictReader(f)}
+
+
+STATIONS = load_stations()
+
+
+def _stable_int(*parts) -> int:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def build_lines() -> List[Dict]:
+    """Chunk all stations into lines of a few stops, each anchored at two hubs."""
+    hubs = [eva for eva in HUB_EVAS if eva in STATIONS]
+    others = sorted(
+        (eva for eva in STATIONS if eva not in hubs), key=lambda e: _stable_int(e)
+    )
+
+    lines = []
+    for i in range(0, len(others), STATIONS_PER_LINE):
+        chunk = others[i : i + STATIONS_PER_LINE]
+        first_hub = hubs[len(lines) % len(hubs)]
+        last_hub = hubs[(len(lines) * 3 + 1) % len(hubs)]
+        if last_hub == first_hub:
+            last_hub = hubs[(len(lines) + 1) % len(hubs)]
+        stops = [first_hub] + chunk + [last_hub]
+        lines.append(
+            {
+                "index": len(lines),
+                "stops": stops,
+                "category": CATEGORIES[len(lines) % len(CATEGORIES)],
+                "offset": _stable_int("offset", len(lines)) % 60,
+            }
+        )
+
+    # Trunk line through all hubs
+    lines.append(
+        {"index": len(lines), "stops": hubs, "category": "ICE", "offset": 7}
+    )
+    return lines
+
+
+LINES = build_lines()
+LINES_BY_STATION: Dict[str, List[Tuple[Dict, int]]] = defaultdict(list)
+for _line in LINES:
+    for _pos, _eva in enumerate(_line["stops"]):
+        LINES_BY_STATION[_eva].append((_line, _pos))
+
+
+def _name(eva: str) -> str:
+    return STATIONS[eva]["NAME"] if eva in STATIONS else eva
+
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime("%y%m%d%H%M")
+
+
+def _stop_events(eva: str, day: datetime) -> List[Dict]:
+    """All synthetic stop events at a station on one service day."""
+    events = []
+    for line, pos in LINES_BY_STATION.get(eva, []):
+        for direction in (0, 1):
+            stops = line["stops"] if direction == 0 else line["stops"][::-1]
+            idx = pos if direction == 0 else len(stops) - 1 - pos
+            for hour in range(SERVICE_START_HOUR, SERVICE_END_HOUR):
+                start = day.replace(hour=hour, minute=line["offset"])
+                arrival = start + timedelta(minutes=idx * MINUTES_BETWEEN_STOPS)
+                number = 10000 + line["index"] * 100 + direction * 50 + hour
+                trip_id = str(_stable_int("trip", line["index"], direction, _fmt(start)))
+                events.append(
+                    {
+                        "id": f"{trip_id}-{_fmt(start)}-{idx + 1}",
+                        "trip_id": trip_id,
+                        "category": line["category"],
+                        "number": str(number),
+                        "line": str(line["index"]),
+                        "platform": str(_stable_int(eva, line["index"]) % 12 + 1),
+                        "before": stops[:idx],
+                        "after": stops[idx + 1 :],
+                        "arrival": arrival if idx > 0 else None,
+                        "departure": arrival + timedelta(minutes=DWELL_MINUTES)
+                        if idx < len(stops) - 1
+                        else None,
+                    }
+                )
+    return events
+
+
+def _path(evas: List[str]) -> str:
+    return escape("|".join(_name(e) for e in evas), {'"': "&quot;"})
+
+
+def render_plan(eva: str, hour_start: datetime) -> str:
+    hour_end = hour_start + timedelta(hours=1)
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?><timetable station="{escape(_name(eva))}">']
+    for ev in _stop_events(eva, hour_start.replace(hour=0, minute=0)):
+        ref = ev["departure"] or ev["arrival"]
+        if not (hour_start <= ref < hour_end):
+            continue
+        parts.append(f'<s id="{ev["id"]}">')
+        parts.append(f'<tl f="F" t="p" o="80" c="{ev["category"]}" n="{ev["number"]}"/>')
+        if ev["arrival"]:
+            parts.append(
+                f'<ar pt="{_fmt(ev["arrival"])}" pp="{ev["platform"]}" l="{ev["line"]}" ppth="{_path(ev["before"])}"/>'
+            )
+        if ev["departure"]:
+            parts.append(
+                f'<dp pt="{_fmt(ev["departure"])}" pp="{ev["platform"]}" l="{ev["line"]}" ppth="{_path(ev["after"])}"/>'
+            )
+        parts.append("</s>")
+    parts.append("</timetable>")
+    return "".join(parts)
+
+
+def render_changes(eva: str, now: datetime, recent_only: bool) -> str:
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?><timetable station="{escape(_name(eva))}" eva="{eva}">']
+    window_end = now + timedelta(hours=4)
+    for ev in _stop_events(eva, now.replace(hour=0, minute=0, second=0, microsecond=0)):
+        ref = ev["departure"] or ev["arrival"]
+        if not (now - timedelta(hours=1) <= ref < window_end):
+            continue
+        seed = _stable_int("delay", ev["trip_id"])
+        if seed % 10 >= 3:
+            continue  # ~30% of trips are delayed
+        if recent_only and seed % 5:
+            continue
+        delay = seed % 25 + 1
+        msg_ts = _fmt(now)
+        msg = f'<m id="r{seed % 10**8}" t="d" c="{seed % 90 + 1}" ts="{msg_ts}"/>'
+        cp = f' cp="{int(ev["platform"]) + 1}"' if seed % 7 == 0 else ""
+        parts.append(f'<s id="{ev["id"]}" eva="{eva}">')
+        if ev["arrival"]:
+            ct = _fmt(ev["arrival"] + timedelta(minutes=delay))
+            parts.append(f'<ar ct="{ct}"{cp} l="{ev["line"]}">{msg}</ar>')
+        if ev["departure"]:
+            ct = _fmt(ev["departure"] + timedelta(minutes=delay))
+            parts.append(f'<dp ct="{ct}"{cp} l="{ev["line"]}">{msg}</dp>')
+        parts.append("</s>")
+    parts.append("</timetable>")
+    return "".join(parts)
+
+
+def render_stations(pattern: str) -> str:
+    needle = pattern.lower()
+    parts = ["<stations>"]
+    for eva, row in STATIONS.items():
+        if needle in row["NAME"].lower() or needle == eva or needle == row["DS100"].lower():
+            parts.append(
+                f'<station name="{escape(row["NAME"])}" eva="{eva}" ds100="{escape(row["DS100"])}" db="true"/>'
+            )
+    parts.append("</stations>")
+    return "".join(parts)
+
+
+def _recorded(filename: str) -> Optional[str]:
+    if not config.recorded:
+        return None
+    path = RECORDED_DIR / filename
+    if path.exists():
+        return path.read_text(encoding="utf-8")
+    return None
+
+
+app = FastAPI(title="Fake DB Timetables API")
+
+
+async def _simulate(endpoint: str, client_id: Optional[str], api_key: Optional[str]) -> Optional[Response]:
+    """Apply latency and failure injection. Returns an error response or None."""
+    stats["requests"] += 1
+    stats[f"requests_{endpoint}"] += 1
+
+    delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000.0)
+
+    if not client_id or not api_key:
+        stats["unauthorized"] += 1
+        return Response(status_code=401, content="Missing DB-Client-ID or DB-Api-Key")
+
+    if config.quota_per_minute:
+        minute = int(time.time() // 60)
+        window, count = _client_windows.get(client_id, (minute, 0))
+        if window != minute:
+            window, count = minute, 0
+        _client_windows[client_id] = (window, count + 1)
+        if count >= config.quota_per_minute:
+            stats["quota_exceeded"] += 1
+            return Response(status_code=429, content="Quota exceeded", headers={"Retry-After": "60"})
+
+    roll = random.random()
+    if roll < config.quota_rate:
+        stats["quota_exceeded"] += 1
+        return Response(status_code=429, content="Quota exceeded", headers={"Retry-After": "60"})
+    if roll < config.quota_rate + config.error_rate:
+        stats["errors"] += 1
+        return Response(status_code=503, content="Service unavailable")
+
+    return None
+
+
+def _xml(content: str) -> Response:
+    return Response(content=content, media_type="application/xml")
+
+
+@app.get("/plan/{eva_no}/{date}/{hour}")
+async def plan(
+    eva_no: str,
+    date: str,
+    hour: str,
+    db_client_id: Optional[str] = Header(None),
+    db_api_key: Optional[str] = Header(None),
+):
+    error = await _simulate("plan", db_client_id, db_api_key)
+    if error:
+        return error
+
+    recorded = _recorded(f"plan_{eva_no}_{date}_{hour}.xml")
+    if recorded:
+        return _xml(recorded)
+
+    try:
+        hour_start = datetime.strptime(f"{date}{hour}", "%y%m%d%H")
+    except ValueError:
+        return Response(status_code=400, content="Invalid date or hour")
+    return _xml(render_plan(eva_no, hour_start))
+
+
+@app.get("/fchg/{eva_no}")
+async def full_changes(
+    eva_no: str,
+    db_client_id: Optional[str] = Header(None),
+    db_api_key: Optional[str] = Header(None),
+):
+    error = await _simulate("fchg", db_client_id, db_api_key)
+    if error:
+        return error
+
+    recorded = _recorded(f"fchg_{eva_no}.xml")
+    if recorded:
+        return _xml(recorded)
+    return _xml(render_changes(eva_no, datetime.now(), recent_only=False))
+
+
+@app.get("/rchg/{eva_no}")
+async def recent_changes(
+    eva_no: str,
+    db_client_id: Optional[str] = Header(None),
+    db_api_key: Optional[str] = Header(None),
+):
+    error = await _simulate("rchg", db_client_id, db_api_key)
+    if error:
+        return error
+
+    recorded = _recorded(f"rchg_{eva_no}.xml")
+    if recorded:
+        return _xml(recorded)
+    return _xml(render_changes(eva_no, datetime.now(), recent_only=True))
+
+
+@app.get("/station/{pattern}")
+async def station(
+    pattern: str,
+    db_client_id: Optional[str] = Header(None),
+    db_api_key: Optional[str] = Header(None),
+):
+    error = await _simulate("station", db_client_id, db_api_key)
+    if error:
+        return error
+
+    recorded = _recorded(f"station_{pattern}.xml")
+    if recorded:
+        return _xml(recorded)
+    return _xml(render_stations(pattern))
+
+
+@app.get("/_stats")
+async def get_stats():
+    return dict(stats)
+
+
+@app.post("/_stats/reset")
+async def reset_stats():
+    stats.clear()
+    return {"status": "ok"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake DB Timetables API for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Base latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--quota-per-minute", type=int, default=0, help="Per client id minute quota (0 = unlimited)")
+    parser.add_argument("--synthetic-only", action="store_true", help="Ignore the recorded XML in api_data")
+    args = parser.parse_args()
+
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.error_rate = args.error_rate
+    config.quota_rate = args.quota_rate
+    config.quota_per_minute = args.quota_per_minute
+    config.recorded = not args.synthetic_only
+
+    print(f"Serving fake Timetables API with {len(STATIONS)} stations and {len(LINES)} synthetic lines.")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
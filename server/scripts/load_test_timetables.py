@@ -0,0 +1,96 @@
+"""
+Concurrent load test of TimetableService against the fake Timetables API.
+
+Start the stand-in first:
+    uv run python scripts/fake_timetables_api.py --port 8081
+
+Then run, from the repository root:
+    uv run python -m server.scripts.load_test_timetables --users 50 --requests 20
+
+Reports client-side latency percentiles together with the number of upstream
+calls the fake server actually received, which shows the effect of caching
+and request coalescing.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from server.data_access.DB import timetable_service as timetable_module
+from server.data_access.DB.timetable_service import TimetableService
+
+DEFAULT_STATIONS = ["8000105", "8000261", "8011160", "8002549", "8000207"]
+
+
+def fetch_json(url: str, method: str = "GET") -> dict:
+    req = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test TimetableService")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8081")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent callers")
+    parser.add_argument("--requests", type=int, default=20, help="Board requests per caller")
+    parser.add_argument("--stations", nargs="*", default=DEFAULT_STATIONS)
+    args = parser.parse_args()
+
+    # The fake server only checks that credentials are present
+    os.environ.setdefault("TROY_CLIENT_ID", "load-test")
+    os.environ.setdefault("TROY_API_KEY", "load-test")
+
+    service = TimetableService(base_url=args.base_url)
+    fetch_json(f"{args.base_url}/_stats/reset", method="POST")
+
+    latencies = []
+
+    def user(seed: int):
+        rng = random.Random(seed)
+        for _ in range(args.requests):
+            station = rng.choice(args.stations)
+            start = time.perf_counter()
+            service.get_station_board(station, datetime.now())
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(user, range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    upstream = fetch_json(f"{args.base_url}/_stats")
+    total = len(latencies)
+
+    print(f"Board requests:     {total} in {elapsed:.2f}s ({total / elapsed:.1f}/s)")
+    print(
+        f"Latency ms:         p50={percentile(latencies, 50):.1f} "
+        f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f}"
+    )
+    print(f"Upstream requests:  {upstream.get('requests', 0)} {upstream}")
+    print(
+        f"Cache:              {timetable_module._cache.hits} hits, "
+        f"{timetable_module._cache.misses} misses"
+    )
+    print(
+        f"Coalescer:          {timetable_module._coalescer.executed} executed, "
+        f"{timetable_module._coalescer.shared} shared"
+    )
+    for cred in service.credential_health():
+        print(f"Credential {cred['name']}:  {cred}")
+
+
+if __name__ == "__main__":
+    main()
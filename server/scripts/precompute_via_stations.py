@@ -0,0 +1,66 @@
+"""
+Precompute GraphService's via stations for pairs of top stations into
+data/via_table.bin, next to the graph cache.
+
+GraphService reads the table as long as it was built on the current graph
+(same fingerprint) and falls back to searching paths for pairs it does not
+hold; rebuild it after the graph changed. All ordered pairs of the 600 top
+stations take a while on one core, so --top limits the table to the pairs of
+the highest scored stations and --workers spreads the origins over processes.
+
+Run from the repository root (after the graph cache was built):
+    uv run python -m server.scripts.precompute_via_stations --top 150 --workers 4
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from server.service.graph_service import CACHE_PATH, VIA_TABLE_PATH
+from server.service.station_graph import load_station_graph
+from server.service.via_stations import build_via_table, intermediate_indices, save_via_table
+
+
+def compute_rows(origins: List[int], stations: List[int]) -> List[Tuple[int, int, List[int]]]:
+    """Via stations from every origin to every other of the stations (run in a worker)."""
+    graph, _ = load_station_graph(CACHE_PATH)
+    return [
+        (origin, destination, intermediate_indices(graph, origin, destination))
+        for origin in origins
+        for destination in stations
+        if destination != origin
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute via stations for pairs of top stations")
+    parser.add_argument("--top", type=int, default=0, help="Only pairs of the N highest scored stations (default: all)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes computing the pairs")
+    args = parser.parse_args()
+
+    graph, _ = load_station_graph(CACHE_PATH)
+    stations = sorted(range(len(graph)), key=lambda i: (-graph.scores[i], graph.ids[i]))
+    if args.top > 0:
+        stations = stations[: args.top]
+    print(f"Computing via stations for {len(stations) * (len(stations) - 1)} pairs...")
+
+    start = time.perf_counter()
+    workers = max(1, args.workers)
+    chunks = [stations[i::workers] for i in range(workers)]
+    if workers == 1:
+        results = [compute_rows(chunks[0], stations)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compute_rows, chunks, [stations] * workers))
+
+    table = build_via_table(graph, (row for rows in results for row in rows))
+    save_via_table(table, VIA_TABLE_PATH)
+    print(
+        f"Saved {len(table)} pairs ({len(table.stations)} via entries) to {VIA_TABLE_PATH} "
+        f"in {time.perf_counter() - start:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
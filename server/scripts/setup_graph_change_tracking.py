@@ -0,0 +1,42 @@
+"""
+Install (or remove) the stop_times change log of GraphService in travel.db.
+
+With the log installed, GraphService applies timetable changes to the station
+graph incrementally (see service/graph_updates.py) instead of rebuilding it
+whenever travel.db changed. Every write to stop_times then also writes a log
+row, so consider removing it before large bulk ingests. The graph is rebuilt
+after installing, so that it matches the database state the log starts from.
+
+Run from the repository root:
+    uv run python -m server.scripts.setup_graph_change_tracking
+    uv run python -m server.scripts.setup_graph_change_tracking --remove
+"""
+
+import argparse
+import sqlite3
+
+from server.service.graph_service import DB_PATH, GraphService
+from server.service.graph_updates import install_change_tracking, remove_change_tracking
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install or remove the stop_times change log of the station graph")
+    parser.add_argument("--remove", action="store_true", help="Drop the triggers and the log table")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if args.remove:
+            remove_change_tracking(conn)
+            print(f"Removed stop_times change tracking from {DB_PATH}.")
+            return
+        install_change_tracking(conn)
+        print(f"Installed stop_times change tracking in {DB_PATH}.")
+    finally:
+        conn.close()
+
+    GraphService().build_graph()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Process-wide instances of the heavy services.
+
+GraphService (station graph, via memo), TravelService (travel.db connection)
+and SimulationService (live delay feed) are built once per process on first
+use and shared by the routes, the chat tools and JourneyService instead of
+every module constructing its own.
+
+preload() builds them together with the station registry and indexes they
+read from, then moves everything alive into the garbage collector's
+permanent generation (gc.freeze). Called by main.py at import, so under a
+pre-forking server (e.g. gunicorn --preload with uvicorn workers) the workers
+inherit the loaded graph and registries and share their pages copy-on-write;
+collections in the workers no longer touch, and thereby copy, those pages.
+Services holding connections reopen them in the child (see TravelService).
+"""
+
+import gc
+import os
+import threading
+import time
+from typing import Optional
+
+from server.data_access.DB.station_geo_index import get_station_geo_index
+from server.data_access.DB.station_keys import get_station_key_resolver
+from server.data_access.DB.station_registry import get_station_registry
+from .filter_stations import get_station_name_index
+from .graph_service import GraphService
+from .rail_network import get_rail_network
+from .simulation import SimulationService
+from .travel_service import TravelService
+
+_graph_service: Optional[GraphService] = None
+_travel_service: Optional[TravelService] = None
+_simulation_service: Optional[SimulationService] = None
+# Reentrant: get_travel_service builds the simulation service under it
+_lock = threading.RLock()
+
+
+def get_graph_service() -> GraphService:
+    global _graph_service
+    if _graph_service is None:
+        with _lock:
+            if _graph_service is None:
+                _graph_service = GraphService()
+    return _graph_service
+
+
+def get_simulation_service() -> SimulationService:
+    global _simulation_service
+    if _simulation_service is None:
+        with _lock:
+            if _simulation_service is None:
+                _simulation_service = SimulationService()
+    return _simulation_service
+
+
+def get_travel_service() -> TravelService:
+    global _travel_service
+    if _travel_service is None:
+        with _lock:
+            if _travel_service is None:
+                _travel_service = TravelService(simulation=get_simulation_service())
+    return _travel_service
+
+
+def preload():
+    """Build the shared services and station data before the server forks workers."""
+    if os.getenv("PRELOAD_SERVICES", "1") == "0":
+        return
+    start = time.perf_counter()
+    get_station_registry()
+    get_station_key_resolver()
+    get_station_name_index()
+    get_station_geo_index()
+    get_rail_network()
+    get_graph_service()
+    get_travel_service()
+
+    # Long-lived from here on: keep the collector from scanning (and, in
+    # forked workers, copying) them
+    gc.collect()
+    gc.freeze()
+    print(f"Services preloaded in {time.perf_counter() - start:.1f}s.")
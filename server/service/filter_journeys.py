@@ -1,11 +1,17 @@
-from typing import List, Dict, Optional, Tuple, Set
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+import heapq
 from collections import defaultdict
 
 from server.models.train import Train
 from server.models.journey import Journey
+from server.models.leg import Leg
 from server.models.station import Station
-from server.models.station_change import StationChange
+from server.data_access.DB.station_keys import station_key
+from server.service.trip_stitching import TripTimeline, stitch_trips
+from server.service.journey_selection import DEFAULT_TOP_K, ParetoTopK
+from server.data_access.DB.station_geo_index import get_station_geo_index
 
 
 # Minimum transfer time between trains (in minutes)
@@ -18,26 +24,134 @@ MAX_TRANSFER_TIME = 120
 MAX_CHANGES = 3
 
 
+class TrainIndex:
+    """
+    Station-keyed index over the stitched trips of one request.
+
+    Board entries are first joined into one timeline per trip (see
+    trip_stitching), so every trip appears once with exact times at each
+    station a board was fetched for. For every station key the index holds
+    the trips that can be boarded there as a list sorted by departure time,
+    together with the position of the station in the trip's timeline.
+    Finding connections is then a range lookup instead of a scan over all trains.
+    """
+
+    def __init__(self, trains: List[Train]):
+        self.trips: List[TripTimeline] = [t for t in stitch_trips(trains) if t.stops]
+        # Per trip: station key -> first position in its timeline
+        self.positions: List[Dict[int, int]] = []
+
+        boardings: Dict[int, List[Tuple[datetime, int, int]]] = defaultdict(list)
+        for i, trip in enumerate(self.trips):
+            positions: Dict[int, int] = {}
+            for pos, key in enumerate(trip.keys):
+                positions.setdefault(key, pos)
+            self.positions.append(positions)
+
+            # The last stop can't be boarded
+            for key, pos in positions.items():
+                if pos < len(trip.keys) - 1:
+                    boardings[key].append((trip.departures[pos], i, pos))
+
+        self._boardings: Dict[int, List[Tuple[datetime, int, int]]] = {}
+        self._boarding_times: Dict[int, List[datetime]] = {}
+        for key, entries in boardings.items():
+            entries.sort(key=lambda e: (e[0], e[1]))
+            self._boardings[key] = entries
+            self._boarding_times[key] = [e[0] for e in entries]
+
+    def departures_between(
+        self, station_key: int, earliest: datetime, latest: Optional[datetime] = None
+    ) -> List[Tuple[datetime, int, int]]:
+        """(departure time, trip index, timeline position) of trips boardable in the window."""
+        times = self._boarding_times.get(station_key)
+        if not times:
+            return []
+
+        lo = bisect_left(times, earliest)
+        hi = len(times) if latest is None else bisect_right(times, latest)
+        return self._boardings[station_key][lo:hi]
+
+    def position(self, trip_idx: int, station_key: int) -> Optional[int]:
+        return self.positions[trip_idx].get(station_key)
+
+    def arrival_at(self, trip_idx: int, position: int) -> datetime:
+        return self.trips[trip_idx].arrivals[position]
+
+    def departure_at(self, trip_idx: int, position: int) -> datetime:
+        return self.trips[trip_idx].departures[position]
+
+
+class _Label:
+    """
+    A way to be at a station: arrival time there, rides taken so far and the
+    departure from the origin it started with. `ride` is the last ride as
+    (trip index, board position, alight position), `parent` the label it was
+    boarded from. Labels reached on foot from their parent have walked set and
+    no ride of their own.
+    """
+
+    __slots__ = ("station", "arrival", "rides", "origin_departure", "ride", "parent", "walked", "dominated")
+
+    def __init__(self, station, arrival, rides, origin_departure, ride=None, parent=None, walked=False):
+        self.station = station
+        self.arrival = arrival
+        self.rides = rides
+        self.origin_departure = origin_departure
+        self.ride = ride
+        self.parent = parent
+        self.walked = walked
+        self.dominated = False
+
+    def dominates(self, other: "_Label") -> bool:
+        return (
+            self.arrival <= other.arrival
+            and self.rides <= other.rides
+            and self.origin_departure >= other.origin_departure
+        )
+
+    def chain(self) -> List[Tuple[int, int, int]]:
+        rides = []
+        label = self
+        while label is not None:
+            if label.ride is not None:
+                rides.append(label.ride)
+            label = label.parent
+        rides.reverse()
+        return rides
+
+
 def find_possible_journeys(
     all_trains: List[Train],
     start_station: Station,
     end_station: Station,
     departure_time: Optional[datetime] = None,
+    max_changes: int = MAX_CHANGES,
+    max_results: int = DEFAULT_TOP_K,
 ) -> List[Journey]:
     """
     Find all possible journeys from start to end using the given trains.
 
     This algorithm:
-    1. Groups trains by their train number (e.g., "ICE 920")
-    2. Finds direct trains that go from start to end
-    3. Finds connecting journeys where you change trains at intermediate stations
-    4. Filters for valid connections (arrival time + transfer time < departure time)
+    1. Stitches the trains of all station boards into trips and builds a
+       station-keyed index over them once per request
+    2. Runs a label-setting search from the start station: labels are
+       expanded in order of arrival time, each ride boards the trips leaving
+       a station within the transfer window (arrival time + transfer time <
+       departure time)
+    3. Keeps per station only labels that are not dominated on (arrival,
+       rides, departure from the origin), so each extra change level only
+       adds the labels that are actually better in some respect
+    4. Collects the rides that reach the end in a bounded Pareto top-k on
+       (arrival, transfers, departure); only the survivors become Journeys
 
     Args:
         all_trains: List of all trains from all relevant stations
         start_station: The origin station
         end_station: The destination station
         departure_time: Minimum departure time (defaults to now)
+        max_changes: Maximum number of changes in a journey
+        max_results: Maximum number of journeys returned
 
     Returns:
         List of Journey objects sorted by total travel time
@@ -45,376 +159,222 @@ def find_possible_journeys(
     if departure_time is None:
         departure_time = datetime.now()
 
-    # Group trains by train number for easier lookup
-    trains_by_number = _group_trains_by_number(all_trains)
-
-    # Index trains by departure station for connection finding
-    trains_by_departure_station = _index_trains_by_departure_station(all_trains)
+    index = TrainIndex(all_trains)
+    start_key = station_key(start_station)
+    end_key = station_key(end_station)
 
-    journeys: List[Journey] = []
-
-    # Find direct journeys first
-    direct_journeys = _find_direct_journeys(
-        all_trains, start_station, end_station, departure_time
-    )
-    journeys.extend(direct_journeys)
-
-    # Find journeys with one change
-    one_change_journeys = _find_journeys_with_changes(
-        all_trains,
-        trains_by_departure_station,
-        start_station,
-        end_station,
-        departure_time,
-        max_changes=1,
-    )
-    journeys.extend(one_change_journeys)
+    collector = ParetoTopK(max_results)
+    _search_rides(index, start_key, end_key, departure_time, max_changes, collector)
 
-    # Find journeys with two changes (if needed)
-    if len(journeys) < 5:
-        two_change_journeys = _find_journeys_with_changes(
-            all_trains,
-            trains_by_departure_station,
+    return [
+        _create_journey(
+            index,
+            rides,
             start_station,
             end_station,
-            departure_time,
-            max_changes=2,
+            description=_describe(index, rides, start_station, end_station),
         )
-        journeys.extend(two_change_journeys)
-
-    # Remove duplicates and sort by total time
-    journeys = _deduplicate_journeys(journeys)
-    journeys.sort(key=lambda j: j.totalTime)
-
-    return journeys
-
-
-def _group_trains_by_number(trains: List[Train]) -> Dict[str, List[Train]]:
-    """Group trains by their train number."""
-    grouped: Dict[str, List[Train]] = defaultdict(list)
-    for train in trains:
-        grouped[train.trainNumber].append(train)
-    return grouped
-
-
-def _index_trains_by_departure_station(trains: List[Train]) -> Dict[str, List[Train]]:
-    """Index trains by their departure station name (lowercased for matching)."""
-    indexed: Dict[str, List[Train]] = defaultdict(list)
-    for train in trains:
-        key = train.startLocation.name.lower()
-        indexed[key].append(train)
-
-        # Also index by stations in the path where this train could be boarded
-        # (but this would require knowing arrival times at each station)
-    return indexed
-
-
-def _station_matches(station1: Station, station2: Station) -> bool:
-    """Check if two stations refer to the same location."""
-    # If EVA numbers are available and non-zero, compare them
-    if station1.eva > 0 and station2.eva > 0:
-        return station1.eva == station2.eva
-
-    # Otherwise compare names (case-insensitive, partial match)
-    name1 = station1.name.lower()
-    name2 = station2.name.lower()
-
-    return name1 == name2 or name1 in name2 or name2 in name1
-
-
-def _station_in_path(station: Station, path: List[Station]) -> bool:
-    """Check if a station is in a train's path."""
-    for path_station in path:
-        if _station_matches(station, path_station):
-            return True
-    return False
+        for rides in collector.results()
+    ]
 
 
-def _find_direct_journeys(
-    trains: List[Train],
-    start_station: Station,
-    end_station: Station,
+def _search_rides(
+    index: TrainIndex,
+    start_key: int,
+    end_key: int,
     min_departure_time: datetime,
-) -> List[Journey]:
-    """Find direct trains that go from start to end without changes."""
-    journeys = []
-
-    for train in trains:
-        # Check if this train departs from or passes through start station
-        departs_from_start = _station_matches(train.startLocation, start_station)
-        passes_through_start = _station_in_path(start_station, train.path)
-
-        if not (departs_from_start or passes_through_start):
-            continue
-
-        # Check if this train goes to or passes through end station
-        arrives_at_end = _station_matches(train.endLocation, end_station)
-        passes_through_end = _station_in_path(end_station, train.path)
+    max_changes: int,
+    collector: ParetoTopK,
+):
+    """
+    Label-setting search for ride sequences from start to end with at most
+    max_changes changes. Every ride sequence found, as a list of (trip index,
+    board position, alight position), is offered to the collector.
 
-        if not (arrives_at_end or passes_through_end):
-            continue
+    A change may include a walk to a nearby station from the precomputed
+    footpath table (e.g. Hamburg Hbf to Hamburg Dammtor); the transfer window
+    then starts after the walk.
+    """
+    footpaths = get_station_geo_index()
+    bags: Dict[int, List[_Label]] = defaultdict(list)
+    heap: List[Tuple[datetime, int, int, _Label]] = []
+    counter = 0
 
-        # Check departure time
-        if train.departureTime and train.departureTime < min_departure_time:
-            continue
+    start = _Label(start_key, min_departure_time, 0, min_departure_time)
+    heapq.heappush(heap, (start.arrival, 0, counter, start))
 
-        # Verify the order: start must come before end in the path
-        if not _verify_station_order(train.path, start_station, end_station):
+    while heap:
+        _, _, _, label = heapq.heappop(heap)
+        if label.dominated:
             continue
 
-        # Calculate journey time (estimate if arrival time not available)
-        total_time = _estimate_journey_time(train, start_station, end_station)
-
-        journey = Journey(
-            startStation=start_station,
-            endStation=end_station,
-            trains=[train],
-            changes=None,
-            totalTime=total_time,
-            description=f"Direct {train.trainNumber} from {start_station.name} to {end_station.name}",
-        )
-        journeys.append(journey)
-
-    return journeys
-
-
-def _verify_station_order(path: List[Station], start: Station, end: Station) -> bool:
-    """Verify that start station comes before end station in the path."""
-    start_idx = -1
-    end_idx = -1
-
-    for i, station in enumerate(path):
-        if start_idx < 0 and _station_matches(station, start):
-            start_idx = i
-        if _station_matches(station, end):
-            end_idx = i
-
-    return start_idx >= 0 and end_idx >= 0 and start_idx < end_idx
-
-
-def _estimate_journey_time(train: Train, start: Station, end: Station) -> int:
-    """Estimate journey time in minutes based on path length."""
-    # If we have actual times, use them
-    if train.departureTime and train.arrivalTime:
-        return int((train.arrivalTime - train.departureTime).total_seconds() / 60)
-
-    # Estimate based on number of stops (roughly 15-20 minutes per stop for long-distance)
-    start_idx = 0
-    end_idx = len(train.path) - 1
-
-    for i, station in enumerate(train.path):
-        if _station_matches(station, start):
-            start_idx = i
-        if _station_matches(station, end):
-            end_idx = i
-            break
-
-    num_stops = end_idx - start_idx
-
-    # Estimate based on train category
-    if train.trainCategory in ["ICE"]:
-        minutes_per_stop = 15
-    elif train.trainCategory in ["IC", "EC"]:
-        minutes_per_stop = 18
-    elif train.trainCategory in ["RE"]:
-        minutes_per_stop = 12
-    else:
-        minutes_per_stop = 8  # S-Bahn, RB
-
-    return max(num_stops * minutes_per_stop, 10)
+        if label.rides > 0 and not label.walked:
+            for to_key, minutes in footpaths.walking_transfers(label.station):
+                if to_key == start_key:
+                    continue
+                candidate = _Label(
+                    to_key,
+                    label.arrival + timedelta(minutes=minutes),
+                    label.rides,
+                    label.origin_departure,
+                    parent=label,
+                    walked=True,
+                )
+                if not _insert_label(bags[to_key], candidate):
+                    continue
 
+                counter += 1
+                heapq.heappush(heap, (candidate.arrival, candidate.rides, counter, candidate))
 
-def _find_journeys_with_changes(
-    all_trains: List[Train],
-    trains_by_departure: Dict[str, List[Train]],
-    start_station: Station,
-    end_station: Station,
-    min_departure_time: datetime,
-    max_changes: int = 1,
-) -> List[Journey]:
-    """Find journeys that require changing trains."""
-    journeys = []
-
-    # Find all trains departing from start station
-    first_leg_trains = [
-        t
-        for t in all_trains
-        if (
-            _station_matches(t.startLocation, start_station)
-            or _station_in_path(start_station, t.path[:1])
-        )  # Check if it's the first stop
-        and t.departureTime
-        and t.departureTime >= min_departure_time
-    ]
+        if label.rides == 0:
+            # No transfer window at the origin: any later departure will do
+            boardings = index.departures_between(start_key, min_departure_time)
+        else:
+            boardings = index.departures_between(
+                label.station,
+                label.arrival + timedelta(minutes=MIN_TRANSFER_TIME),
+                label.arrival + timedelta(minutes=MAX_TRANSFER_TIME),
+            )
 
-    for first_train in first_leg_trains:
-        # For each potential change station in the first train's path
-        for change_station in first_train.path[1:]:  # Skip the first station (start)
-            # Skip if this is the end station (would be a direct journey)
-            if _station_matches(change_station, end_station):
-                continue
+        used_trips = {ride[0] for ride in label.chain()}
+        can_change = label.rides < max_changes
 
-            # Estimate arrival time at change station
-            arrival_at_change = _estimate_arrival_time(first_train, change_station)
-            if not arrival_at_change:
+        for dep_time, trip_idx, board_pos in boardings:
+            if trip_idx in used_trips:
                 continue
 
-            # Find connecting trains from this station
-            min_connection_time = arrival_at_change + timedelta(
-                minutes=MIN_TRANSFER_TIME
-            )
-            max_connection_time = arrival_at_change + timedelta(
-                minutes=MAX_TRANSFER_TIME
-            )
-
-            # Look for trains departing from the change station
-            connecting_trains = _find_connecting_trains(
-                all_trains,
-                change_station,
-                end_station,
-                min_connection_time,
-                max_connection_time,
-            )
-
-            for second_train in connecting_trains:
-                # Calculate total journey time
-                total_time = _calculate_total_journey_time(
-                    [first_train, second_train],
-                    [change_station],
-                    start_station,
-                    end_station,
-                )
+            origin_departure = dep_time if label.rides == 0 else label.origin_departure
+            end_pos = index.position(trip_idx, end_key)
+            if end_pos is not None and end_pos > board_pos:
+                _offer(index, collector, label.chain() + [(trip_idx, board_pos, end_pos)])
+                last_pos = end_pos
+            else:
+                last_pos = len(index.trips[trip_idx].keys)
 
-                # Create the journey
-                change = StationChange(
-                    station=change_station,
-                    timeMinutes=int(
-                        (second_train.departureTime - arrival_at_change).total_seconds()
-                        / 60
-                    )
-                    if second_train.departureTime
-                    else MIN_TRANSFER_TIME,
-                )
+            if not can_change:
+                continue
 
-                journey = Journey(
-                    startStation=start_station,
-                    endStation=end_station,
-                    trains=[first_train, second_train],
-                    changes=[change],
-                    totalTime=total_time,
-                    description=f"{first_train.trainNumber} to {change_station.name}, then {second_train.trainNumber} to {end_station.name}",
+            trip = index.trips[trip_idx]
+            for pos in range(board_pos + 1, last_pos):
+                key = trip.keys[pos]
+                if key == start_key:
+                    continue
+
+                candidate = _Label(
+                    key,
+                    trip.arrivals[pos],
+                    label.rides + 1,
+                    origin_departure,
+                    ride=(trip_idx, board_pos, pos),
+                    parent=label,
                 )
-                journeys.append(journey)
-
-    return journeys
+                if not _insert_label(bags[key], candidate):
+                    continue
 
+                counter += 1
+                heapq.heappush(heap, (candidate.arrival, candidate.rides, counter, candidate))
 
-def _estimate_arrival_time(train: Train, station: Station) -> Optional[datetime]:
-    """Estimate arrival time at a station along the train's route."""
-    if not train.departureTime:
-        return None
 
-    # Find the station in the path
-    station_idx = -1
-    for i, path_station in enumerate(train.path):
-        if _station_matches(path_station, station):
-            station_idx = i
-            break
+def _offer(index: TrainIndex, collector: ParetoTopK, rides: List[Tuple[int, int, int]]):
+    first_idx, first_board, _ = rides[0]
+    last_idx, _, last_alight = rides[-1]
+    # Journeys with the same train sequence are duplicates
+    key = tuple(
+        index.trips[trip_idx].train_at(board_pos).trainNumber
+        for trip_idx, board_pos, _ in rides
+    )
+    collector.offer(
+        index.departure_at(first_idx, first_board),
+        index.arrival_at(last_idx, last_alight),
+        len(rides) - 1,
+        rides,
+        key=key,
+    )
 
-    if station_idx < 0:
-        return None
 
-    # Estimate time based on position in path
-    minutes_per_stop = 15 if train.trainCategory in ["ICE", "IC"] else 10
-    estimated_minutes = station_idx * minutes_per_stop
+def _insert_label(bag: List[_Label], candidate: _Label) -> bool:
+    """Add candidate to a station's Pareto bag unless an existing label dominates it."""
+    for existing in bag:
+        if existing.dominates(candidate):
+            return False
 
-    return train.departureTime + timedelta(minutes=estimated_minutes)
+    for existing in bag:
+        if candidate.dominates(existing):
+            existing.dominated = True
+    bag[:] = [existing for existing in bag if not existing.dominated]
+    bag.append(candidate)
+    return True
 
 
-def _find_connecting_trains(
-    all_trains: List[Train],
-    change_station: Station,
+def _describe(
+    index: TrainIndex,
+    rides: List[Tuple[int, int, int]],
+    start_station: Station,
     end_station: Station,
-    min_departure: datetime,
-    max_departure: datetime,
-) -> List[Train]:
-    """Find trains that depart from change_station and go to end_station."""
-    connecting = []
-
-    for train in all_trains:
-        # Check if this train departs from or passes through the change station
-        departs_from_change = _station_matches(train.startLocation, change_station)
-        passes_through_change = _station_in_path(
-            change_station, train.path[:3]
-        )  # Early in path
-
-        if not (departs_from_change or passes_through_change):
-            continue
-
-        # Check if this train goes to the end station
-        arrives_at_end = _station_matches(train.endLocation, end_station)
-        passes_through_end = _station_in_path(end_station, train.path)
-
-        if not (arrives_at_end or passes_through_end):
-            continue
-
-        # Check departure time is within the connection window
-        if not train.departureTime:
-            continue
-
-        if train.departureTime < min_departure or train.departureTime > max_departure:
-            continue
-
-        # Verify station order
-        if not _verify_station_order(train.path, change_station, end_station):
-            continue
-
-        connecting.append(train)
-
-    return connecting
-
-
-def _calculate_total_journey_time(
-    trains: List[Train], change_stations: List[Station], start: Station, end: Station
-) -> int:
-    """Calculate total journey time including travel and transfer times."""
-    total_minutes = 0
-
-    for i, train in enumerate(trains):
-        if i == 0:
-            # First leg: from start to first change
-            if change_stations:
-                leg_time = _estimate_journey_time(train, start, change_stations[0])
-            else:
-                leg_time = _estimate_journey_time(train, start, end)
-        elif i == len(trains) - 1:
-            # Last leg: from last change to end
-            leg_time = _estimate_journey_time(train, change_stations[-1], end)
-        else:
-            # Middle leg: between changes
-            leg_time = _estimate_journey_time(
-                train, change_stations[i - 1], change_stations[i]
+) -> str:
+    trip_idx, board_pos, _ = rides[0]
+    first_train = index.trips[trip_idx].train_at(board_pos)
+    if len(rides) == 1:
+        return f"Direct {first_train.trainNumber} from {start_station.name} to {end_station.name}"
+
+    parts = []
+    alighted_at = None
+    for i, (trip_idx, board_pos, alight_pos) in enumerate(rides):
+        trip = index.trips[trip_idx]
+        boarded_at = trip.stops[board_pos].station
+        if alighted_at is not None and station_key(boarded_at) != station_key(alighted_at):
+            parts.append(f"walk to {boarded_at.name}")
+        destination = end_station if i == len(rides) - 1 else trip.stops[alight_pos].station
+        parts.append(f"{trip.train_at(board_pos).trainNumber} to {destination.name}")
+        alighted_at = trip.stops[alight_pos].station
+    return ", then ".join(parts)
+
+
+def _format_time(dt: Optional[datetime]) -> str:
+    return dt.strftime("%H:%M:%S") if dt else ""
+
+
+def _create_journey(
+    index: TrainIndex,
+    rides: List[Tuple[int, int, int]],
+    start_station: Station,
+    end_station: Station,
+    description: str,
+) -> Journey:
+    """
+    Build a Journey from rides given as (trip index, board position, alight position).
+    """
+    legs = []
+    for trip_idx, board_pos, alight_pos in rides:
+        trip = index.trips[trip_idx]
+        train = trip.train_at(board_pos)
+        board_stop = trip.stops[board_pos]
+        alight_stop = trip.stops[alight_pos]
+        legs.append(
+            Leg(
+                origin=board_stop.station,
+                destination=alight_stop.station,
+                train=train,
+                departureTime=_format_time(index.departure_at(trip_idx, board_pos)),
+                arrivalTime=_format_time(index.arrival_at(trip_idx, alight_pos)),
+                delayInMinutes=train.delayMinutes,
+                departurePlatform=board_stop.platform or "0",
+                arrivalPlatform=alight_stop.platform or "0",
             )
+        )
 
-        total_minutes += leg_time
-
-    # Add transfer times
-    for station in change_stations:
-        total_minutes += MIN_TRANSFER_TIME
-
-    return total_minutes
-
-
-def _deduplicate_journeys(journeys: List[Journey]) -> List[Journey]:
-    """Remove duplicate journeys based on train combinations."""
-    seen: Set[str] = set()
-    unique = []
-
-    for journey in journeys:
-        # Create a key from train numbers
-        key = "-".join(t.trainNumber for t in journey.trains)
-        if key not in seen:
-            seen.add(key)
-            unique.append(journey)
-
-    return unique
+    first_idx, first_board, _ = rides[0]
+    last_idx, _, last_alight = rides[-1]
+    departure = index.departure_at(first_idx, first_board)
+    arrival = index.arrival_at(last_idx, last_alight)
+    total_time = int((arrival - departure).total_seconds() / 60) if departure and arrival else 0
+
+    return Journey(
+        id="-".join(leg.train.trainId or leg.train.trainNumber for leg in legs),
+        startStation=start_station,
+        endStation=end_station,
+        legs=legs,
+        transfers=len(rides) - 1,
+        totalTime=total_time,
+        description=description,
+    )
@@ -1,36 +1,269 @@
 import sqlite3
-import networkx as nx
+import math
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 import json
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ..data_access.DB.station_name_index import StationNameIndex
+from .graph_updates import (
+    apply_trip_changes,
+    change_tracking_installed,
+    changes_logged,
+    data_version,
+    pending_changes,
+    prune_changes,
+)
+from .station_graph import (
+    NO_CHECKSUM,
+    EdgeDurations,
+    NodeAttributes,
+    StationGraph,
+    db_checksum,
+    load_station_graph,
+    save_station_graph,
+)
+from .via_stations import ViaCache, ViaTable, intermediate_indices, load_via_table
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 DB_PATH = Path(__file__).parent.parent / "data" / "travel.db"
-CACHE_PATH = Path(__file__).parent.parent / "data" / "graph_cache.json"
+CACHE_PATH = Path(__file__).parent.parent / "data" / "graph_cache.bin"
+# node_link JSON cache of earlier versions, converted on first load
+LEGACY_CACHE_PATH = Path(__file__).parent.parent / "data" / "graph_cache.json"
 TOP_STATIONS_PATH = Path(__file__).parent.parent / "data" / "top_stations.json"
+# Via stations precomputed for pairs of top stations (scripts/precompute_via_stations.py)
+VIA_TABLE_PATH = Path(__file__).parent.parent / "data" / "via_table.bin"
+
+# Seconds between checks for logged timetable changes by the background
+# refresh thread (0 disables them)
+REFRESH_INTERVAL = float(os.getenv("GRAPH_REFRESH_SECONDS", "60"))
+
+# Station pairs whose via stations are memoised (0 disables the memo)
+VIA_CACHE_SIZE = int(os.getenv("VIA_CACHE_SIZE", "4096"))
+
+# Minutes from midnight of an HH:MM:SS column (hours may exceed 23)
+_MINUTES = "(CAST(substr({col}, 1, instr({col}, ':') - 1) AS INTEGER) * 60 + CAST(substr({col}, instr({col}, ':') + 1, 2) AS INTEGER))"
+
+# Number of trip hops per edge between consecutive top stations of a trip
+# and duration. Travel times crossing midnight get a day added; unparseable
+# times count as 30 minutes (see graph_updates.hop_duration). The whole table is read through the stop_id index from the
+# few top stops; a trip id range through the trip_id index instead.
+_EDGES_SQL = f"""
+WITH top_stop_times AS (
+    SELECT st.trip_id, st.stop_sequence, ts.station_id, st.arrival_time, st.departure_time
+    FROM {{source}}
+    WHERE {{trip_filter}}
+),
+hops AS (
+    SELECT
+        station_id AS source,
+        departure_time,
+        LEAD(station_id) OVER trip AS target,
+        LEAD(arrival_time) OVER trip AS arrival_time
+    FROM top_stop_times
+    WINDOW trip AS (PARTITION BY trip_id ORDER BY stop_sequence)
+),
+durations AS (
+    SELECT source, target,
+        CASE
+            WHEN departure_time NOT LIKE '%:%' OR arrival_time NOT LIKE '%:%'
+              OR departure_time IS NULL OR arrival_time IS NULL THEN 30
+            ELSE {_MINUTES.format(col="arrival_time")} - {_MINUTES.format(col="departure_time")}
+        END AS duration
+    FROM hops
+    WHERE target IS NOT NULL AND target != source
+)
+SELECT source, target, CASE WHEN duration < 0 THEN duration + 1440 ELSE duration END AS minutes, COUNT(*)
+FROM durations
+GROUP BY source, target, minutes
+"""
+
+
+def _create_top_stops(conn: sqlite3.Connection, top_ids: List[str]):
+    """
+    Temp table mapping every stop_id whose canonical station (its parent, or
+    itself) is a top station to that station.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS top_ids (stop_id TEXT PRIMARY KEY)")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS top_stops (stop_id TEXT PRIMARY KEY, station_id TEXT)")
+    conn.execute("DELETE FROM temp.top_ids")
+    conn.execute("DELETE FROM temp.top_stops")
+    conn.executemany("INSERT OR IGNORE INTO temp.top_ids VALUES (?)", [(i,) for i in top_ids])
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO temp.top_stops
+        SELECT stop_id, COALESCE(NULLIF(parent_station, ''), stop_id) AS station_id
+        FROM stations
+        WHERE COALESCE(NULLIF(parent_station, ''), stop_id) IN (SELECT stop_id FROM temp.top_ids)
+        """
+    )
+    # Stop ids missing from the stations table stand for themselves
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO temp.top_stops
+        SELECT stop_id, stop_id FROM temp.top_ids
+        WHERE stop_id NOT IN (SELECT stop_id FROM stations)
+        """
+    )
+
+
+def _extract_edge_durations(
+    conn: sqlite3.Connection,
+    top_ids: List[str],
+    trip_range: Tuple[Optional[str], Optional[str]] = (None, None),
+) -> EdgeDurations:
+    """
+    Duration multiset per (source, target) edge over the trips with
+    lower <= trip_id < upper (None leaves that side open).
+    """
+    lower, upper = trip_range
+    source = "temp.top_stops ts CROSS JOIN stop_times st ON st.stop_id = ts.stop_id"
+    conditions, params = ["1"], []
+    if lower is not None:
+        conditions.append("st.trip_id >= ?")
+        params.append(lower)
+    if upper is not None:
+        conditions.append("st.trip_id < ?")
+        params.append(upper)
+    if params:
+        source = "stop_times st CROSS JOIN temp.top_stops ts ON ts.stop_id = st.stop_id"
+
+    _create_top_stops(conn, top_ids)
+    sql = _EDGES_SQL.format(source=source, trip_filter=" AND ".join(conditions))
+    edge_durations: EdgeDurations = {}
+    for u, v, duration, count in conn.execute(sql, params):
+        edge_durations.setdefault((u, v), {})[duration] = count
+    return edge_durations
+
+
+def _extract_range(top_ids: List[str], trip_range: Tuple[Optional[str], Optional[str]], db_path: Path) -> EdgeDurations:
+    conn = sqlite3.connect(db_path)
+    try:
+        return _extract_edge_durations(conn, top_ids, trip_range)
+    finally:
+        conn.close()
+
+
+def _trip_ranges(conn: sqlite3.Connection, parts: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split the trip ids into up to `parts` contiguous ranges of similar size."""
+    total = conn.execute("SELECT count(*) FROM trips").fetchone()[0]
+    bounds: List[Optional[str]] = [None]
+    for k in range(1, parts):
+        row = conn.execute(
+            "SELECT trip_id FROM trips ORDER BY trip_id LIMIT 1 OFFSET ?", (total * k // parts,)
+        ).fetchone()
+        if row is not None and row[0] != bounds[-1]:
+            bounds.append(row[0])
+    bounds.append(None)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _extract_all(top_ids: List[str], workers: int, db_path: Path = DB_PATH) -> Tuple[EdgeDurations, int]:
+    """
+    Edge duration multisets of the whole timetable and the data version they
+    reflect. With several workers, trip id ranges are extracted in separate
+    processes; if the timetable changes meanwhile, the ranges would not share
+    one snapshot, so the extraction is repeated in a single transaction.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if workers > 1:
+            version = data_version(conn)
+            ranges = _trip_ranges(conn, workers)
+            edge_durations: EdgeDurations = {}
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_extract_range, top_ids, trip_range, db_path) for trip_range in ranges]
+                for future in futures:
+                    for edge, counts in future.result().items():
+                        merged = edge_durations.setdefault(edge, {})
+                        for duration, count in counts.items():
+                            merged[duration] = merged.get(duration, 0) + count
+            if data_version(conn) == version:
+                return edge_durations, version
+            print("Timetable changed during the build, extracting again in one transaction...")
+
+        conn.execute("BEGIN")
+        try:
+            version = data_version(conn)
+            return _extract_edge_durations(conn, top_ids), version
+        finally:
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+
 
 class GraphService:
     def __init__(self):
-        self.graph = nx.DiGraph()
+        self.station_graph = StationGraph.from_edges({}, {})
+        # Optional networkx export of station_graph, built on first access of .graph
+        self._graph: Optional["nx.DiGraph"] = None
+        # (graph, name lookup over its nodes), built on first use
+        self._name_index: Optional[Tuple[StationGraph, StationNameIndex]] = None
+        # Bumped whenever station_graph is replaced; part of the via cache key
+        self._graph_version = 0
+        self._via_cache = ViaCache(VIA_CACHE_SIZE)
+        # (graph, precomputed via table built on it or None), read on first use
+        self._via_table: Optional[Tuple[StationGraph, Optional[ViaTable]]] = None
+        self._refresh_lock = threading.RLock()
+        self._stop_refresh = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
         self.load_graph()
 
+    @property
+    def graph(self) -> "nx.DiGraph":
+        if self._graph is None:
+            self._graph = self.station_graph.to_networkx()
+        return self._graph
+
+    def _set_station_graph(self, station_graph: StationGraph):
+        self.station_graph = station_graph
+        self._graph = None
+        self._graph_version += 1
+        # Entries of older versions can no longer be hit
+        self._via_cache.clear()
+        self._via_table = None
+
     def _get_conn(self):
         return sqlite3.connect(DB_PATH, check_same_thread=False)
 
     def load_graph(self):
         """
-        Loads the graph from cache or builds it from the DB.
+        Loads the graph from the binary cache, converts the legacy JSON cache
+        or builds it from the DB.
         """
+        checksum = db_checksum(DB_PATH)
         if CACHE_PATH.exists():
             print("Loading graph from cache...")
             try:
-                with open(CACHE_PATH, "r") as f:
-                    data = json.load(f)
-                    self.graph = nx.node_link_graph(data)
-                print(f"Graph loaded: {self.graph.number_of_nodes()} nodes, {self.graph.number_of_edges()} edges.")
-                return
+                station_graph, cached_checksum = load_station_graph(CACHE_PATH)
+                if NO_CHECKSUM in (checksum, cached_checksum) or checksum == cached_checksum:
+                    self._set_station_graph(station_graph)
+                    print(f"Graph loaded: {len(station_graph)} nodes, {station_graph.edge_count} edges.")
+                    return
+                if station_graph.has_durations and self._tracks_changes():
+                    # travel.db was written since; apply its logged timetable changes
+                    self._set_station_graph(station_graph)
+                    print(f"Graph loaded: {len(station_graph)} nodes, {station_graph.edge_count} edges.")
+                    if not self.refresh():
+                        self.save_cache(checksum)
+                    return
+                print("Graph cache is out of date with travel.db. Rebuilding...")
             except Exception as e:
                 print(f"Failed to load cache: {e}. Rebuilding...")
+        elif LEGACY_CACHE_PATH.exists():
+            print("Converting JSON graph cache...")
+            try:
+                with open(LEGACY_CACHE_PATH, "r") as f:
+                    self._set_station_graph(StationGraph.from_node_link(json.load(f)))
+                print(f"Graph loaded: {len(self.station_graph)} nodes, {self.station_graph.edge_count} edges.")
+                self.save_cache(checksum)
+                return
+            except Exception as e:
+                print(f"Failed to convert JSON cache: {e}. Rebuilding...")
 
         self.build_graph()
 
@@ -38,257 +271,275 @@ class GraphService:
         """
         Builds the graph from GTFS data.
         1. Loads top stations (nodes).
-        2. Iterates through stop_times to find connections (edges).
+        2. Extracts connections (edges) from stop_times in SQL.
         3. Caches the graph.
         """
         print("Building graph from database...")
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
+
         # 1. Load Top Stations
         print("Loading top stations...")
-        if not TOP_STATIONS_PATH.exists():
-            print("Error: top_stations.json not found. Run calculate_connectivity.py first.")
+        stations = self._load_top_stations()
+        if stations is None:
             return
 
-        with open(TOP_STATIONS_PATH, "r") as f:
-            top_stations_list = json.load(f)
-            
-        stations = {s['id']: s for s in top_stations_list}
-        
+        conn = sqlite3.connect(DB_PATH)
+
         # Add nodes to graph
         print("Fetching station coordinates...")
-        placeholders = ','.join(['?'] * len(stations))
-        cursor.execute(f"SELECT stop_id, stop_lat, stop_lon FROM stations WHERE stop_id IN ({placeholders})", list(stations.keys()))
-        
-        for row in cursor.fetchall():
-            stop_id = row['stop_id']
-            if stop_id in stations:
-                self.graph.add_node(stop_id, name=stations[stop_id]['name'], pos=(row['stop_lon'], row['stop_lat']), score=stations[stop_id]['score'])
-
-        print(f"Added {self.graph.number_of_nodes()} top stations to graph.")
-
-        # 2. Build Stop Mapping (stop_id -> canonical_id)
-        # We need to map every stop_id in the system to its parent (if it exists) so we can link trips to the top stations.
-        print("Building stop mapping...")
-        cursor.execute("SELECT stop_id, parent_station FROM stations")
-        stop_map = {}
-        for row in cursor:
-            # If parent exists, use it. Else use stop_id.
-            canonical = row['parent_station'] if row['parent_station'] else row['stop_id']
-            stop_map[row['stop_id']] = canonical
-
-        # 3. Find trips connecting these stations
-        print("Fetching trip data...")
-        
-        chunk_size = 500000
-        cursor.execute("SELECT count(*) FROM stop_times")
-        total_rows = cursor.fetchone()[0]
-        print(f"Processing {total_rows} stop_times entries...")
-        
-        cursor.execute("SELECT trip_id, stop_id, arrival_time, departure_time, stop_sequence FROM stop_times ORDER BY trip_id, stop_sequence")
-        
-        current_trip_id = None
-        trip_stops = []
-        
-        count = 0
-        while True:
-            rows = cursor.fetchmany(chunk_size)
-            if not rows:
-                break
-                
-            for row in rows:
-                trip_id = row['trip_id']
-                
-                if trip_id != current_trip_id:
-                    # Process previous trip
-                    if current_trip_id and len(trip_stops) >= 2:
-                        self._add_trip_to_graph(trip_stops)
-                    current_trip_id = trip_id
-                    trip_stops = []
-                
-                # Map stop_id to canonical
-                s_id = row['stop_id']
-                canonical_id = stop_map.get(s_id, s_id)
-                
-                # Only add if it's a top station
-                if canonical_id in stations:
-                    trip_stops.append({
-                        'stop_id': canonical_id,
-                        'arrival_time': row['arrival_time'],
-                        'departure_time': row['departure_time']
-                    })
-            
-            count += len(rows)
-            print(f"Processed {count}/{total_rows} rows...", end='\r')
-            
-        # Process last trip
-        if current_trip_id and len(trip_stops) >= 2:
-            self._add_trip_to_graph(trip_stops)
-            
+        nodes = self._node_attributes(conn, stations, list(stations))
+        print(f"Added {len(nodes)} top stations to graph.")
+        conn.close()
+
+        # 2. Extract edges between consecutive top stations of every trip in SQL
+        workers = max(1, int(os.getenv("GRAPH_BUILD_WORKERS", "1")))
+        print(f"Extracting edges from stop_times ({workers} worker(s))...")
+        edge_durations, version = _extract_all(list(stations), workers, DB_PATH)
+        edges = {edge: min(counts) for edge, counts in edge_durations.items()}
+        self._add_missing_nodes(nodes, edges, stations)
+
+        self._set_station_graph(StationGraph.from_edges(nodes, edges, edge_durations, version))
         print("\nGraph build complete.")
-        print(f"Graph built: {self.graph.number_of_nodes()} nodes, {self.graph.number_of_edges()} edges.")
+        print(f"Graph built: {len(self.station_graph)} nodes, {self.station_graph.edge_count} edges.")
         
         # Save to cache
-        self.save_cache()
+        self.save_cache(db_checksum(DB_PATH))
 
-    def _add_trip_to_graph(self, stops: List[Dict]):
-        # stops is a list of dicts with stop_id (canonical), arrival_time, departure_time
-        for i in range(len(stops) - 1):
-            u = stops[i]
-            v = stops[i+1]
-            
-            if u['stop_id'] == v['stop_id']:
-                continue # Skip self-loops (e.g. platform change within same station)
-                
-            weight = self._calculate_duration(u['departure_time'], v['arrival_time'])
-            
-            # Add edge or update weight (min weight)
-            if self.graph.has_edge(u['stop_id'], v['stop_id']):
-                current_weight = self.graph[u['stop_id']][v['stop_id']]['weight']
-                if weight < current_weight:
-                    self.graph[u['stop_id']][v['stop_id']]['weight'] = weight
+    def _load_top_stations(self) -> Optional[Dict[str, dict]]:
+        if not TOP_STATIONS_PATH.exists():
+            print("Error: top_stations.json not found. Run calculate_connectivity.py first.")
+            return None
+
+        with open(TOP_STATIONS_PATH, "r") as f:
+            top_stations_list = json.load(f)
+        return {s['id']: s for s in top_stations_list}
+
+    def _node_attributes(self, conn: sqlite3.Connection, stations: Dict[str, dict], stop_ids: List[str]) -> NodeAttributes:
+        """Attributes of the given top stations that have coordinates in the stations table."""
+        nodes: NodeAttributes = {}
+        if not stop_ids:
+            return nodes
+        placeholders = ','.join(['?'] * len(stop_ids))
+        cursor = conn.execute(f"SELECT stop_id, stop_lat, stop_lon FROM stations WHERE stop_id IN ({placeholders})", list(stop_ids))
+        for stop_id, lat, lon in cursor.fetchall():
+            if stop_id in stations:
+                nodes[stop_id] = (stations[stop_id]['name'], float(lon), float(lat), stations[stop_id]['score'])
+        return nodes
+
+    def _add_missing_nodes(self, nodes: NodeAttributes, edges: Dict[Tuple[str, str], int], stations: Dict[str, dict]):
+        """Stations reached by trips but missing from the stations table."""
+        for u, v in edges:
+            for stop_id in (u, v):
+                if stop_id not in nodes:
+                    nodes[stop_id] = (stations[stop_id]['name'], math.nan, math.nan, stations[stop_id]['score'])
+
+    def _tracks_changes(self) -> bool:
+        if db_checksum(DB_PATH) == NO_CHECKSUM:
+            return False
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            return change_tracking_installed(conn)
+        finally:
+            conn.close()
+
+    def refresh(self) -> bool:
+        """
+        Applies the stop_times changes logged since the graph was built (see
+        graph_updates). Returns True if the graph was updated.
+        """
+        with self._refresh_lock:
+            if not self._tracks_changes():
+                return False
+
+            graph = self.station_graph
+            conn = sqlite3.connect(DB_PATH, isolation_level=None)
+            try:
+                # One snapshot for the log and the current trip rows
+                conn.execute("BEGIN")
+                version = data_version(conn)
+                if version <= graph.data_version:
+                    return False
+                if graph.has_durations and not changes_logged(conn, graph.data_version, version):
+                    # Another process saved a newer graph and pruned changes
+                    # this one lacks; continue from its cache
+                    graph = self._cached_graph_since(conn, version)
+                if graph.has_durations:
+                    updated = self._apply_changes(conn, graph, version)
+            finally:
+                if conn.in_transaction:
+                    conn.execute("COMMIT")
+                conn.close()
+
+            if graph.has_durations:
+                self._set_station_graph(updated)
+                self.save_cache(db_checksum(DB_PATH))
             else:
-                self.graph.add_edge(u['stop_id'], v['stop_id'], weight=weight)
+                print("Graph has no edge multisets to update. Rebuilding...")
+                self.build_graph()
+            return True
 
-    def _calculate_duration(self, start_time_str: str, end_time_str: str) -> int:
-        """Calculates duration in minutes, handling midnight crossing."""
+    def _cached_graph_since(self, conn: sqlite3.Connection, version: int) -> StationGraph:
+        """
+        The cached graph if the log holds all changes from it up to version,
+        otherwise an empty graph without multisets, which refresh rebuilds.
+        """
         try:
-            t1 = self._parse_time(start_time_str)
-            t2 = self._parse_time(end_time_str)
-            duration = t2 - t1
-            if duration < 0:
-                duration += 24 * 60 # Handle midnight crossing
-            return duration
-        except:
-            return 30 # Default fallback
-
-    def _parse_time(self, time_str: str) -> int:
-        """Converts HH:MM:SS to minutes from midnight."""
-        parts = time_str.split(':')
-        return int(parts[0]) * 60 + int(parts[1])
+            cached, _ = load_station_graph(CACHE_PATH)
+            if cached.has_durations and changes_logged(conn, cached.data_version, version):
+                return cached
+        except Exception as e:
+            print(f"Failed to load cache: {e}")
+        print("Logged changes since the graph were pruned.")
+        return StationGraph.from_edges({}, {})
+
+    def _apply_changes(self, conn: sqlite3.Connection, graph: StationGraph, version: int) -> StationGraph:
+        stations = self._load_top_stations() or {}
+        _create_top_stops(conn, list(stations))
+        top_stops = dict(conn.execute("SELECT stop_id, station_id FROM temp.top_stops"))
+
+        changes = pending_changes(conn, graph.data_version, version)
+        edge_durations = graph.edge_durations()
+        touched = apply_trip_changes(conn, top_stops, edge_durations, changes)
+
+        # Only edges whose multiset changed get a new minimum
+        edges = graph.edges()
+        for edge in touched:
+            counts = edge_durations.get(edge)
+            if counts:
+                edges[edge] = min(counts)
+            else:
+                edges.pop(edge, None)
+
+        nodes = graph.nodes()
+        missing = [stop_id for edge in edges for stop_id in edge if stop_id not in nodes]
+        if missing:
+            nodes.update(self._node_attributes(conn, stations, missing))
+            self._add_missing_nodes(nodes, edges, stations)
+
+        print(f"Graph updated: {len(changes)} changed trips, {len(touched)} edges touched (data version {version}).")
+        return StationGraph.from_edges(nodes, edges, edge_durations, version)
+
+    def start_refresh(self):
+        """Apply logged timetable changes every REFRESH_INTERVAL seconds on a background thread."""
+        if REFRESH_INTERVAL <= 0 or (self._refresh_thread and self._refresh_thread.is_alive()):
+            return
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=self._run_refresh, name="graph-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self):
+        self._stop_refresh.set()
+        if self._refresh_thread:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+    def _run_refresh(self):
+        while not self._stop_refresh.wait(REFRESH_INTERVAL):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Graph refresh failed: {e}")
 
     def find_intermediate_stations(self, origin_name: str, destination_name: str) -> List[str]:
         """
         Finds interesting intermediate stations between origin and destination.
         """
+        # One graph for the whole search, even if a refresh replaces it
+        # meanwhile (version read first: _set_station_graph bumps it after
+        # replacing the graph)
+        version = self._graph_version
+        graph = self.station_graph
+
         # 1. Resolve names to IDs
-        origin_id = self._find_node_by_name(origin_name)
-        dest_id = self._find_node_by_name(destination_name)
+        origin_id = self._find_node_by_name(origin_name, graph)
+        dest_id = self._find_node_by_name(destination_name, graph)
         
         if not origin_id or not dest_id:
             print(f"Could not resolve {origin_name} or {destination_name}")
             return []
             
-        # 2. Find paths
-        try:
-            # Use shortest path on WEIGHT (time)
-            # This avoids the "direct edge is shortest" issue if the direct train is actually slower (unlikely)
-            # But if there is a direct ICE, it will be the shortest path.
-            
-            # We want to find "via" options.
-            # Strategy: Find the shortest path. Then find paths that are slightly longer.
-            # Or: Remove the direct edge and find shortest path?
-            
-            # 1. Shortest Path (Time)
-            shortest_path = nx.shortest_path(self.graph, origin_id, dest_id, weight='weight')
-            
-            intermediates = set()
-            if len(shortest_path) > 2:
-                intermediates.update(shortest_path[1:-1])
-                
-            # 2. Alternative Paths (Time + 20%)
-            # We use k_shortest_paths or similar. 
-            # Simple approach: simple paths with cutoff is too slow/broad.
-            # Better: shortest_simple_paths (returns generator)
-            
-            try:
-                path_gen = nx.shortest_simple_paths(self.graph, origin_id, dest_id, weight='weight')
-                
-                # Get baseline duration
-                baseline_duration = nx.path_weight(self.graph, shortest_path, weight='weight')
-                max_duration = baseline_duration * 1.2 # 20% buffer
-                
-                count = 0
-                for path in path_gen:
-                    if count > 5: break # Limit to top 5 paths
-                    
-                    duration = nx.path_weight(self.graph, path, weight='weight')
-                    if duration > max_duration:
-                        break
-                        
-                    if len(path) > 2:
-                        # Add major stations from this path
-                        # Filter by score? Or just add all?
-                        # Let's add all for now, the graph is already filtered to top stations.
-                        intermediates.update(path[1:-1])
-                    
-                    count += 1
-            except Exception as e:
-                print(f"Pathfinding warning: {e}")
-            
-            # Convert back to names and sort by score
-            results = []
-            for stop_id in intermediates:
-                node = self.graph.nodes[stop_id]
-                results.append({
-                    "name": node['name'],
-                    "score": node.get('score', 0)
-                })
-            
-            # Sort by score descending
-            results.sort(key=lambda x: x['score'], reverse=True)
-            
-            return [r['name'] for r in results]
-            
-        except nx.NetworkXNoPath:
-            return []
+        # 2. Memoised or precomputed result for this graph
+        key = (origin_id, dest_id, version)
+        names = self._via_cache.get(key)
+        if names is not None:
+            return list(names)
 
-    def _find_node_by_name(self, name: str) -> Optional[str]:
-        name_lower = name.lower().replace(" hbf", " hauptbahnhof").replace(" (main)", "")
-        
-        candidates = []
-        for node, data in self.graph.nodes(data=True):
-            node_name = data['name'].lower().replace(" hbf", " hauptbahnhof").replace(" (main)", "")
-            if name_lower in node_name or node_name in name_lower:
-                candidates.append(node)
-        
-        if not candidates:
-            return None
-            
-        # Return the candidate with the highest degree (most connected)
-        # This avoids picking a disconnected bus stop platform
-        best_node = max(candidates, key=lambda n: self.graph.degree(n))
-        return best_node
-
-    def save_cache(self):
-        # Convert sets to lists for JSON serialization
-        data = nx.node_link_data(self.graph)
-        print(f"Graph data keys: {data.keys()}")
-        
-        links_key = 'links' if 'links' in data else 'edges'
-        if links_key in data:
-            for link in data[links_key]:
-                if 'lines' in link and isinstance(link['lines'], set):
-                    link['lines'] = list(link['lines'])
-        else:
-            print("Warning: No links/edges found in graph data.")
-        
+        origin = graph.index[origin_id]
+        destination = graph.index[dest_id]
+        table = self._get_via_table(graph)
+        ordered = table.lookup(origin, destination) if table is not None else None
+
+        # 3. Otherwise find paths on the CSR arrays (shortest path plus top 5
+        # alternatives at most 20% slower), sorted by score descending
+        if ordered is None:
+            ordered = intermediate_indices(graph, origin, destination)
+
+        names = tuple(graph.names[i] for i in ordered)
+        if version == self._graph_version:
+            self._via_cache.put(key, names)
+        return list(names)
+
+    def _get_via_table(self, graph: StationGraph) -> Optional[ViaTable]:
+        """The precomputed via table if it was built on this graph."""
+        checked = self._via_table
+        if checked is None or checked[0] is not graph:
+            table = None
+            if VIA_TABLE_PATH.exists():
+                try:
+                    table = load_via_table(VIA_TABLE_PATH)
+                except Exception as e:
+                    print(f"Failed to load via table: {e}")
+                if table is not None and table.fingerprint != graph.fingerprint():
+                    print("Via table was built on another graph, ignoring it.")
+                    table = None
+            checked = (graph, table)
+            self._via_table = checked
+        return checked[1]
+
+    def _find_node_by_name(self, name: str, graph: Optional[StationGraph] = None) -> Optional[str]:
+        """Node id of a station name in graph (default: the current graph)."""
+        if graph is None:
+            graph = self.station_graph
+        indexed = self._name_index
+        if indexed is None or indexed[0] is not graph:
+            # Among equal matches prefer the candidate with the highest degree
+            # (most connected); this avoids picking a disconnected bus stop platform
+            indexed = (
+                graph,
+                StationNameIndex(
+                    (node, graph.names[i], (-graph.degree(i),)) for i, node in enumerate(graph.ids)
+                ),
+            )
+            self._name_index = indexed
+        return indexed[1].resolve(name)
+
+    def save_cache(self, checksum: bytes = NO_CHECKSUM):
+        graph = self.station_graph
         try:
-            with open(CACHE_PATH, "w") as f:
-                json.dump(data, f)
+            save_station_graph(graph, CACHE_PATH, checksum)
             print("Graph cached.")
         except Exception as e:
             print(f"Failed to cache graph: {e}")
+            return
+
+        # The cache now holds the logged changes up to the graph's version
+        if graph.data_version > 0 and self._tracks_changes():
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                with conn:
+                    pruned = prune_changes(conn, graph.data_version)
+                if pruned:
+                    print(f"Pruned {pruned} applied timetable changes from the log.")
+            except Exception as e:
+                print(f"Failed to prune the change log: {e}")
+            finally:
+                conn.close()
 
 if __name__ == "__main__":
     g = GraphService()
     
     print("Sample Stations:")
-    for i, (node, data) in enumerate(g.graph.nodes(data=True)):
-        if i < 10:
-            print(f" - {data['name']}")
+    for name in g.station_graph.names[:10]:
+        print(f" - {name}")
             
     print("\nTest: Frankfurt -> München")
     stops = g.find_intermediate_stations("Frankfurt (Main) Hbf", "München Hbf")
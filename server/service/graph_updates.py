@@ -0,0 +1,198 @@
+"""
+Incremental maintenance of the GraphService station graph.
+
+Opt-in: scripts/setup_graph_change_tracking.py installs triggers that record
+every row added to or removed from stop_times (an UPDATE counts as both) in
+graph_stop_time_log, numbered by a growing version; the highest version ever
+assigned is the timetable's data version. Without them the graph is rebuilt
+whenever travel.db changed. The
+graph stores the data version it includes and, per edge, the multiset of its
+trip hop durations, so removing a hop can uncover the next larger minimum.
+
+Applying the changes since the graph's version only looks at the changed
+trips: their hops before the changes (current rows plus logged removals minus
+logged additions) leave the multisets, their current hops enter them, and only
+edges whose multiset changed get a new weight. Changes to the stations table
+or the top station list are not tracked and still need a full rebuild.
+
+Once a graph is saved to the cache, the changes it includes are pruned from
+the log. A process whose graph is older than the pruned changes catches up
+from the saved cache (or rebuilds), see changes_logged.
+"""
+
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .station_graph import EdgeDurations
+
+# (stop_id, stop_sequence, arrival_time, departure_time)
+StopTimeRow = Tuple[str, Optional[int], Optional[str], Optional[str]]
+
+# trip_id -> (rows added, rows removed)
+TripChanges = Dict[str, Tuple[Counter, Counter]]
+
+_LOG_COLUMNS = "change, trip_id, stop_id, stop_sequence, arrival_time, departure_time"
+
+TRACKING_SQL = f"""
+CREATE TABLE IF NOT EXISTS graph_stop_time_log (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    change INTEGER NOT NULL, -- 1 = row added, -1 = row removed
+    trip_id TEXT,
+    stop_id TEXT,
+    stop_sequence INTEGER,
+    arrival_time TEXT,
+    departure_time TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS graph_stop_times_insert AFTER INSERT ON stop_times BEGIN
+    INSERT INTO graph_stop_time_log ({_LOG_COLUMNS})
+    VALUES (1, NEW.trip_id, NEW.stop_id, NEW.stop_sequence, NEW.arrival_time, NEW.departure_time);
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_stop_times_delete AFTER DELETE ON stop_times BEGIN
+    INSERT INTO graph_stop_time_log ({_LOG_COLUMNS})
+    VALUES (-1, OLD.trip_id, OLD.stop_id, OLD.stop_sequence, OLD.arrival_time, OLD.departure_time);
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_stop_times_update
+AFTER UPDATE OF trip_id, stop_id, stop_sequence, arrival_time, departure_time ON stop_times BEGIN
+    INSERT INTO graph_stop_time_log ({_LOG_COLUMNS})
+    VALUES (-1, OLD.trip_id, OLD.stop_id, OLD.stop_sequence, OLD.arrival_time, OLD.departure_time);
+    INSERT INTO graph_stop_time_log ({_LOG_COLUMNS})
+    VALUES (1, NEW.trip_id, NEW.stop_id, NEW.stop_sequence, NEW.arrival_time, NEW.departure_time);
+END;
+"""
+
+
+REMOVE_TRACKING_SQL = """
+DROP TRIGGER IF EXISTS graph_stop_times_insert;
+DROP TRIGGER IF EXISTS graph_stop_times_delete;
+DROP TRIGGER IF EXISTS graph_stop_times_update;
+DROP TABLE IF EXISTS graph_stop_time_log;
+"""
+
+
+def install_change_tracking(conn: sqlite3.Connection):
+    conn.executescript(TRACKING_SQL)
+
+
+def remove_change_tracking(conn: sqlite3.Connection):
+    conn.executescript(REMOVE_TRACKING_SQL)
+
+
+def change_tracking_installed(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'graph_stop_time_log'"
+    ).fetchone()
+    return row is not None
+
+
+def data_version(conn: sqlite3.Connection) -> int:
+    """Version of the latest logged stop_times change, 0 without change tracking."""
+    if not change_tracking_installed(conn):
+        return 0
+    # AUTOINCREMENT's counter: still the latest version once the log is pruned
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'graph_stop_time_log'").fetchone()
+    return row[0] if row is not None else 0
+
+
+def changes_logged(conn: sqlite3.Connection, since: int, until: int) -> bool:
+    """Whether no change with since < version <= until was pruned from the log yet."""
+    count = conn.execute(
+        "SELECT COUNT(*) FROM graph_stop_time_log WHERE version > ? AND version <= ?", (since, until)
+    ).fetchone()[0]
+    return count == until - since
+
+
+def prune_changes(conn: sqlite3.Connection, version: int) -> int:
+    """Delete the logged changes up to version. Returns the number of rows deleted."""
+    return conn.execute("DELETE FROM graph_stop_time_log WHERE version <= ?", (version,)).rowcount
+
+
+def _minutes(time_str: str) -> int:
+    """Minutes from midnight of HH:MM:SS, like the SQL extraction (bad parts count as 0)."""
+    hours, _, rest = time_str.partition(":")
+    try:
+        h = int(hours)
+    except ValueError:
+        h = 0
+    try:
+        m = int(rest[:2])
+    except ValueError:
+        m = 0
+    return h * 60 + m
+
+
+def hop_duration(departure_time: Optional[str], arrival_time: Optional[str]) -> int:
+    """Minutes between two stops, as computed by the SQL edge extraction."""
+    if departure_time is None or arrival_time is None or ":" not in departure_time or ":" not in arrival_time:
+        return 30
+    duration = _minutes(arrival_time) - _minutes(departure_time)
+    if duration < 0:
+        duration += 24 * 60  # Handle midnight crossing
+    return duration
+
+
+def trip_hops(rows: Iterable[StopTimeRow], top_stops: Dict[str, str]) -> List[Tuple[Tuple[str, str], int]]:
+    """(edge, duration) between consecutive top stations of one trip's rows."""
+    top_rows = sorted(
+        (row for row in rows if row[0] in top_stops),
+        key=lambda row: (row[1] is not None, row[1] or 0),
+    )
+    hops = []
+    for a, b in zip(top_rows, top_rows[1:]):
+        u, v = top_stops[a[0]], top_stops[b[0]]
+        if u != v:
+            hops.append(((u, v), hop_duration(a[3], b[2])))
+    return hops
+
+
+def pending_changes(conn: sqlite3.Connection, since: int, until: int) -> TripChanges:
+    """Rows added and removed per trip by the changes with since < version <= until."""
+    changes: TripChanges = {}
+    for change, trip_id, *row in conn.execute(
+        f"SELECT {_LOG_COLUMNS} FROM graph_stop_time_log WHERE version > ? AND version <= ? ORDER BY version",
+        (since, until),
+    ):
+        added, removed = changes.setdefault(trip_id, (Counter(), Counter()))
+        (added if change > 0 else removed)[tuple(row)] += 1
+    return changes
+
+
+def apply_trip_changes(
+    conn: sqlite3.Connection,
+    top_stops: Dict[str, str],
+    edge_durations: EdgeDurations,
+    changes: TripChanges,
+) -> Set[Tuple[str, str]]:
+    """
+    Move the hops of the changed trips from their old to their current state
+    in edge_durations. Returns the edges whose multiset changed.
+    """
+    touched: Set[Tuple[str, str]] = set()
+    for trip_id, (added, removed) in changes.items():
+        current = Counter(
+            conn.execute(
+                "SELECT stop_id, stop_sequence, arrival_time, departure_time FROM stop_times WHERE trip_id = ?",
+                (trip_id,),
+            )
+        )
+        before = current + removed - added
+
+        for edge, duration in trip_hops(before.elements(), top_stops):
+            counts = edge_durations.get(edge)
+            if not counts or duration not in counts:
+                continue
+            counts[duration] -= 1
+            if counts[duration] == 0:
+                del counts[duration]
+            if not counts:
+                del edge_durations[edge]
+            touched.add(edge)
+
+        for edge, duration in trip_hops(current.elements(), top_stops):
+            counts = edge_durations.setdefault(edge, {})
+            counts[duration] = counts.get(duration, 0) + 1
+            touched.add(edge)
+    return touched
@@ -0,0 +1,113 @@
+"""
+Bounded top-k selection of journey candidates.
+
+Searches offer lightweight candidates (their legs or rides, not Journey models)
+together with departure, arrival and number of transfers. A candidate is
+rejected straight away if it is Pareto-dominated by a kept one (one that
+departs no earlier, arrives no later and has no more transfers), if it
+ranks behind the k-th kept candidate, or if a kept candidate with the same
+key ranks no worse; a better ranked one with the same key replaces it. Only the survivors are turned into
+Journey objects by the caller.
+"""
+
+from bisect import insort
+from datetime import datetime
+from typing import Any, Hashable, List, Optional
+
+DEFAULT_TOP_K = 10
+
+
+class _Candidate:
+    __slots__ = ("rank", "seq", "departure", "arrival", "transfers", "key", "payload")
+
+    def __init__(self, rank, seq, departure, arrival, transfers, key, payload):
+        self.rank = rank
+        self.seq = seq
+        self.departure = departure
+        self.arrival = arrival
+        self.transfers = transfers
+        self.key = key
+        self.payload = payload
+
+    def __lt__(self, other: "_Candidate") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+    def dominates(self, departure: datetime, arrival: datetime, transfers: int) -> bool:
+        return (
+            self.arrival <= arrival
+            and self.transfers <= transfers
+            and self.departure >= departure
+        )
+
+
+class ParetoTopK:
+    """
+    Keeps at most k mutually non-dominated candidates, ranked by total travel
+    time, then transfers, then arrival. The rank is monotone in dominance, so
+    a candidate dominated by one that was evicted for rank would rank behind
+    the k-th kept candidate too and is still rejected.
+    """
+
+    def __init__(self, k: int = DEFAULT_TOP_K):
+        self.k = k
+        self._kept: List[_Candidate] = []
+        self._seq = 0
+        self.offered = 0
+        self.rejected = 0
+
+    def offer(
+        self,
+        departure: datetime,
+        arrival: datetime,
+        transfers: int,
+        payload: Any,
+        key: Optional[Hashable] = None,
+    ) -> bool:
+        """
+        Offer a candidate. Returns False if it was rejected as a duplicate
+        (a kept candidate with the same key ranks no worse), as dominated or
+        as outside the top k.
+        """
+        self.offered += 1
+        rank = (arrival - departure, transfers, arrival)
+
+        if len(self._kept) >= self.k and rank >= self._kept[-1].rank:
+            self.rejected += 1
+            return False
+
+        same = None
+        if key is not None:
+            same = next((kept for kept in self._kept if kept.key == key), None)
+            if same is not None and same.rank <= rank:
+                self.rejected += 1
+                return False
+
+        for kept in self._kept:
+            if kept.dominates(departure, arrival, transfers):
+                self.rejected += 1
+                return False
+
+        # Drop the worse duplicate and every kept candidate the new one dominates
+        self._kept = [
+            kept
+            for kept in self._kept
+            if kept is not same
+            and not (
+                departure >= kept.departure
+                and arrival <= kept.arrival
+                and transfers <= kept.transfers
+            )
+        ]
+
+        self._seq += 1
+        insort(
+            self._kept,
+            _Candidate(rank, self._seq, departure, arrival, transfers, key, payload),
+        )
+        if len(self._kept) > self.k:
+            self._kept.pop()
+        return True
+
+    def results(self) -> List[Any]:
+        """Payloads of the kept candidates, best first."""
+        return [kept.payload for kept in self._kept]
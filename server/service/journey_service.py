@@ -1,80 +1,77 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from datetime import datetime, timedelta
 from ..models import Journey, Leg, Station
 from .travel_service import TravelService
 from .graph_service import GraphService
+from .container import get_graph_service, get_travel_service
+from .journey_selection import ParetoTopK
+from .segment_memo import SegmentMemo
 import uuid
 
+# The direct row query of a find_routes call runs next to its transfer query,
+# on the worker thread's own travel.db connection (see TravelService.conn)
+SEGMENT_SEARCH_WORKERS = max(1, int(os.getenv("SEGMENT_SEARCH_WORKERS", "4")))
+_segment_executor = ThreadPoolExecutor(max_workers=SEGMENT_SEARCH_WORKERS, thread_name_prefix="segment-search")
+
 class JourneyService:
-    def __init__(self):
-        self.travel_service = TravelService()
-        self.graph_service = GraphService()
+    def __init__(self, travel_service: Optional[TravelService] = None, graph_service: Optional[GraphService] = None):
+        # The process-wide instances unless given
+        self.travel_service = travel_service or get_travel_service()
+        self.graph_service = graph_service or get_graph_service()
 
     def find_routes(self, origin: str, destination: str, time: str, via: List[str] = None, min_transfer_time: int = 0) -> List[Journey]:
-        journeys = []
+        # Candidates are kept as leg lists; only the top 10 become Journeys
+        collector = ParetoTopK(10)
         
-        # If via is provided, use TravelService's via logic directly
         # If via is provided, use TravelService's via logic directly
         if via and len(via) > 0:
             # Note: TravelService expects a list of via stations
-            journeys = self.travel_service.find_routes(origin, destination, time, via=via, min_transfer_time=min_transfer_time)
+            for journey in self.travel_service.find_routes(origin, destination, time, via=via, min_transfer_time=min_transfer_time):
+                self._offer(collector, journey.legs, journey)
         else:
-            # 1. Try Direct Connection
-            direct_legs = self.travel_service.find_segment(origin, destination, time)
-            for leg in direct_legs:
-                journeys.append(self._create_journey([leg]))
-                
-            # 2. Try 1-Transfer Connections
-            # Get intermediate candidates
+            # Repeated station lookups and built legs of this request are
+            # shared by the two searches
+            memo = SegmentMemo(self.travel_service)
+
+            # 1. Try Direct Connection (queried while the candidates are
+            # computed and the transfers are queried)
+            direct = memo.start_segment(_segment_executor, origin, destination, time)
+
+            # 2. Try 1-Transfer Connections: one query joins leg 1 and leg 2 at
+            # any of the graph's intermediate stations (see
+            # TravelService.find_one_transfer), at least 5 min at the transfer
+            transfer_time = max(min_transfer_time or 0, 5)
             candidates = self.graph_service.find_intermediate_stations(origin, destination)
-            
-            # Limit candidates to avoid explosion
-            candidates = candidates[:3] 
-            
-            for transfer_station in candidates:
-                # Leg 1: Origin -> Transfer
-                leg1_options = self.travel_service.find_segment(origin, transfer_station, time)
-                
-                for l1 in leg1_options:
-                    # Calculate arrival at transfer + buffer (e.g. 5 mins)
-                    try:
-                        arrival_dt = self._parse_time(l1.arrivalTime)
-                        min_departure_dt = arrival_dt + timedelta(minutes=5)
-                        min_departure_str = min_departure_dt.strftime("%H:%M:%S")
-                        
-                        # Leg 2: Transfer -> Destination
-                        leg2_options = self.travel_service.find_segment(transfer_station, destination, min_departure_str)
-                        
-                        for l2 in leg2_options:
-                            # Create Journey
-                            # TODO: Propagate delays.
-                            # If l1 has delay, l1.arrivalTime increases.
-                            # min_departure_dt must be calculated from REAL arrival time.
-                            
-                            # Update legs with delay info
-                            # We already have delay from TravelService (populated in find_segment)
-                            # But we might want to refresh it or just use it.
-                            # Since find_segment calls simulation, l1.delayInMinutes and l2.delayInMinutes should be set.
-                            
-                            delay1 = l1.delayInMinutes
-                            delay2 = l2.delayInMinutes
-                            
-                            real_arrival_l1 = arrival_dt + timedelta(minutes=delay1)
-                            real_departure_l2 = self._parse_time(l2.departureTime) + timedelta(minutes=delay2)
-                            
-                            # Check if transfer is still possible (e.g. 5 min buffer)
-                            if real_departure_l2 < real_arrival_l1 + timedelta(minutes=5):
-                                continue # Transfer broken by delay
-                                
-                            journeys.append(self._create_journey([l1, l2]))
-                    except Exception as e:
-                        # print(f"Error processing transfer at {transfer_station}: {e}")
-                        continue
-                    
-        # Sort by total time
-        journeys.sort(key=lambda j: j.totalTime)
-        
-        top_journeys = journeys[:10]
+            transfers = memo.find_one_transfer(origin, destination, time, candidates, min_transfer_time=transfer_time)
+            direct_legs = direct()
+
+            # Merge direct legs first, then the transfers as ranked, so ties in
+            # the collector are broken the same way on every run
+            for leg in direct_legs:
+                self._offer(collector, [leg])
+
+            for l1, l2 in transfers:
+                try:
+                    # Delays come from TravelService (populated in build_leg);
+                    # the buffer must hold for the REAL arrival time of l1
+                    real_arrival_l1 = self._parse_time(l1.arrivalTime) + timedelta(minutes=l1.delayInMinutes)
+                    real_departure_l2 = self._parse_time(l2.departureTime) + timedelta(minutes=l2.delayInMinutes)
+
+                    # Check if transfer is still possible
+                    if real_departure_l2 < real_arrival_l1 + timedelta(minutes=transfer_time):
+                        continue # Transfer broken by delay
+
+                    self._offer(collector, [l1, l2])
+                except Exception:
+                    continue
+
+        # Best first by total time
+        top_journeys = [
+            payload if isinstance(payload, Journey) else self._create_journey(payload)
+            for payload in collector.results()
+        ]
         
         # Generate AI Insights ONLY for the top 3 to save time/cost
         print(f"Generating AI insights for top {min(3, len(top_journeys))} journeys...")
@@ -83,20 +80,30 @@ class JourneyService:
             
         return top_journeys
 
+    def _offer(self, collector: ParetoTopK, legs: List[Leg], journey: Optional[Journey] = None):
+        """Offer a leg sequence (or an already built journey) to the top-k collector."""
+        try:
+            start_dt, end_dt = self._journey_span(legs)
+        except Exception:
+            return
+        key = tuple((leg.train.trainNumber, leg.departureTime) for leg in legs)
+        collector.offer(start_dt, end_dt, len(legs) - 1, journey or legs, key=key)
+
+    def _journey_span(self, legs: List[Leg]):
+        # _parse_time uses a dummy date (1900-01-01) and handles hours >= 24,
+        # so an arrival before the departure means the next day
+        start_dt = self._parse_time(legs[0].departureTime)
+        end_dt = self._parse_time(legs[-1].arrivalTime)
+        if end_dt < start_dt:
+            end_dt += timedelta(days=1)
+        return start_dt, end_dt
+
     def _create_journey(self, legs: List[Leg]) -> Journey:
         start = legs[0].origin
         end = legs[-1].destination
         
         # Calculate total time
-        start_dt = self._parse_time(legs[0].departureTime)
-        end_dt = self._parse_time(legs[-1].arrivalTime)
-        
-        # Handle midnight crossing for duration calculation if not already handled by _parse_time days
-        # But _parse_time uses dummy date (1900-01-01), so if end_dt < start_dt it means next day
-        # However, our new _parse_time handles >24h.
-        
-        if end_dt < start_dt:
-             end_dt += timedelta(days=1)
+        start_dt, end_dt = self._journey_span(legs)
              
         duration_minutes = int((end_dt - start_dt).total_seconds() / 60)
         
@@ -2,13 +2,13 @@ import sqlite3
 from typing import Optional, Dict, List
 from datetime import datetime
 from server.data_access.DB.timetable_service import TimetableService
-from server.service.simulation import SimulationService
+from server.service.container import get_simulation_service
 
 class LinkerService:
     def __init__(self, db_path="server/data/travel.db"):
         self.db_path = db_path
         self.timetable_service = TimetableService()
-        self.simulation_service = SimulationService()
+        self.simulation_service = get_simulation_service()
 
     def _get_conn(self):
         return sqlite3.connect(self.db_path)
@@ -0,0 +1,150 @@
+"""
+Background warming of the Timetables API cache for hub stations.
+
+The scheduler keeps the next few plan hours and the full changes of the
+top-K stations in the shared TimetableService cache, so that user-facing
+requests are served from memory instead of waiting on the upstream API.
+Stations are ranked by recent request frequency first and by their static
+importance (hub list, top_stations.json connectivity score) second. Upstream
+calls made by the scheduler are capped by a per-minute budget so that the
+API quota is left for cache misses.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from server.data_access.DB.station_registry import get_station_registry
+from server.data_access.DB.timetable_service import TimetableService
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "20"))
+PREFETCH_PLAN_HOURS = int(os.getenv("PREFETCH_PLAN_HOURS", "3"))
+# The DB Timetables API allows 60 calls per minute per key; keep headroom for
+# requests that still miss the cache.
+PREFETCH_BUDGET_PER_MINUTE = int(os.getenv("PREFETCH_BUDGET_PER_MINUTE", "30"))
+
+# How old cached full changes may get before they are refreshed
+FCHG_REFRESH_SECONDS = 60
+TICK_SECONDS = 5
+
+# Weight of one recent user request relative to the static importance prior
+DEMAND_WEIGHT = 10.0
+
+
+def load_top_station_evas() -> Dict[str, float]:
+    """
+    EVA numbers of the stations scored in top_stations.json with a normalised
+    importance score in [0, 1], taken from the station registry.
+    """
+    return {str(eva): score for eva, score in get_station_registry().importance().items()}
+
+
+class PrefetchScheduler:
+    def __init__(
+        self,
+        timetable_service: TimetableService,
+        hub_evas: Iterable[str] = (),
+        top_k: int = PREFETCH_TOP_K,
+        plan_hours: int = PREFETCH_PLAN_HOURS,
+        budget_per_minute: int = PREFETCH_BUDGET_PER_MINUTE,
+    ):
+        self.timetable_service = timetable_service
+        self.top_k = top_k
+        self.plan_hours = plan_hours
+        self.budget_per_minute = budget_per_minute
+
+        self.priors = load_top_station_evas()
+        for eva in hub_evas:
+            # Explicit hubs always rank at least as high as the best top station
+            self.priors[eva] = max(self.priors.get(eva, 0), 1.0)
+
+        self._tokens = float(budget_per_minute)
+        self._last_refill = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not PREFETCH_ENABLED:
+            print("Prefetch scheduler disabled (PREFETCH_ENABLED=false).")
+            return
+        if not self.timetable_service.troy_client_id:
+            print("Prefetch scheduler not started: no Timetables API credentials.")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="timetable-prefetch", daemon=True
+        )
+        self._thread.start()
+        print(
+            f"Prefetch scheduler started: top {self.top_k} stations, "
+            f"{self.plan_hours} plan hours, {self.budget_per_minute} calls/min."
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=TICK_SECONDS * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Prefetch error: {e}")
+            self._stop.wait(TICK_SECONDS)
+
+    def ranked_stations(self) -> List[str]:
+        """The top-K EVA numbers, by recent demand first and static importance second."""
+        demand = self.timetable_service.station_demand()
+        candidates = set(self.priors) | set(demand)
+
+        def priority(eva: str) -> float:
+            return DEMAND_WEIGHT * demand.get(eva, 0.0) + self.priors.get(eva, 0.0)
+
+        return sorted(candidates, key=priority, reverse=True)[: self.top_k]
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """
+        Warm the cache for the current ranking until the budget is used up.
+
+        Returns:
+            Number of responses fetched (failed requests are cached empty for
+            a short while and not retried meanwhile)
+        """
+        now = now or datetime.now()
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        self._refill()
+
+        requests_made = 0
+        for eva in self.ranked_stations():
+            if self._tokens < 1:
+                break
+            if self.timetable_service.warm_realtime_changes(eva, FCHG_REFRESH_SECONDS):
+                self._tokens -= 1
+                requests_made += 1
+
+            for offset in range(self.plan_hours):
+                if self._tokens < 1:
+                    break
+                hour = hour_start + timedelta(hours=offset)
+                if self.timetable_service.warm_timetable(eva, hour):
+                    self._tokens -= 1
+                    requests_made += 1
+
+        return requests_made
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(
+            float(self.budget_per_minute),
+            self._tokens + elapsed * self.budget_per_minute / 60.0,
+        )
@@ -0,0 +1,199 @@
+"""
+Station adjacency graph of the rail network, keyed by EVA number.
+
+The graph is generated offline by scripts/build_rail_network.py from
+travel.db trips or recorded Timetables API paths (ppth) and stored in
+data/rail_network.json as a sorted node list plus CSR offsets and neighbour
+indices. It is loaded once per process.
+
+Corridors between two stations are computed from hop distances: a station v
+lies in the corridor if dist(start, v) + dist(v, end) <= shortest + slack.
+Long direct runs make the network dense, so the slack is lowered until the
+corridor has at most CORRIDOR_MAX_STATIONS stations (stations on a shortest
+path are always kept).
+For networks up to HOP_MATRIX_MAX_NODES stations the all-pairs hop-distance
+matrix is precomputed at load time; larger networks compute and memoise one
+BFS row per station on first use.
+"""
+
+import json
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+RAIL_NETWORK_PATH = Path(__file__).parent.parent / "data" / "rail_network.json"
+
+FORMAT_VERSION = 1
+
+# n * n bytes of memory for the precomputed hop-distance matrix
+HOP_MATRIX_MAX_NODES = 2000
+
+# Corridors larger than this are narrowed by lowering the slack
+CORRIDOR_MAX_STATIONS = 30
+
+# Hop distance of unreachable stations (distances are capped below it)
+UNREACHABLE = 255
+
+
+class RailNetwork:
+    def __init__(self, nodes: List[int], offsets: List[int], neighbors: List[int]):
+        self.nodes = nodes
+        self.index: Dict[int, int] = {eva: i for i, eva in enumerate(nodes)}
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self._rows: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, eva: int) -> bool:
+        return eva in self.index
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def neighbors_of(self, eva: int) -> List[int]:
+        i = self.index.get(eva)
+        if i is None:
+            return []
+        return [self.nodes[j] for j in self.neighbors[self.offsets[i] : self.offsets[i + 1]]]
+
+    def precompute_hop_matrix(self):
+        for i in range(len(self.nodes)):
+            self._row(i)
+
+    def hop_distance(self, start_eva: int, end_eva: int) -> Optional[int]:
+        if start_eva not in self.index or end_eva not in self.index:
+            return None
+        d = self._row(self.index[start_eva])[self.index[end_eva]]
+        return None if d == UNREACHABLE else d
+
+    def corridor(self, start_eva: int, end_eva: int, slack: int, max_stations: int = CORRIDOR_MAX_STATIONS) -> List[int]:
+        """
+        Stations v with dist(start, v) + dist(v, end) <= dist(start, end) + s,
+        in network order, for the largest s <= slack that keeps at most
+        max_stations stations (s = 0 if none does). Empty if either station is
+        unknown or end is unreachable.
+        """
+        if start_eva not in self.index or end_eva not in self.index:
+            return []
+
+        from_start = self._row(self.index[start_eva])
+        # The graph is undirected, so distances to end are distances from end
+        to_end = self._row(self.index[end_eva])
+
+        shortest = from_start[self.index[end_eva]]
+        if shortest == UNREACHABLE:
+            return []
+
+        # Stations per detour 0..slack, then the widest detour that fits
+        per_detour = [0] * (slack + 1)
+        for i in range(len(self.nodes)):
+            detour = from_start[i] + to_end[i] - shortest
+            if detour <= slack:
+                per_detour[detour] += 1
+        limit = shortest
+        total = per_detour[0]
+        for detour in range(1, slack + 1):
+            total += per_detour[detour]
+            if total > max_stations:
+                break
+            limit = shortest + detour
+
+        return [
+            self.nodes[i]
+            for i in range(len(self.nodes))
+            if from_start[i] + to_end[i] <= limit
+        ]
+
+    def _row(self, source: int) -> bytes:
+        row = self._rows.get(source)
+        if row is None:
+            row = self._bfs(source)
+            with self._lock:
+                self._rows[source] = row
+        return row
+
+    def _bfs(self, source: int) -> bytes:
+        dist = bytearray([UNREACHABLE]) * len(self.nodes)
+        dist[source] = 0
+        queue = deque([source])
+        offsets, neighbors = self.offsets, self.neighbors
+        while queue:
+            current = queue.popleft()
+            d = dist[current] + 1
+            if d >= UNREACHABLE:
+                continue
+            for j in neighbors[offsets[current] : offsets[current + 1]]:
+                if dist[j] == UNREACHABLE:
+                    dist[j] = d
+                    queue.append(j)
+        return bytes(dist)
+
+
+def add_path(adjacency: Dict[int, Set[int]], evas: Iterable[Optional[int]]):
+    """
+    Connect consecutive stations of one trip. Stops without an EVA (None) are
+    skipped, so the stations on either side of them become neighbours.
+    """
+    previous = None
+    for eva in evas:
+        if eva is None:
+            continue
+        adjacency.setdefault(eva, set())
+        if previous is not None and previous != eva:
+            adjacency[previous].add(eva)
+            adjacency[eva].add(previous)
+        previous = eva
+
+
+def save_rail_network(adjacency: Dict[int, Set[int]], path: Path = RAIL_NETWORK_PATH, source: str = ""):
+    nodes = sorted(adjacency)
+    index = {eva: i for i, eva in enumerate(nodes)}
+
+    offsets = [0]
+    neighbors: List[int] = []
+    for eva in nodes:
+        neighbors.extend(sorted(index[n] for n in adjacency[eva]))
+        offsets.append(len(neighbors))
+
+    data = {
+        "version": FORMAT_VERSION,
+        "source": source,
+        "nodes": nodes,
+        "offsets": offsets,
+        "neighbors": neighbors,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def load_rail_network(path: Path = RAIL_NETWORK_PATH) -> RailNetwork:
+    """Load the network, or an empty one if the file is missing or invalid."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported version {data.get('version')}")
+
+        network = RailNetwork(data["nodes"], data["offsets"], data["neighbors"])
+        if len(network) <= HOP_MATRIX_MAX_NODES:
+            network.precompute_hop_matrix()
+        return network
+    except FileNotFoundError:
+        print(f"Warning: {path} not found. Run scripts/build_rail_network.py first.")
+    except Exception as e:
+        print(f"Error loading rail network: {e}")
+    return RailNetwork([], [0], [])
+
+
+_network: Optional[RailNetwork] = None
+_network_lock = threading.Lock()
+
+
+def get_rail_network() -> RailNetwork:
+    global _network
+    if _network is None:
+        with _network_lock:
+            if _network is None:
+                _network = load_rail_network()
+    return _network
@@ -0,0 +1,103 @@
+"""
+Request-scoped memo of TravelService station lookups and legs.
+
+The direct and the one-transfer search of a journey search resolve the same
+station names and return many of the same trips. A SegmentMemo lives for one
+such search and remembers:
+
+- the stop ids of every station name (get_all_station_ids),
+- the Leg built from every trip row, so its stop list is only queried once.
+
+Segment results are not reused across departure times: each search runs one
+direct and one transfer query, so there are no nearby-time repeats to slice.
+
+A memo is used by one thread; start_segment only runs the direct search's
+row query on an executor and builds its Legs on the calling thread.
+Callers share the returned Legs and must not modify them.
+"""
+
+from concurrent.futures import Executor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Mapping, Optional, Tuple
+
+from ..models import Leg
+
+if TYPE_CHECKING:
+    from .travel_service import TravelService
+
+
+class SegmentMemo:
+    def __init__(self, travel_service: "TravelService"):
+        self.travel_service = travel_service
+        self._entries: Dict[Hashable, Any] = {}
+        self.hits = 0
+
+    def _once(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """fn's result for key, computed on first use."""
+        if key in self._entries:
+            self.hits += 1
+            return self._entries[key]
+        value = self._entries[key] = fn()
+        return value
+
+    def station_ids(self, name: str) -> Tuple[str, ...]:
+        """Stop ids of a station name, sorted (the canonical key of the station)."""
+        return self._once(
+            ("ids", name), lambda: tuple(sorted(set(self.travel_service.get_all_station_ids(name))))
+        )
+
+    def find_segment(self, start_name: str, end_name: str, time_str: str) -> List[Leg]:
+        """TravelService.find_segment with memoised station lookups and legs."""
+        query = self._segment_query(start_name, end_name, time_str)
+        return self._segment_legs(query() if query else [])
+
+    def find_one_transfer(
+        self, start_name: str, end_name: str, time_str: str, transfer_names: Optional[List[str]] = None, min_transfer_time: int = 5
+    ) -> List[Tuple[Leg, Leg]]:
+        """TravelService.find_one_transfer with memoised station lookups and legs."""
+        query = self._one_transfer_query(start_name, end_name, time_str, transfer_names, min_transfer_time)
+        return self._transfer_legs(query() if query else [])
+
+    def start_segment(self, executor: Executor, start_name: str, end_name: str, time_str: str) -> Callable[[], List[Leg]]:
+        """
+        Start find_segment's row query on executor. The returned function
+        waits for the rows and builds the legs on the calling thread.
+        """
+        query = self._segment_query(start_name, end_name, time_str)
+        if query is None:
+            return list
+        future = executor.submit(query)
+        return lambda: self._segment_legs(future.result())
+
+    def _segment_query(self, start_name: str, end_name: str, time_str: str) -> Optional[Callable[[], List[Any]]]:
+        """The direct row query, or None if a station is unknown."""
+        start_ids = self.station_ids(start_name)
+        end_ids = self.station_ids(end_name)
+        if not start_ids or not end_ids:
+            return None
+        return partial(self.travel_service.segment_rows, list(start_ids), list(end_ids), time_str)
+
+    def _one_transfer_query(
+        self, start_name: str, end_name: str, time_str: str, transfer_names: Optional[List[str]], min_transfer_time: int
+    ) -> Optional[Callable[[], List[Any]]]:
+        """The one-transfer row query, or None if it cannot return rows."""
+        start_ids = self.station_ids(start_name)
+        end_ids = self.station_ids(end_name)
+        transfer_ids = None
+        if transfer_names is not None:
+            transfer_ids = sorted({stop_id for name in transfer_names for stop_id in self.station_ids(name)})
+        if not start_ids or not end_ids or transfer_ids == []:
+            return None
+        return partial(
+            self.travel_service.one_transfer_rows, list(start_ids), list(end_ids), time_str, transfer_ids, min_transfer_time
+        )
+
+    def _segment_legs(self, rows: List[Any]) -> List[Leg]:
+        return self.travel_service.dedupe_legs([self._leg(row) for row in rows])
+
+    def _transfer_legs(self, rows: List[Any]) -> List[Tuple[Leg, Leg]]:
+        return [(self._leg(row1), self._leg(row2)) for row1, row2 in rows]
+
+    def _leg(self, row: Mapping[str, Any]) -> Leg:
+        key = ("leg", row["trip_id"], row["start_id"], row["end_id"], row["start_time"], row["end_time"])
+        return self._once(key, lambda: self.travel_service.build_leg(row))
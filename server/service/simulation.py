@@ -144,9 +144,10 @@ class SimulationService:
         Get simulated wagon load percentages (0-100).
         Returns a list of integers representing load for each wagon.
         """
-        # Deterministic simulation based on hash
+        # Deterministic simulation based on hash (own generator: segment
+        # searches call this from several threads)
         h = hash(train_number)
-        random.seed(h)
+        rng = random.Random(h)
         
         # Determine number of wagons (5-12)
         num_wagons = (h % 8) + 5
@@ -155,7 +156,7 @@ class SimulationService:
         for _ in range(num_wagons):
             # Generate load with some variance
             # Base load 30-80%
-            base = random.randint(30, 80)
+            base = rng.randint(30, 80)
             loads.append(base)
             
         return loads
@@ -0,0 +1,464 @@
+"""
+Station graph of GraphService in compressed sparse row (CSR) form, and its
+binary cache file.
+
+Nodes are the top stations in a fixed order; node i's outgoing edges are
+targets[offsets[i]:offsets[i + 1]] with the minimum travel time in minutes in
+the same slots of weights. Node attributes (id, name, coordinates, score) are
+kept in parallel arrays. Shortest paths are searched directly on these arrays
+with a heap-based Dijkstra, or A* with a lower bound from the coordinates;
+networkx is only needed to export a DiGraph view. For incremental updates (see graph_updates) every
+edge e also keeps the multiset of its trip hop durations as
+durations[duration_offsets[e]:duration_offsets[e + 1]] with their counts, and
+the graph records the timetable data version it includes.
+
+The cache file format (layout, reading and writing) lives in
+data_access/DB/graph_cache.py.
+"""
+
+import hashlib
+import heapq
+import math
+import struct
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from server.data_access.DB.graph_cache import (
+    GraphCacheData,
+    little_endian_bytes,
+    read_graph_cache,
+    write_graph_cache,
+)
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+EARTH_RADIUS_METERS = 6371000.0
+
+# Checksum stored when no travel.db was available; accepted for any database
+NO_CHECKSUM = bytes(32)
+
+# id -> (name, lon, lat, score)
+NodeAttributes = Dict[str, Tuple[str, float, float, int]]
+
+# (source, target) -> {duration in minutes: number of trip hops}
+EdgeDurations = Dict[Tuple[str, str], Dict[int, int]]
+
+
+def db_checksum(db_path: Path) -> bytes:
+    """
+    Checksum identifying the state of travel.db: size, modification time and
+    the SQLite header (whose file change counter and schema cookie change on
+    every committed write). Hashing the full database would take longer than
+    loading the graph.
+    """
+    try:
+        stat = db_path.stat()
+        if stat.st_size == 0:
+            return NO_CHECKSUM
+        with open(db_path, "rb") as f:
+            header = f.read(100)
+    except OSError:
+        return NO_CHECKSUM
+
+    digest = hashlib.sha256()
+    digest.update(struct.pack("<qq", stat.st_size, stat.st_mtime_ns))
+    digest.update(header)
+    return digest.digest()
+
+
+class StationGraph:
+    def __init__(
+        self,
+        ids: List[str],
+        names: List[str],
+        lons: array,
+        lats: array,
+        scores: array,
+        offsets: array,
+        targets: array,
+        weights: array,
+        duration_offsets: Optional[array] = None,
+        durations: Optional[array] = None,
+        duration_counts: Optional[array] = None,
+        data_version: int = 0,
+    ):
+        self.ids = ids
+        self.names = names
+        self.lons = lons
+        self.lats = lats
+        self.scores = scores
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        # Without multisets every edge has an empty duration range
+        if duration_offsets is None:
+            duration_offsets = array("I", bytes(4 * (len(targets) + 1)))
+        self.duration_offsets = duration_offsets
+        self.durations = durations if durations is not None else array("I")
+        self.duration_counts = duration_counts if duration_counts is not None else array("I")
+        self.data_version = data_version
+        self.index: Dict[str, int] = {node_id: i for i, node_id in enumerate(ids)}
+
+        self.in_degree = array("I", bytes(4 * len(ids)))
+        for j in targets:
+            self.in_degree[j] += 1
+
+        # Plain-list copies of the CSR arrays for the search loops (indexing
+        # a list is cheaper than indexing an array) and the A* distance
+        # bound, both built on first use
+        self._lists: Optional[Tuple[List[int], List[int], List[int]]] = None
+        self._bound: Optional[Tuple[float, float]] = None
+        self._xyz: List[Tuple[float, float, float]] = []
+        self._fingerprint: Optional[bytes] = None
+
+    @classmethod
+    def from_edges(
+        cls,
+        nodes: NodeAttributes,
+        edges: Dict[Tuple[str, str], int],
+        edge_durations: Optional[EdgeDurations] = None,
+        data_version: int = 0,
+    ) -> "StationGraph":
+        """
+        Build from node attributes and the minimum weight per (source, target),
+        optionally with the duration multiset of every edge.
+        """
+        ids = list(nodes)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+
+        adjacency: List[List[Tuple[int, int, Tuple[str, str]]]] = [[] for _ in ids]
+        for edge, weight in edges.items():
+            adjacency[index[edge[0]]].append((index[edge[1]], weight, edge))
+
+        offsets = array("I", [0])
+        targets = array("I")
+        weights = array("I")
+        duration_offsets = array("I", [0])
+        durations = array("I")
+        duration_counts = array("I")
+        for out in adjacency:
+            out.sort()
+            for j, weight, edge in out:
+                targets.append(j)
+                weights.append(weight)
+                if edge_durations is not None:
+                    for duration, count in sorted(edge_durations[edge].items()):
+                        durations.append(duration)
+                        duration_counts.append(count)
+                duration_offsets.append(len(durations))
+            offsets.append(len(targets))
+
+        return cls(
+            ids,
+            [nodes[i][0] for i in ids],
+            array("d", (nodes[i][1] for i in ids)),
+            array("d", (nodes[i][2] for i in ids)),
+            array("q", (nodes[i][3] for i in ids)),
+            offsets,
+            targets,
+            weights,
+            duration_offsets,
+            durations,
+            duration_counts,
+            data_version,
+        )
+
+    @classmethod
+    def from_node_link(cls, data: dict) -> "StationGraph":
+        """Build from networkx node_link data (the former graph_cache.json)."""
+        nodes: NodeAttributes = {}
+        for node in data.get("nodes", []):
+            lon, lat = node.get("pos") or (math.nan, math.nan)
+            nodes[node["id"]] = (node.get("name", node["id"]), float(lon), float(lat), int(node.get("score", 0)))
+
+        edges: Dict[Tuple[str, str], int] = {}
+        for link in data.get("links", data.get("edges", [])):
+            u, v = link["source"], link["target"]
+            for endpoint in (u, v):
+                nodes.setdefault(endpoint, (endpoint, math.nan, math.nan, 0))
+            edges[(u, v)] = int(link["weight"])
+        return cls.from_edges(nodes, edges)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def fingerprint(self) -> bytes:
+        """SHA-256 of the node order, names, scores and edges: equal for graphs with equal paths."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            digest.update("\0".join(self.ids + self.names).encode("utf-8"))
+            for values in (self.scores, self.offsets, self.targets, self.weights):
+                digest.update(little_endian_bytes(values))
+            self._fingerprint = digest.digest()
+        return self._fingerprint
+
+    @property
+    def has_durations(self) -> bool:
+        """Whether the edge duration multisets are known (not for graphs converted from JSON)."""
+        return len(self.durations) > 0 or self.edge_count == 0
+
+    def nodes(self) -> NodeAttributes:
+        return {
+            node_id: (self.names[i], self.lons[i], self.lats[i], self.scores[i])
+            for i, node_id in enumerate(self.ids)
+        }
+
+    def edges(self) -> Dict[Tuple[str, str], int]:
+        return {
+            (node_id, self.ids[j]): weight
+            for i, node_id in enumerate(self.ids)
+            for j, weight in self.edges_of(i)
+        }
+
+    def edge_durations(self) -> EdgeDurations:
+        result: EdgeDurations = {}
+        e = 0
+        for i, node_id in enumerate(self.ids):
+            for j in self.targets[self.offsets[i] : self.offsets[i + 1]]:
+                start, end = self.duration_offsets[e], self.duration_offsets[e + 1]
+                result[(node_id, self.ids[j])] = dict(
+                    zip(self.durations[start:end], self.duration_counts[start:end])
+                )
+                e += 1
+        return result
+
+    def degree(self, i: int) -> int:
+        """In- plus out-degree, as networkx reports it for a DiGraph."""
+        return self.offsets[i + 1] - self.offsets[i] + self.in_degree[i]
+
+    def edges_of(self, i: int) -> Iterable[Tuple[int, int]]:
+        """(target index, weight) of node i's outgoing edges."""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return zip(self.targets[start:end], self.weights[start:end])
+
+    def edge_weight(self, i: int, j: int) -> Optional[int]:
+        offsets, targets, weights = self._search_lists()
+        for e in range(offsets[i], offsets[i + 1]):
+            if targets[e] == j:
+                return weights[e]
+        return None
+
+    def path_weight(self, path: List[int]) -> int:
+        return sum(self.edge_weight(u, v) for u, v in zip(path, path[1:]))
+
+    def _search_lists(self) -> Tuple[List[int], List[int], List[int]]:
+        if self._lists is None:
+            self._lists = (self.offsets.tolist(), self.targets.tolist(), self.weights.tolist())
+        return self._lists
+
+    def _distance_bound(self) -> Optional[Tuple[float, float]]:
+        """
+        (fastest edge speed in meters per minute, total length of zero-minute
+        edges in meters), or None if a node lacks coordinates.
+
+        Any path from u to t covers at least the straight-line distance d
+        between them; zero-minute edges cover at most the second value for
+        free and every other edge is at most as fast as the first, so
+        (d - free) / speed is a lower bound of the path's weight.
+        """
+        if self._bound is None:
+            from server.data_access.DB.station_geo_index import haversine_meters
+
+            if any(math.isnan(lat) for lat in self.lats):
+                self._bound = (math.inf, 0.0)
+            else:
+                speed, free = 0.0, 0.0
+                for i in range(len(self.ids)):
+                    for j, weight in self.edges_of(i):
+                        meters = haversine_meters(self.lats[i], self.lons[i], self.lats[j], self.lons[j])
+                        if weight == 0:
+                            free += meters
+                        else:
+                            speed = max(speed, meters / weight)
+                self._bound = (speed, free)
+                self._xyz = [
+                    (
+                        math.cos(math.radians(lat)) * math.cos(math.radians(lon)),
+                        math.cos(math.radians(lat)) * math.sin(math.radians(lon)),
+                        math.sin(math.radians(lat)),
+                    )
+                    for lat, lon in zip(self.lats, self.lons)
+                ]
+        speed, free = self._bound
+        if math.isinf(speed) or speed == 0.0:
+            return None
+        return speed, free
+
+    def heuristic(self, target: int) -> Optional[List[float]]:
+        """
+        A* lower bounds of every node's weight to target, or None if
+        unavailable. Entries are filled in by shortest_path as nodes are
+        reached (-1.0 = not computed yet).
+        """
+        if self._distance_bound() is None:
+            return None
+        bounds = [-1.0] * len(self.ids)
+        bounds[target] = 0.0
+        return bounds
+
+    def _bound_to(self, i: int, target: int) -> float:
+        # The chord through the earth is never longer than the great circle
+        # distance, and needs no trigonometry per node
+        speed, free = self._bound
+        xi, yi, zi = self._xyz[i]
+        xt, yt, zt = self._xyz[target]
+        meters = EARTH_RADIUS_METERS * math.sqrt((xi - xt) ** 2 + (yi - yt) ** 2 + (zi - zt) ** 2)
+        return max(0.0, (meters - free) / speed)
+
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        heuristic: Optional[List[float]] = None,
+        banned_nodes: Optional[Set[int]] = None,
+        banned_edges: Optional[Set[Tuple[int, int]]] = None,
+    ) -> Optional[Tuple[int, List[int]]]:
+        """
+        (weight, node indices) of a minimum-weight path, or None if target is
+        unreachable. Dijkstra, or A* with the bounds from heuristic(target);
+        nodes are reopened when reached more cheaply, which keeps A* exact
+        although the bound is not consistent across zero-minute edges.
+        """
+        offsets, targets, weights = self._search_lists()
+        heappush, heappop = heapq.heappush, heapq.heappop
+        n = len(self.ids)
+        dist = [-1] * n
+        parent = [-1] * n
+        dist[source] = 0
+        heap = [(0, 0, source)]
+        while heap:
+            _, d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == target:
+                break
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                if banned_nodes and v in banned_nodes:
+                    continue
+                if banned_edges and (u, v) in banned_edges:
+                    continue
+                nd = d + weights[e]
+                old = dist[v]
+                if old < 0 or nd < old:
+                    dist[v] = nd
+                    parent[v] = u
+                    if heuristic is None:
+                        heappush(heap, (nd, nd, v))
+                    else:
+                        h = heuristic[v]
+                        if h < 0:
+                            h = heuristic[v] = self._bound_to(v, target)
+                        heappush(heap, (nd + h, nd, v))
+        else:
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return dist[target], path
+
+    def shortest_simple_paths(self, source: int, target: int, use_heuristic: bool = False) -> Iterator[Tuple[int, List[int]]]:
+        """
+        (weight, node indices) of loopless paths in order of increasing weight
+        (Yen's algorithm). Spur paths use Dijkstra unless use_heuristic; A*
+        may pick another of several equal-weight paths.
+        """
+        heuristic = self.heuristic(target) if use_heuristic else None
+        first = self.shortest_path(source, target, heuristic)
+        if first is None:
+            return
+        yield first
+
+        accepted = [first[1]]
+        seen = {tuple(first[1])}
+        candidates: List[Tuple[int, int, int, List[int]]] = []
+        counter = 0
+        while True:
+            last = accepted[-1]
+            root_weight = 0
+            for i in range(len(last) - 1):
+                root = last[: i + 1]
+                # Deviate from every accepted path sharing this root at its next edge
+                banned_edges = {(p[i], p[i + 1]) for p in accepted if len(p) > i + 1 and p[: i + 1] == root}
+                spur = self.shortest_path(last[i], target, heuristic, set(root[:-1]), banned_edges)
+                if spur is not None:
+                    path = root[:-1] + spur[1]
+                    key = tuple(path)
+                    if key not in seen:
+                        seen.add(key)
+                        counter += 1
+                        heapq.heappush(candidates, (root_weight + spur[0], len(path), counter, path))
+                root_weight += self.edge_weight(last[i], last[i + 1])
+
+            if not candidates:
+                return
+            weight, _, _, path = heapq.heappop(candidates)
+            accepted.append(path)
+            yield weight, path
+
+    def to_networkx(self) -> "nx.DiGraph":
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        for i, node_id in enumerate(self.ids):
+            attributes = {"name": self.names[i], "score": self.scores[i]}
+            if not math.isnan(self.lons[i]):
+                attributes["pos"] = (self.lons[i], self.lats[i])
+            graph.add_node(node_id, **attributes)
+        for i, node_id in enumerate(self.ids):
+            for j, weight in self.edges_of(i):
+                graph.add_edge(node_id, self.ids[j], weight=weight)
+        return graph
+
+
+def save_station_graph(graph: StationGraph, path: Path, checksum: bytes = NO_CHECKSUM):
+    write_graph_cache(
+        GraphCacheData(
+            graph.ids,
+            graph.names,
+            graph.offsets,
+            graph.targets,
+            graph.weights,
+            graph.duration_offsets,
+            graph.durations,
+            graph.duration_counts,
+            graph.lons,
+            graph.lats,
+            graph.scores,
+            graph.data_version,
+            checksum,
+        ),
+        path,
+    )
+
+
+def load_station_graph(path: Path) -> Tuple[StationGraph, bytes]:
+    """
+    Load a graph written by save_station_graph and the travel.db checksum it
+    was built from. Raises ValueError for files of another format or version
+    and for corrupted payloads.
+    """
+    data = read_graph_cache(path)
+    graph = StationGraph(
+        data.ids,
+        data.names,
+        data.lons,
+        data.lats,
+        data.scores,
+        data.offsets,
+        data.targets,
+        data.weights,
+        data.duration_offsets,
+        data.durations,
+        data.duration_counts,
+        data.data_version,
+    )
+    return graph, data.checksum
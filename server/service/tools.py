@@ -1,10 +1,9 @@
 from typing import List, Dict, Any
-from .graph_service import GraphService
-from .travel_service import TravelService
+from .container import get_graph_service, get_travel_service
 
-# Initialize services
-graph_service = GraphService()
-travel_service = TravelService()
+# Shared service instances (see container)
+graph_service = get_graph_service()
+travel_service = get_travel_service()
 
 # Tool Definitions (Bedrock Format)
 FIND_INTERMEDIATE_STATIONS_TOOL = {
@@ -1,18 +1,188 @@
+import os
 import sqlite3
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Mapping, Optional, Tuple
 from datetime import datetime, timedelta
 from ..models import RouteOption, PlatformInfo, StationInfo, Leg, Train, Station, Stop, Journey
 
 DB_PATH = Path(__file__).parent.parent / "data" / "travel.db"
 
+# Trips returned by one segment search
+SEGMENT_LIMIT = 20
+
+# One-transfer search: leg 1 departs within the window, leg 2 leaves the
+# transfer station between the minimum transfer time and the maximum wait
+# after leg 1 arrives; per leg 1 trip the earliest arriving leg 2 trips are
+# kept (later ones are only needed when delays break a transfer)
+TRANSFER_WINDOW_MINUTES = 240
+MAX_TRANSFER_WAIT_MINUTES = 180
+TRANSFERS_PER_TRIP = 3
+TRANSFER_LIMIT = 60
+
+# Via search: labels (partial journeys) kept per via station, see
+# _find_routes_with_via
+VIA_FRONTIER_SIZE = 10
+
+# Minutes from midnight of an HH:MM:SS column (hours may exceed 23), as in
+# graph_service
+_MINUTES = "(CAST(substr({col}, 1, instr({col}, ':') - 1) AS INTEGER) * 60 + CAST(substr({col}, instr({col}, ':') + 1, 2) AS INTEGER))"
+
+# Canonical station of a stop: its parent, or itself
+_STATION = "COALESCE(NULLIF({alias}.parent_station, ''), {alias}.stop_id)"
+
+# Columns of a segment_rows row, selected for one leg of a one-transfer row
+_LEG_COLUMNS = [
+    ("trip_id", "k.trip{n}"),
+    ("trip_short_name", "t{n}.trip_short_name"),
+    ("route_short_name", "r{n}.route_short_name"),
+    ("route_type", "r{n}.route_type"),
+    ("trip_headsign", "t{n}.trip_headsign"),
+    ("start_time", "k.dep{n}"),
+    ("end_time", "k.arr{n}"),
+    ("start_station", "sa{n}.stop_name"),
+    ("start_id", "k.start{n}"),
+    ("end_station", "sb{n}.stop_name"),
+    ("end_id", "k.end{n}"),
+    ("start_platform", "pa{n}.name"),
+    ("end_platform", "pb{n}.name"),
+]
+
+_ONE_TRANSFER_SQL = f"""
+WITH leg1 AS MATERIALIZED (
+    SELECT o.trip_id, o.stop_id AS start_id, o.departure_time AS start_time,
+        x.stop_id AS end_id, x.arrival_time AS end_time, {_STATION.format(alias="s")} AS station_id
+    FROM stop_times o
+    JOIN stop_times x ON x.trip_id = o.trip_id AND x.stop_sequence > o.stop_sequence
+    JOIN stations s ON s.stop_id = x.stop_id
+    WHERE o.stop_id IN ({{start_ph}}) AND o.departure_time >= ? AND o.departure_time < ?
+      {{leg1_filter}}
+),
+leg2 AS MATERIALIZED (
+    SELECT d.trip_id, y.stop_id AS start_id, y.departure_time AS start_time,
+        d.stop_id AS end_id, d.arrival_time AS end_time, {_STATION.format(alias="s")} AS station_id
+    FROM stop_times d
+    JOIN stop_times y ON y.trip_id = d.trip_id AND y.stop_sequence < d.stop_sequence
+    JOIN stations s ON s.stop_id = y.stop_id
+    WHERE d.stop_id IN ({{end_ph}}) AND y.departure_time >= ?
+      -- No later than the maximum wait after the last leg 1 arrival
+      AND {_MINUTES.format(col="y.departure_time")} <= (SELECT MAX({_MINUTES.format(col="end_time")}) FROM leg1) + ?
+      {{leg2_filter}}
+),
+endpoints AS (
+    SELECT {_STATION.format(alias="s")} AS station_id FROM stations s WHERE s.stop_id IN ({{start_ph}}) OR s.stop_id IN ({{end_ph}})
+),
+-- Per pair of trips the transfer station with the most time to change
+pairs AS (
+    SELECT
+        leg1.trip_id AS trip1, leg1.start_id AS start1, leg1.start_time AS dep1, leg1.end_id AS end1, leg1.end_time AS arr1,
+        leg2.trip_id AS trip2, leg2.start_id AS start2, leg2.start_time AS dep2, leg2.end_id AS end2, leg2.end_time AS arr2,
+        MAX({_MINUTES.format(col="leg2.start_time")} - {_MINUTES.format(col="leg1.end_time")}) AS buffer
+    FROM leg1
+    JOIN leg2 ON leg2.station_id = leg1.station_id
+    WHERE leg2.trip_id != leg1.trip_id
+      AND leg1.station_id NOT IN (SELECT station_id FROM endpoints)
+      AND {_MINUTES.format(col="leg2.start_time")} - {_MINUTES.format(col="leg1.end_time")} BETWEEN ? AND ?
+    GROUP BY trip1, trip2
+),
+ranked AS (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY trip1 ORDER BY {_MINUTES.format(col="arr2")}, dep2 DESC) AS pick
+    FROM pairs
+)
+SELECT
+    {{leg_columns}}
+FROM ranked k
+JOIN trips t1 ON t1.trip_id = k.trip1
+JOIN routes r1 ON r1.route_id = t1.route_id
+JOIN trips t2 ON t2.trip_id = k.trip2
+JOIN routes r2 ON r2.route_id = t2.route_id
+JOIN stations sa1 ON sa1.stop_id = k.start1
+JOIN stations sb1 ON sb1.stop_id = k.end1
+JOIN stations sa2 ON sa2.stop_id = k.start2
+JOIN stations sb2 ON sb2.stop_id = k.end2
+LEFT JOIN platforms pa1 ON pa1.global_id = k.start1
+LEFT JOIN platforms pb1 ON pb1.global_id = k.end1
+LEFT JOIN platforms pa2 ON pa2.global_id = k.start2
+LEFT JOIN platforms pb2 ON pb2.global_id = k.end2
+WHERE k.pick <= ?
+ORDER BY {_MINUTES.format(col="k.arr2")}, k.dep1 DESC, k.trip1, k.trip2
+LIMIT ?
+"""
+
+# segment_rows for several earliest departures ({ready}: one "(?, ?)" per
+# label) at once; per label and trip its earliest departure from a start stop
+_SEGMENT_BATCH_SQL = """
+WITH ready(label, time) AS (VALUES {ready}),
+segments AS MATERIALIZED (
+    SELECT st1.trip_id, st1.stop_id AS start_id, st1.departure_time AS start_time,
+        st2.stop_id AS end_id, st2.arrival_time AS end_time
+    FROM stop_times st1
+    JOIN stop_times st2 ON st2.trip_id = st1.trip_id AND st2.stop_sequence > st1.stop_sequence
+    WHERE st1.stop_id IN ({start_ph}) AND st2.stop_id IN ({end_ph}) AND st1.departure_time >= ?
+),
+firsts AS (
+    SELECT ready.label, g.trip_id, g.start_id, MIN(g.start_time) AS start_time, g.end_id, g.end_time
+    FROM ready
+    JOIN segments g ON g.start_time >= ready.time
+    GROUP BY ready.label, g.trip_id
+),
+ranked AS (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY label ORDER BY start_time, trip_id) AS pick
+    FROM firsts
+)
+SELECT
+    k.label,
+    k.trip_id,
+    t.trip_short_name,
+    r.route_short_name,
+    r.route_type,
+    t.trip_headsign,
+    k.start_time,
+    k.end_time,
+    s1.stop_name AS start_station,
+    k.start_id,
+    s2.stop_name AS end_station,
+    k.end_id,
+    p1.name AS start_platform,
+    p2.name AS end_platform
+FROM ranked k
+JOIN trips t ON t.trip_id = k.trip_id
+JOIN routes r ON r.route_id = t.route_id
+JOIN stations s1 ON s1.stop_id = k.start_id
+JOIN stations s2 ON s2.stop_id = k.end_id
+LEFT JOIN platforms p1 ON p1.global_id = k.start_id
+LEFT JOIN platforms p2 ON p2.global_id = k.end_id
+WHERE k.pick <= ?
+ORDER BY k.label, k.pick
+"""
+
+
+def _minutes(time_str: str) -> int:
+    """Minutes from midnight of HH:MM[:SS] (hours may exceed 23)."""
+    h, m = map(int, time_str.split(':')[:2])
+    return h * 60 + m
+
+
 from .simulation import SimulationService
 
 class TravelService:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.simulation = SimulationService()
+    def __init__(self, simulation: Optional[SimulationService] = None):
+        # Connection of the current thread and the process it was opened in
+        self._local = threading.local()
+        self.simulation = simulation if simulation is not None else SimulationService()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # One read connection per thread, so the direct search running next
+        # to the transfer search (JourneyService) doesn't queue on a shared
+        # one. SQLite connections must not cross a fork either: a worker
+        # process forked from a preloaded server opens its own
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            local.conn.row_factory = sqlite3.Row
+            local.pid = os.getpid()
+        return local.conn
 
     def get_all_station_ids(self, name: str) -> List[str]:
         # Normalize name for better matching
@@ -99,12 +269,13 @@ class TravelService:
 
     def find_routes(self, start_name: str, end_name: str, time_str: str = None, via: List[str] = None, min_transfer_time: int = 0) -> List[Journey]:
         if via and len(via) > 0:
-            return self._find_routes_with_via(start_name, end_name, via[0], time_str, min_transfer_time)
+            return self._find_routes_with_via(start_name, end_name, via, time_str, min_transfer_time)
             
         # Direct routes - Delegate to find_segment to avoid duplication
         # find_segment handles SQL, path population, and deduplication
-        legs = self.find_segment(start_name, end_name, time_str)
-        
+        return self._direct_journeys(self.find_segment(start_name, end_name, time_str))
+
+    def _direct_journeys(self, legs: List[Leg]) -> List[Journey]:
         journeys = []
         for leg in legs:
             # Calculate duration
@@ -130,62 +301,90 @@ class TravelService:
             
         return journeys
 
-    def _find_routes_with_via(self, start: str, end: str, via: str, time: str, min_transfer: int) -> List[Journey]:
-        # 1. Find Leg 1: Start -> Via
-        leg1_journeys = self.find_routes(start, via, time)
+    def _find_routes_with_via(self, start: str, end: str, via: List[str], time: str, min_transfer: Optional[int]) -> List[Journey]:
+        """
+        Journeys start -> via[0] -> ... -> end, one train per hop and at least
+        min_transfer minutes at every via station.
 
-        if not leg1_journeys:
+        A frontier of labels (arrival at the current station, first
+        departure, rows of the legs so far) is extended hop by hop: one
+        batched segment search gives every label its next SEGMENT_LIMIT
+        trips, then labels dominated by one that departs no earlier and
+        arrives no later are dropped and the VIA_FRONTIER_SIZE earliest
+        arrivals kept. N via stations cost N + 1 queries; Legs are only built
+        for the journeys returned.
+        """
+        min_transfer = min_transfer or 0
+        try:
+            departure = _minutes(time)
+        except (AttributeError, ValueError):
             return []
-            
-        combined_journeys = []
-        
-        # Limit to top 3 to avoid explosion
-        for j1 in leg1_journeys[:3]:
-            leg1 = j1.legs[0] # Assuming single leg for now
-            arrival_time = leg1.arrivalTime
-            
-            # Calculate min departure for Leg 2
-            # Simple string parsing HH:MM
-            try:
-                h, m = map(int, arrival_time.split(':')[:2])
-                total_min = h * 60 + m + min_transfer
-                new_h = (total_min // 60) % 24
-                new_m = total_min % 60
-                dep_time_leg2 = f"{new_h:02d}:{new_m:02d}"
-            except:
-                continue
-                
-            # 2. Find Leg 2: Via -> End
-            leg2_journeys = self.find_routes(via, end, dep_time_leg2)
-            
-            if leg2_journeys:
-                # Take best connection
-                j2 = leg2_journeys[0]
-                leg2 = j2.legs[0]
-                
-                # Calculate total duration
-                try:
-                    start_dt = datetime.strptime(leg1.departureTime, "%H:%M:%S")
-                    end_dt = datetime.strptime(leg2.arrivalTime, "%H:%M:%S")
-                    if end_dt < start_dt:
-                        end_dt += timedelta(days=1)
-                    duration_min = int((end_dt - start_dt).total_seconds() / 60)
-                except:
-                    duration_min = 0
-
-                # Create combined journey
-                combined_journeys.append(Journey(
-                    id=f"{j1.id}-{j2.id}",
-                    startStation=leg1.origin,
-                    endStation=leg2.destination,
-                    legs=[leg1, leg2],
-                    transfers=1,
-                    totalTime=duration_min,
-                    description=f"Connection via {via}",
-                    price=None
-                ))
-                
-        return combined_journeys
+
+        stations = [start] + list(via) + [end]
+        station_ids = [self.get_all_station_ids(name) for name in stations]
+        if not all(station_ids):
+            return []
+
+        # (arrival, first departure, rows); the start label has no legs yet
+        frontier: List[Tuple[int, int, Tuple[Mapping[str, Any], ...]]] = [(departure, departure, ())]
+        for hop in range(len(stations) - 1):
+            if hop == 0:
+                ready = [time]
+            else:
+                ready = [
+                    f"{(arrival + min_transfer) // 60:02d}:{(arrival + min_transfer) % 60:02d}:00"
+                    for arrival, _, _ in frontier
+                ]
+            batches = self.segment_rows_batch(station_ids[hop], station_ids[hop + 1], ready)
+
+            labels = []
+            for (_, first_departure, rows), batch in zip(frontier, batches):
+                for row in batch:
+                    try:
+                        leg_departure, leg_arrival = _minutes(row["start_time"]), _minutes(row["end_time"])
+                    except (AttributeError, ValueError):
+                        continue
+                    labels.append((leg_arrival, leg_departure if hop == 0 else first_departure, rows + (row,)))
+            frontier = self._pareto_labels(labels)[:VIA_FRONTIER_SIZE]
+            if not frontier:
+                return []
+
+        # Rows repeat across labels sharing a prefix; build each Leg once
+        legs: Dict[Tuple[Any, ...], Leg] = {}
+        journeys = []
+        for arrival, first_departure, rows in sorted(frontier, key=lambda label: label[1]):
+            journey_legs = []
+            for row in rows:
+                key = (row["trip_id"], row["start_id"], row["end_id"], row["start_time"], row["end_time"])
+                if key not in legs:
+                    legs[key] = self.build_leg(row)
+                journey_legs.append(legs[key])
+
+            journeys.append(Journey(
+                id="-".join(leg.train.trainNumber for leg in journey_legs),
+                startStation=journey_legs[0].origin,
+                endStation=journey_legs[-1].destination,
+                legs=journey_legs,
+                transfers=len(journey_legs) - 1,
+                totalTime=arrival - first_departure,
+                description=f"Connection via {', '.join(via)}",
+                price=None
+            ))
+
+        return journeys
+
+    def _pareto_labels(self, labels: List[Tuple[int, int, Tuple[Mapping[str, Any], ...]]]) -> List[Tuple[int, int, Tuple[Mapping[str, Any], ...]]]:
+        """Labels no other label beats (departs no earlier, arrives no later), earliest arrival first."""
+        # By arrival, then latest departure: a label is dominated iff an
+        # earlier one in this order departs at least as late
+        labels = sorted(labels, key=lambda label: (label[0], -label[1]))
+        kept = []
+        latest_departure = None
+        for label in labels:
+            if latest_departure is None or label[1] > latest_departure:
+                kept.append(label)
+                latest_departure = label[1]
+        return kept
 
     def get_station_info(self, name: str) -> Optional[StationInfo]:
         stop_id = self.find_station_id(name)
@@ -216,6 +415,11 @@ class TravelService:
         if not start_ids or not end_ids:
             return []
 
+        rows = self.segment_rows(start_ids, end_ids, time_str)
+        return self.dedupe_legs([self.build_leg(row) for row in rows])
+
+    def segment_rows(self, start_ids: List[str], end_ids: List[str], time_str: str, limit: int = SEGMENT_LIMIT) -> List[sqlite3.Row]:
+        """The first `limit` trips from start_ids to end_ids departing at or after time_str, by departure."""
         start_ph = ','.join(['?'] * len(start_ids))
         end_ph = ','.join(['?'] * len(end_ids))
 
@@ -247,107 +451,199 @@ class TravelService:
               AND st1.stop_sequence < st2.stop_sequence
               AND st1.departure_time >= ?
             GROUP BY t.trip_id
-            ORDER BY st1.departure_time LIMIT 20
+            ORDER BY st1.departure_time LIMIT ?
         """
         
-        params = start_ids + end_ids + [time_str]
-        cursor = self.conn.execute(query, params)
-        
-        legs = []
-        for row in cursor:
-            # Get intermediate stops (path)
-            path_cursor = self.conn.execute("""
-                SELECT s.stop_name, s.stop_id, st.arrival_time, st.departure_time
-                FROM stop_times st
-                JOIN stations s ON st.stop_id = s.stop_id
-                WHERE st.trip_id = ? 
-                  AND st.stop_sequence > (SELECT stop_sequence FROM stop_times WHERE trip_id = ? AND stop_id = ?)
-                  AND st.stop_sequence < (SELECT stop_sequence FROM stop_times WHERE trip_id = ? AND stop_id = ?)
-                ORDER BY st.stop_sequence
-            """, (row['trip_id'], row['trip_id'], row['start_id'], row['trip_id'], row['end_id']))
-            path_stations = []
-            for r in path_cursor:
-                # Simulate platform deterministically based on stop_id
-                # e.g. take last digits or hash
-                try:
-                    # Simple deterministic platform: (int(r['stop_id']) % 20) + 1
-                    # EVA IDs are usually numeric strings like "8000105"
-                    p_num = (int(r['stop_id']) % 20) + 1
-                    platform = str(p_num)
-                except:
-                    platform = "1"
-
-                path_stations.append(
-                    Stop(
-                        station=Station(name=r['stop_name'], eva=r['stop_id']),
-                        arrivalTime=r['arrival_time'],
-                        departureTime=r['departure_time'],
-                        platform=platform
-                    )
-                )
-            
-            if len(path_stations) == 0:
-                 pass
+        params = start_ids + end_ids + [time_str, limit]
+        return self.conn.execute(query, params).fetchall()
 
-            train_num = row['trip_short_name'] or ""
-            w_load = self.simulation.get_load(train_num)
-            
-            # Determine Platforms (with fallback)
-            dep_plat = row['start_platform']
-            if not dep_plat:
-                try:
-                    dep_plat = str((int(row['start_id']) % 20) + 1)
-                except:
-                    dep_plat = "1"
-                    
-            arr_plat = row['end_platform']
-            if not arr_plat:
-                try:
-                    arr_plat = str((int(row['end_id']) % 20) + 1)
-                except:
-                    arr_plat = "1"
-
-            # Determine Train Name (Prefix)
-            line_name = row['route_short_name']
-            if line_name and line_name.isdigit():
-                rtype = row['route_type']
-                if rtype == 101:
-                    line_name = f"ICE {line_name}"
-                elif rtype == 102:
-                    line_name = f"IC {line_name}"
-                elif rtype == 106:
-                    line_name = f"RE {line_name}"
-                elif rtype == 109:
-                    line_name = f"S {line_name}"
-                else:
-                    line_name = f"RB {line_name}"
-
-            train = Train(
-                name=line_name,
-                trainNumber=train_num,
-                startLocation=Station(name=row['start_station'], eva=row['start_id']),
-                endLocation=Station(name=row['end_station'], eva=row['end_id']),
-                departureTime=row['start_time'],
-                arrivalTime=row['end_time'],
-                path=path_stations, 
-                platform=dep_plat, 
-                wagons=w_load
+    def segment_rows_batch(self, start_ids: List[str], end_ids: List[str], time_strs: List[str], limit: int = SEGMENT_LIMIT) -> List[List[Dict[str, Any]]]:
+        """segment_rows(start_ids, end_ids, t, limit) for every t of time_strs, by one query."""
+        if not time_strs:
+            return []
+        start_ph = ','.join(['?'] * len(start_ids))
+        end_ph = ','.join(['?'] * len(end_ids))
+        query = _SEGMENT_BATCH_SQL.format(
+            ready=', '.join(['(?, ?)'] * len(time_strs)), start_ph=start_ph, end_ph=end_ph
+        )
+        params = (
+            [value for label, time_str in enumerate(time_strs) for value in (label, time_str)]
+            + start_ids + end_ids + [min(time_strs), limit]
+        )
+
+        batches: List[List[Dict[str, Any]]] = [[] for _ in time_strs]
+        for row in self.conn.execute(query, params):
+            row = dict(row)
+            batches[row.pop("label")].append(row)
+        return batches
+
+    def find_one_transfer(self, start_name: str, end_name: str, time_str: str, transfer_names: Optional[List[str]] = None, min_transfer_time: int = 5) -> List[Tuple[Leg, Leg]]:
+        """
+        Connections start -> X -> end with one change at any station X (or at
+        one of transfer_names), found by one query. Best arrival first.
+        """
+        start_ids = self.get_all_station_ids(start_name)
+        end_ids = self.get_all_station_ids(end_name)
+        transfer_ids = None
+        if transfer_names is not None:
+            transfer_ids = [stop_id for name in transfer_names for stop_id in self.get_all_station_ids(name)]
+        if not start_ids or not end_ids or transfer_ids == []:
+            return []
+
+        return [
+            (self.build_leg(row1), self.build_leg(row2))
+            for row1, row2 in self.one_transfer_rows(start_ids, end_ids, time_str, transfer_ids, min_transfer_time)
+        ]
+
+    def one_transfer_rows(
+        self,
+        start_ids: List[str],
+        end_ids: List[str],
+        time_str: str,
+        transfer_ids: Optional[List[str]] = None,
+        min_transfer_time: int = 5,
+        window_minutes: int = TRANSFER_WINDOW_MINUTES,
+        limit: int = TRANSFER_LIMIT,
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        (leg 1 row, leg 2 row) of the connections from start_ids to end_ids
+        with one change, leg 1 departing within window_minutes after
+        time_str. Both legs' stops of a change belong to the same canonical
+        station (the parent station, or the stop itself); transfer_ids limits
+        the change to those stops' stations. Rows have the columns of
+        segment_rows, ordered by arrival, then later departure.
+        """
+        try:
+            h, m = map(int, time_str.split(':')[:2])
+        except (AttributeError, ValueError):
+            return []
+        window_end = h * 60 + m + window_minutes
+        window_end_str = f"{window_end // 60:02d}:{window_end % 60:02d}:00"
+
+        start_ph = ','.join(['?'] * len(start_ids))
+        end_ph = ','.join(['?'] * len(end_ids))
+        leg1_filter = leg2_filter = ""
+        transfer_params: List[str] = []
+        if transfer_ids is not None:
+            transfer_ph = ','.join(['?'] * len(transfer_ids))
+            leg1_filter = f"AND x.stop_id IN ({transfer_ph})"
+            leg2_filter = f"AND y.stop_id IN ({transfer_ph})"
+            transfer_params = list(transfer_ids)
+
+        leg_columns = ",\n    ".join(
+            f"{expression.format(n=n)} AS l{n}_{name}" for n in (1, 2) for name, expression in _LEG_COLUMNS
+        )
+        query = _ONE_TRANSFER_SQL.format(
+            start_ph=start_ph, end_ph=end_ph, leg1_filter=leg1_filter, leg2_filter=leg2_filter, leg_columns=leg_columns
+        )
+        params = (
+            start_ids + [time_str, window_end_str] + transfer_params
+            + end_ids + [time_str, MAX_TRANSFER_WAIT_MINUTES] + transfer_params
+            + start_ids + end_ids
+            + [min_transfer_time, MAX_TRANSFER_WAIT_MINUTES, TRANSFERS_PER_TRIP, limit]
+        )
+
+        return [
+            tuple({name: row[f"l{n}_{name}"] for name, _ in _LEG_COLUMNS} for n in (1, 2))
+            for row in self.conn.execute(query, params)
+        ]
+
+    def build_leg(self, row: Mapping[str, Any]) -> Leg:
+        """Leg of a segment_rows row, with its intermediate stops, platforms, load and delay."""
+        # Get intermediate stops (path)
+        path_cursor = self.conn.execute("""
+            SELECT s.stop_name, s.stop_id, st.arrival_time, st.departure_time
+            FROM stop_times st
+            JOIN stations s ON st.stop_id = s.stop_id
+            WHERE st.trip_id = ? 
+              AND st.stop_sequence > (SELECT stop_sequence FROM stop_times WHERE trip_id = ? AND stop_id = ?)
+              AND st.stop_sequence < (SELECT stop_sequence FROM stop_times WHERE trip_id = ? AND stop_id = ?)
+            ORDER BY st.stop_sequence
+        """, (row['trip_id'], row['trip_id'], row['start_id'], row['trip_id'], row['end_id']))
+        path_stations = []
+        for r in path_cursor:
+            # Simulate platform deterministically based on stop_id
+            # e.g. take last digits or hash
+            try:
+                # Simple deterministic platform: (int(r['stop_id']) % 20) + 1
+                # EVA IDs are usually numeric strings like "8000105"
+                p_num = (int(r['stop_id']) % 20) + 1
+                platform = str(p_num)
+            except:
+                platform = "1"
+
+            path_stations.append(
+                Stop(
+                    station=Station(name=r['stop_name'], eva=r['stop_id']),
+                    arrivalTime=r['arrival_time'],
+                    departureTime=r['departure_time'],
+                    platform=platform
+                )
             )
-            
-            # Get delay
-            delay = self.simulation.get_delay(train.trainNumber)
-            
-            legs.append(Leg(
-                origin=Station(name=row['start_station'], eva=row['start_id']),
-                destination=Station(name=row['end_station'], eva=row['end_id']),
-                train=train,
-                departureTime=row['start_time'],
-                arrivalTime=row['end_time'],
-                delayInMinutes=delay,
-                departurePlatform=dep_plat,
-                arrivalPlatform=arr_plat
-            ))
-            
+        
+        if len(path_stations) == 0:
+             pass
+
+        train_num = row['trip_short_name'] or ""
+        w_load = self.simulation.get_load(train_num)
+        
+        # Determine Platforms (with fallback)
+        dep_plat = row['start_platform']
+        if not dep_plat:
+            try:
+                dep_plat = str((int(row['start_id']) % 20) + 1)
+            except:
+                dep_plat = "1"
+                
+        arr_plat = row['end_platform']
+        if not arr_plat:
+            try:
+                arr_plat = str((int(row['end_id']) % 20) + 1)
+            except:
+                arr_plat = "1"
+
+        # Determine Train Name (Prefix)
+        line_name = row['route_short_name']
+        if line_name and line_name.isdigit():
+            rtype = row['route_type']
+            if rtype == 101:
+                line_name = f"ICE {line_name}"
+            elif rtype == 102:
+                line_name = f"IC {line_name}"
+            elif rtype == 106:
+                line_name = f"RE {line_name}"
+            elif rtype == 109:
+                line_name = f"S {line_name}"
+            else:
+                line_name = f"RB {line_name}"
+
+        train = Train(
+            name=line_name,
+            trainNumber=train_num,
+            startLocation=Station(name=row['start_station'], eva=row['start_id']),
+            endLocation=Station(name=row['end_station'], eva=row['end_id']),
+            departureTime=row['start_time'],
+            arrivalTime=row['end_time'],
+            path=path_stations, 
+            platform=dep_plat, 
+            wagons=w_load
+        )
+        
+        # Get delay
+        delay = self.simulation.get_delay(train.trainNumber)
+        
+        return Leg(
+            origin=Station(name=row['start_station'], eva=row['start_id']),
+            destination=Station(name=row['end_station'], eva=row['end_id']),
+            train=train,
+            departureTime=row['start_time'],
+            arrivalTime=row['end_time'],
+            delayInMinutes=delay,
+            departurePlatform=dep_plat,
+            arrivalPlatform=arr_plat
+        )
+
+    def dedupe_legs(self, legs: List[Leg]) -> List[Leg]:
         # Deduplicate legs (Python side)
         unique_legs = {}
         for l in legs:
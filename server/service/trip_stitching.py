@@ -0,0 +1,168 @@
+"""
+Stitch station boards into per-trip timelines.
+
+Every station board only knows its own stop of a trip. Boards of all corridor
+stations are joined here by trip identity (the dailyTripId-YYMMddHHmm part of
+the DB stop id, whose last part is the stop index within the trip) into one
+timeline per trip, with exact planned and real-time times at every stop a
+board was fetched for. Stops without a board in between are interpolated
+between the surrounding exact times; only stops beyond the first or last
+board fall back to a per-stop estimate.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from server.models.stop import Stop
+from server.models.train import Train
+from server.data_access.DB.station_keys import station_key
+
+
+class TripTimeline:
+    __slots__ = ("trip_id", "stops", "keys", "arrivals", "departures", "exact", "_trains")
+
+    def __init__(self, trip_id: str):
+        self.trip_id = trip_id
+        self.stops: List[Stop] = []
+        self.keys: List[int] = []
+        self.arrivals: List[Optional[datetime]] = []
+        self.departures: List[Optional[datetime]] = []
+        self.exact: List[bool] = []
+        # Board entry per timeline position, for legs boarding there
+        self._trains: Dict[int, Train] = {}
+
+    def train_at(self, position: int) -> Train:
+        """The board entry of the trip at or closest before the given position."""
+        best = None
+        for pos, train in self._trains.items():
+            if pos <= position and (best is None or pos > best):
+                best = pos
+        if best is None:
+            best = min(self._trains)
+        return self._trains[best]
+
+
+def trip_identity(train: Train) -> Tuple[str, Optional[int]]:
+    """
+    Split a DB stop id (dailyTripId-YYMMddHHmm-stopIndex) into the trip id and
+    the zero-based stop index. Trains without a parseable id form their own trip.
+    """
+    if train.trainId:
+        parts = train.trainId.rsplit("-", 1)
+        if len(parts) == 2 and parts[1].isdigit():
+            return parts[0], int(parts[1]) - 1
+    return f"{train.trainNumber}@{id(train)}", None
+
+
+def minutes_per_stop(train: Train) -> int:
+    return 15 if train.trainCategory in ["ICE", "IC"] else 10
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    return value if isinstance(value, datetime) else None
+
+
+def _clock_time_before(reference: datetime, clock: Optional[str]) -> Optional[datetime]:
+    """Datetime of an HH:MM:SS clock time at or shortly before reference."""
+    if not clock:
+        return None
+    try:
+        t = datetime.strptime(clock, "%H:%M:%S").time()
+    except ValueError:
+        return None
+    dt = datetime.combine(reference.date(), t)
+    if dt > reference:
+        dt -= timedelta(days=1)
+    return dt
+
+
+def stitch_trips(trains: List[Train]) -> List[TripTimeline]:
+    """Join board entries of all stations into one timeline per trip."""
+    groups: Dict[str, List[Tuple[Optional[int], Train]]] = defaultdict(list)
+    for train in trains:
+        trip_id, index = trip_identity(train)
+        groups[trip_id].append((index, train))
+
+    return [_build_timeline(trip_id, entries) for trip_id, entries in groups.items()]
+
+
+def _build_timeline(
+    trip_id: str, entries: List[Tuple[Optional[int], Train]]
+) -> TripTimeline:
+    stops: Dict[int, Stop] = {}
+    arrivals: Dict[int, datetime] = {}
+    departures: Dict[int, datetime] = {}
+    boards: Dict[int, Train] = {}
+
+    for index, train in entries:
+        departure = _as_datetime(train.actualDepartureTime or train.departureTime)
+        arrival = _as_datetime(train.actualArrivalTime or train.arrivalTime)
+        path = train.path
+        if not path:
+            continue
+
+        if departure is not None:
+            # Departure entry: path is [board station] + stations after it
+            board_pos = index if index is not None else 0
+            first_pos = board_pos
+            departures[board_pos] = departure
+            planned_arrival = _clock_time_before(
+                _as_datetime(train.departureTime) or departure, path[0].arrivalTime
+            )
+            if planned_arrival is not None:
+                arrivals[board_pos] = planned_arrival + timedelta(minutes=train.delayMinutes)
+        elif arrival is not None:
+            # Terminating entry: path is stations before it + [board station]
+            board_pos = index if index is not None else len(path) - 1
+            first_pos = board_pos - (len(path) - 1)
+            arrivals[board_pos] = arrival
+        else:
+            continue
+
+        boards[board_pos] = train
+        for offset, stop in enumerate(path):
+            pos = first_pos + offset
+            if pos == board_pos or pos not in stops:
+                stops[pos] = stop
+
+    timeline = TripTimeline(trip_id)
+    timeline._trains = boards
+    if not boards:
+        return timeline
+
+    exact_positions = sorted(set(arrivals) | set(departures))
+    exact_times = [departures.get(p) or arrivals[p] for p in exact_positions]
+    step = timedelta(minutes=minutes_per_stop(next(iter(boards.values()))))
+
+    for pos in sorted(stops):
+        timeline.stops.append(stops[pos])
+        timeline.keys.append(station_key(stops[pos].station))
+
+        if pos in arrivals or pos in departures:
+            timeline.arrivals.append(arrivals.get(pos) or departures[pos])
+            timeline.departures.append(departures.get(pos) or arrivals[pos])
+            timeline.exact.append(True)
+            continue
+
+        estimate = _interpolate(pos, exact_positions, exact_times, step)
+        timeline.arrivals.append(estimate)
+        timeline.departures.append(estimate)
+        timeline.exact.append(False)
+
+    return timeline
+
+
+def _interpolate(
+    pos: int, positions: List[int], times: List[datetime], step: timedelta
+) -> datetime:
+    if pos < positions[0]:
+        return times[0] - step * (positions[0] - pos)
+    if pos > positions[-1]:
+        return times[-1] + step * (pos - positions[-1])
+
+    for i in range(len(positions) - 1):
+        a, b = positions[i], positions[i + 1]
+        if a < pos < b:
+            return times[i] + (times[i + 1] - times[i]) * ((pos - a) / (b - a))
+    return times[-1]
@@ -0,0 +1,177 @@
+"""
+Via station suggestions of GraphService and their caches.
+
+intermediate_indices picks the stations on the shortest path and on up to
+five loopless alternatives at most 20% slower. The result only depends on the
+graph and the station pair, so GraphService memoises it in a ViaCache (a
+bounded LRU keyed by origin id, destination id and graph version) and can
+read it from a ViaTable precomputed offline for pairs of top stations
+(scripts/precompute_via_stations.py).
+
+Binary layout of the table (little-endian), written by save_via_table:
+
+    header   magic, format version, node count n, pair count p, entry
+             count e, CRC32 of the payload, fingerprint of the graph
+    payload  keys uint32[p] (origin * n + destination, ascending),
+             offsets uint32[p + 1], stations uint32[e]
+
+The via stations of pair keys[i] are stations[offsets[i]:offsets[i + 1]] as
+node indices of the graph with that fingerprint.
+"""
+
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+from server.data_access.DB.graph_cache import little_endian_bytes, read_array
+from .station_graph import StationGraph
+
+MAGIC = b"VIAT"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIII32s")
+
+# Alternatives considered besides the shortest path, and their maximum
+# travel time relative to it
+MAX_ALTERNATIVES = 5
+MAX_DETOUR_FACTOR = 1.2
+
+
+def intermediate_indices(graph: StationGraph, origin: int, destination: int) -> List[int]:
+    """Via stations between two nodes, highest score first."""
+    # Loopless paths in order of travel time: the first is the shortest,
+    # the following ones alternatives
+    intermediates = set()
+    try:
+        baseline_duration = None
+        for count, (duration, path) in enumerate(graph.shortest_simple_paths(origin, destination)):
+            if baseline_duration is None:
+                baseline_duration = duration
+            elif count > MAX_ALTERNATIVES or duration > baseline_duration * MAX_DETOUR_FACTOR:
+                break
+            intermediates.update(path[1:-1])
+    except Exception as e:
+        print(f"Pathfinding warning: {e}")
+
+    return sorted(intermediates, key=lambda i: (-graph.scores[i], graph.ids[i]))
+
+
+class ViaCache:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[str, ...]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            names = self._entries.get(key)
+            if names is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return names
+
+    def put(self, key: Hashable, names: Tuple[str, ...]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = names
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ViaTable:
+    def __init__(self, node_count: int, keys: array, offsets: array, stations: array, fingerprint: bytes):
+        self.node_count = node_count
+        self.keys = keys
+        self.offsets = offsets
+        self.stations = stations
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, origin: int, destination: int) -> Optional[List[int]]:
+        """Via stations of the pair as node indices, None if it was not precomputed."""
+        key = origin * self.node_count + destination
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        return self.stations[self.offsets[i] : self.offsets[i + 1]].tolist()
+
+
+def build_via_table(graph: StationGraph, rows: Iterable[Tuple[int, int, List[int]]]) -> ViaTable:
+    """Table of (origin, destination, via stations) rows computed on graph."""
+    n = len(graph)
+    keys, offsets, stations = array("I"), array("I", [0]), array("I")
+    for origin, destination, vias in sorted(rows, key=lambda row: row[0] * n + row[1]):
+        keys.append(origin * n + destination)
+        stations.extend(vias)
+        offsets.append(len(stations))
+    return ViaTable(n, keys, offsets, stations, graph.fingerprint())
+
+
+def save_via_table(table: ViaTable, path: Path):
+    payload = b"".join(
+        [little_endian_bytes(table.keys), little_endian_bytes(table.offsets), little_endian_bytes(table.stations)]
+    )
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        table.node_count,
+        len(table.keys),
+        len(table.stations),
+        zlib.crc32(payload),
+        table.fingerprint,
+    )
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    tmp_path.replace(path)
+
+
+def load_via_table(path: Path) -> ViaTable:
+    """
+    Load a table written by save_via_table. Raises ValueError for files of
+    another format or version and for corrupted payloads.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated via table")
+    magic, version, _, n, p, e, crc, fingerprint = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a via table")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported via table version {version}")
+
+    buffer = memoryview(data)[_HEADER.size :]
+    if zlib.crc32(buffer) != crc:
+        raise ValueError("via table checksum mismatch")
+
+    keys, pos = read_array("I", buffer, 0, p)
+    offsets, pos = read_array("I", buffer, pos, p + 1)
+    stations, pos = read_array("I", buffer, pos, e)
+    if pos != len(buffer):
+        raise ValueError("via table size mismatch")
+    return ViaTable(n, keys, offsets, stations, fingerprint)